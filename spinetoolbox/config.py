@@ -50,6 +50,7 @@ else:
 
 # Tool output directory name
 TOOL_OUTPUT_DIR = "output"
+TOOL_CACHE_DIR = ".tool_cache"
 
 # GAMS
 if not sys.platform == "win32":
@@ -93,7 +94,16 @@ SETTINGS = {"project_directory": "",
             "julia_path": "",
             "save_at_exit": "1",
             "commit_at_exit": "1",
-            "delete_data": "false"}
+            "delete_data": "false",
+            "datapackage_sample_size": "100",
+            "datapackage_cast_values": "false",
+            "incremental_xlsx_import": "false",
+            "max_parallel_tools": "0",
+            "tool_cache_size": "0",
+            "staging_strategy": "reflink",
+            "persistent_work_dirs": "false",
+            "output_archiving": "copy",
+            "compress_results": "false"}
 
 # Stylesheets
 STATUSBAR_SS = "QStatusBar{" \
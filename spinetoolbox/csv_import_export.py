@@ -0,0 +1,278 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Functions to import and export between spine database and a directory of csv or parquet files.
+Each file contains one sheet in the same format as the sheets of an excel file, see excel_import_export.
+
+:author: P. Vennström (VTT)
+:date:   18.10.2026
+"""
+
+import csv
+import math
+import os
+import re
+from itertools import chain, islice
+from excel_import_export import stream_unstacked_relationships, stream_unstacked_objects, \
+    stream_json_arrays, relationship_sheet_rows, object_sheet_rows, json_array_sheet_rows, \
+    read_header_rows, validate_header_rows, header_value, read_parameter_rows, read_json_rows, \
+    merge_sheet_results, export_sheet_data_to_spine_db
+
+FILE_FORMATS = ("csv", "parquet")
+PARQUET_CHUNK_SIZE = 10000
+
+
+def import_csv_to_db(db, dirpath, file_format="csv"):
+    """reads all files with given format in directory 'dirpath' and insert into
+    database in mapping 'db'.
+
+    Args:
+        db (spinedatabase_api.DatabaseMapping): database mapping for database to write to
+        dirpath (str): str with path to directory to read files from
+        file_format (str): str with value "csv" or "parquet"
+
+    Returns:
+        (List, List) Returns two lists, first contains all imported data,
+        second one contains error information on all failed writes
+    """
+    obj_data, rel_data, error_log = read_spine_csv(dirpath, file_format)
+    insert_log, error_log_temp = export_sheet_data_to_spine_db(db, obj_data, rel_data)
+    error_log = error_log + error_log_temp
+    return insert_log, error_log
+
+
+def export_spine_database_to_csv(db, dirpath, file_format="csv"):
+    """Writes all data in a spine database into a directory, one file per sheet.
+    Data is streamed from the database one class at a time, see export_spine_database_to_xlsx.
+
+    Args:
+        db (spinedatabase_api.DatabaseMapping): database mapping for database.
+        dirpath (str): str with path to directory to save files to, created if it doesn't exist.
+        file_format (str): str with value "csv" or "parquet"
+    """
+    check_file_format(file_format)
+    os.makedirs(dirpath, exist_ok=True)
+    sheets = chain((("rel_" + d[0], relationship_sheet_rows(d)) for d in stream_unstacked_relationships(db)),
+                   (("obj_" + d[0], object_sheet_rows(d)) for d in stream_unstacked_objects(db)),
+                   (("json_" + d[0], json_array_sheet_rows(d, "object"))
+                    for d in stream_json_arrays(db, "object")),
+                   (("json_" + d[0], json_array_sheet_rows(d, "relationship"))
+                    for d in stream_json_arrays(db, "relationship")))
+    file_names = set()
+    for title, rows in sheets:
+        # class names can contain characters that are not allowed in file names
+        name = re.sub(r"[^\w\-.]", "_", title)
+        file_name = name
+        i = 1
+        while file_name.lower() in file_names:
+            file_name = "{}_{}".format(name, i)
+            i += 1
+        file_names.add(file_name.lower())
+        filepath = os.path.join(dirpath, file_name + "." + file_format)
+        if file_format == "parquet":
+            write_parquet_sheet(filepath, rows)
+        else:
+            write_csv_sheet(filepath, rows)
+
+
+def read_spine_csv(dirpath, file_format="csv"):
+    """reads all files with given format in a directory where the files are in valid
+    spine data format. Files are read in alphabetical order.
+
+    Args:
+        dirpath (str): str with path to directory to read files from
+        file_format (str): str with value "csv" or "parquet"
+
+    Returns:
+        (List, List, List) object class data, relationship class data and error log,
+        see read_spine_xlsx
+    """
+    file_names = spine_csv_file_names(dirpath, file_format)
+    return merge_sheet_results(read_csv_sheet(os.path.join(dirpath, f)) for f in file_names)
+
+
+def spine_csv_file_names(dirpath, file_format="csv"):
+    """Returns the names of the files with given format in a directory in alphabetical order,
+    i.e. the files read by read_spine_csv.
+
+    Args:
+        dirpath (str): str with path to directory
+        file_format (str): str with value "csv" or "parquet"
+
+    Returns:
+        (List) file names
+    """
+    check_file_format(file_format)
+    extension = "." + file_format
+    return sorted(f for f in os.listdir(dirpath) if f.lower().endswith(extension))
+
+
+def read_csv_sheet(filepath):
+    """Reads one csv or parquet file, see read_sheet in excel_import_export.
+
+    Args:
+        filepath (str): str with filepath to file to read, format given by extension
+
+    Returns:
+        (Tuple) sheet type, sheet data type, SheetData and error information,
+        SheetData is None if the sheet couldn't be read. Returns None if the
+        sheet is not in valid spine format.
+    """
+    sheet_name = os.path.splitext(os.path.basename(filepath))[0]
+    rows = header_cell_values(read_file_rows(filepath))
+    header = read_header_rows(rows)
+    if not validate_header_rows(header):
+        return None
+    sheet_type = header[1][0].lower()
+    sheet_data = header[1][1].lower()
+    try:
+        if sheet_data == "parameter":
+            # values are to the right of the object names
+            dim = header_value(header, 2, 4) if sheet_type == "relationship" else 1
+            rows = (row[:dim] + tuple(cell_value(v) for v in row[dim:]) for row in rows)
+            data = read_parameter_rows(sheet_name, header, rows)
+        elif sheet_data == "json array":
+            # first row after the header contains parameter names, values below it
+            rows = chain(islice(rows, 1), (row[:1] + tuple(cell_value(v) for v in row[1:]) for row in rows))
+            data = read_json_rows(sheet_name, sheet_type, header, rows)
+        else:
+            return None
+    except Exception as e:
+        return sheet_type, sheet_data, None, ["sheet", sheet_name,
+                                              "Error reading sheet {}: {}".format(sheet_name, e)]
+    return sheet_type, sheet_data, data, None
+
+
+def header_cell_values(rows):
+    """Converts the numbers of relationship dimensions on the second row of a sheet into int.
+
+    Args:
+        rows (Iterator[tuple]): rows of a sheet, as given by read_file_rows
+
+    Yields:
+        (tuple) rows of the sheet
+    """
+    for r, row in enumerate(rows):
+        if r == 1:
+            row = row[:3] + tuple(cell_value(v) for v in row[3:])
+        yield row
+
+
+def cell_value(value):
+    """Converts str read from a file into int or float if the number is written
+    exactly as the exporter writes it, i.e. str() of the number gives back the same text.
+    Other values such as '007', '1e3' or 'nan' are kept as they are.
+
+    Args:
+        value (str): value of a cell, None if the cell is empty
+
+    Returns:
+        (int, float, str)
+    """
+    if not isinstance(value, str):
+        return value
+    for convert in (int, float):
+        try:
+            converted = convert(value)
+        except ValueError:
+            continue
+        if str(converted) == value and math.isfinite(converted):
+            return converted
+    return value
+
+
+def read_file_rows(filepath):
+    """Reads rows from a csv or parquet file. Empty cells are returned as None.
+
+    Args:
+        filepath (str): str with filepath to file to read, format given by extension
+
+    Yields:
+        (tuple) rows with str values
+    """
+    if filepath.lower().endswith(".parquet"):
+        pyarrow = import_pyarrow()
+        table = pyarrow.parquet.read_table(filepath)
+        for row in zip(*(column.to_pylist() for column in table.columns)):
+            yield row
+        return
+    with open(filepath, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            yield tuple(v if v != "" else None for v in row)
+
+
+def write_csv_sheet(filepath, rows):
+    """Writes rows of a sheet into a csv file.
+
+    Args:
+        filepath (str): str with filepath to save file to
+        rows (Iterable[List]): rows of the sheet
+    """
+    with open(filepath, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+
+
+def write_parquet_sheet(filepath, rows, chunk_size=PARQUET_CHUNK_SIZE):
+    """Writes rows of a sheet into a parquet file `chunk_size` rows at a time, so that a sheet
+    streamed from the database is never held in memory as a whole. All cells are stored as strings
+    in columns named by their index, empty cells as nulls. The number of columns is given by the
+    widest row in the first chunk, which holds the header rows of the sheet.
+
+    Args:
+        filepath (str): str with filepath to save file to
+        rows (Iterable[List]): rows of the sheet
+        chunk_size (int): number of rows converted and written at a time
+
+    Raises:
+        ValueError: if a row after the first chunk is wider than the rows in the first chunk
+    """
+    pyarrow = import_pyarrow()
+    rows = iter(rows)
+    chunk = list(islice(rows, chunk_size))
+    width = max((len(row) for row in chunk), default=0)
+    schema = pyarrow.schema([(str(c), pyarrow.string()) for c in range(width)])
+    with pyarrow.parquet.ParquetWriter(filepath, schema) as writer:
+        while chunk:
+            if any(len(row) > width for row in chunk):
+                raise ValueError("Rows of sheet {0} are wider than its header rows".format(filepath))
+            columns = [pyarrow.array([None if c >= len(row) or row[c] is None else str(row[c]) for row in chunk],
+                                     type=pyarrow.string())
+                       for c in range(width)]
+            writer.write_table(pyarrow.Table.from_arrays(columns, schema=schema))
+            chunk = list(islice(rows, chunk_size))
+
+
+def import_pyarrow():
+    """Returns pyarrow with its parquet module imported, pyarrow is an optional requirement.
+
+    Returns:
+        (module) pyarrow
+
+    Raises:
+        ImportError: if pyarrow is not installed
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Reading and writing parquet files requires pyarrow")
+    return pyarrow
+
+
+def check_file_format(file_format):
+    """Raises ValueError if file_format is not supported.
+
+    Args:
+        file_format (str): str with value "csv" or "parquet"
+    """
+    if file_format not in FILE_FORMATS:
+        raise ValueError("file_format must be a str with value 'csv' or 'parquet'")
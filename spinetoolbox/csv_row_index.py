@@ -0,0 +1,355 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Random access to the rows of csv files through an index of row byte offsets.
+The index is built once and stored in a sidecar file next to the csv file, together with
+the size and modification time of the csv file so that it is rebuilt when the file changes.
+
+:author: M. Marin (KTH)
+:date:   18.10.2026
+"""
+
+import codecs
+import csv
+import io
+import json
+import os
+import shutil
+import sys
+from array import array
+from itertools import islice
+
+ROW_INDEX_SUFFIX = ".rowindex"
+CANCEL_CHECK_INTERVAL = 65536  # lines read between checks for cancellation when building the index
+
+
+class CsvRowReader:
+    """Reads rows of a csv file by row number, see row_offsets.
+
+    Attributes:
+        path (str): path to csv file
+        dialect (dict): csv dialect of a datapackage resource descriptor
+        encoding (str): encoding of the file, utf-8 if None
+    """
+    def __init__(self, path, dialect=None, encoding=None, cancelled=None):
+        """Class constructor. Loads or builds the row index.
+
+        Args:
+            cancelled (function): called while the index is built, building is cancelled if it returns True
+
+        Raises:
+            ValueError: if rows of the file can't be indexed, see row_offsets, or building the index is cancelled
+        """
+        self.path = path
+        self.dialect = dialect or {}
+        self.encoding = encoding
+        self._key = file_key(path, self.dialect)
+        self._offsets = row_offsets(path, self.dialect, encoding, cancelled)
+        if self._offsets is None:
+            raise ValueError("Indexing rows of {} was cancelled".format(path))
+
+    def __len__(self):
+        """Number of rows in the file, not including the header."""
+        return len(self._offsets)
+
+    def is_valid(self):
+        """Returns True if the file hasn't changed since the index was built."""
+        try:
+            return file_key(self.path, self.dialect) == self._key
+        except OSError:
+            return False
+
+    def offset(self, row):
+        """Returns byte offset of given row."""
+        return self._offsets[row]
+
+    def rows(self, start=0, count=None):
+        """Returns rows of the file starting from given row.
+
+        Args:
+            start (int): number of the first row to read
+            count (int): number of rows to read, all remaining rows if None
+
+        Returns:
+            (list) rows as lists of strings
+        """
+        if start >= len(self._offsets):
+            return []
+        return list(islice(iter_rows_from(self.path, self._offsets[start], self.dialect, self.encoding),
+                           count if count is not None else len(self._offsets) - start))
+
+    def row(self, row):
+        """Returns one row of the file as a list of strings."""
+        return self.rows(row, 1)[0]
+
+
+def write_row_edits(reader, edits):
+    """Writes edited values into a csv file. Rows without edits are copied byte by byte,
+    only edited rows are parsed and written again, so the cost of the rewrite is one
+    streaming copy of the file. The file is replaced when the rewrite is complete.
+
+    Args:
+        reader (CsvRowReader): reader of the csv file, with an up to date row index
+        edits (dict): edited values keyed by (row, column) tuples, rows numbered as in the reader
+
+    Returns:
+        (int) number of edited rows written
+    """
+    row_edits = dict()
+    for (row, column), value in edits.items():
+        if 0 <= row < len(reader):
+            row_edits.setdefault(row, dict())[column] = value
+    if not row_edits:
+        return 0
+    encoding = codec_name(reader.encoding)
+    if encoding == "utf-8-sig":
+        # byte order mark is before the first offset and copied as is
+        encoding = "utf-8"
+    line_terminator = reader.dialect.get("lineTerminator") or detect_line_terminator(reader.path)
+    temp_path = reader.path + ".tmp"
+    with open(reader.path, "rb") as source, open(temp_path, "wb") as target:
+        position = 0
+        for row in sorted(row_edits):
+            start = reader.offset(row)
+            copy_bytes(source, target, start - position)
+            values = reader.row(row)
+            for column, value in row_edits[row].items():
+                if column >= len(values):
+                    values.extend([""] * (column + 1 - len(values)))
+                values[column] = "" if value is None else str(value)
+            target.write(format_row(values, reader.dialect, line_terminator).encode(encoding))
+            position = reader.offset(row + 1) if row + 1 < len(reader) else os.fstat(source.fileno()).st_size
+            source.seek(position)
+        shutil.copyfileobj(source, target)
+    os.replace(temp_path, reader.path)
+    return len(row_edits)
+
+
+def copy_bytes(source, target, count, chunk_size=1 << 20):
+    """Copies `count` bytes from the current position of file `source` into file `target`."""
+    while count > 0:
+        chunk = source.read(min(count, chunk_size))
+        if not chunk:
+            break
+        target.write(chunk)
+        count -= len(chunk)
+
+
+def format_row(values, dialect, line_terminator):
+    """Returns a row formatted as a line of a csv file described by a datapackage csv dialect."""
+    line = io.StringIO()
+    csv.writer(
+        line,
+        delimiter=dialect.get("delimiter", ","),
+        quotechar=dialect.get("quoteChar", '"'),
+        doublequote=dialect.get("doubleQuote", True),
+        escapechar=dialect.get("escapeChar"),
+        lineterminator=line_terminator
+    ).writerow(values)
+    return line.getvalue()
+
+
+def detect_line_terminator(path, sample_size=1 << 16):
+    """Returns the line terminator used in the beginning of a csv file, \\r\\n if there are no line breaks."""
+    with open(path, "rb") as f:
+        sample = f.read(sample_size)
+    newline = sample.find(b"\n")
+    if newline == -1 or sample[newline - 1:newline] == b"\r":
+        return "\r\n"
+    return "\n"
+
+
+def row_index_filepath(path):
+    """Returns the filepath of the sidecar file storing the row index of a csv file.
+
+    Args:
+        path (str): path to csv file
+
+    Returns:
+        (str)
+    """
+    return path + ROW_INDEX_SUFFIX
+
+
+def file_key(path, dialect):
+    """Returns a dictionary identifying the version of a csv file the row index was built from.
+
+    Args:
+        path (str): path to csv file
+        dialect (dict): csv dialect of a datapackage resource descriptor
+
+    Returns:
+        (dict) file size, modification time and the dialect options that affect row offsets
+    """
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns, "header": dialect.get("header", True),
+            "quote_char": dialect.get("quoteChar", '"'), "escape_char": dialect.get("escapeChar")}
+
+
+def row_offsets(path, dialect=None, encoding=None, cancelled=None):
+    """Returns byte offsets of the rows of a csv file, not including the header row.
+    The offsets are loaded from the sidecar file if it's up to date, otherwise they're built
+    and saved into the sidecar file.
+
+    Args:
+        path (str): path to csv file
+        dialect (dict): csv dialect of a datapackage resource descriptor
+        encoding (str): encoding of the file, utf-8 if None
+        cancelled (function): see build_row_offsets
+
+    Returns:
+        (array) offsets as unsigned 64-bit integers, None if building the offsets was cancelled
+
+    Raises:
+        ValueError: if the encoding is not compatible with ascii, e.g. utf-16
+    """
+    dialect = dialect or {}
+    offsets = load_row_offsets(path, dialect)
+    if offsets is not None:
+        return offsets
+    offsets = build_row_offsets(path, dialect, encoding, cancelled)
+    if offsets is None:
+        return None
+    try:
+        save_row_offsets(path, dialect, offsets)
+    except OSError:
+        # index is still usable, it just needs to be built again next time
+        pass
+    return offsets
+
+
+def build_row_offsets(path, dialect, encoding=None, cancelled=None):
+    """Builds byte offsets of the rows of a csv file by reading it once. Line breaks inside
+    quoted values are skipped by keeping track of quote characters.
+
+    Args:
+        path (str): path to csv file
+        dialect (dict): csv dialect of a datapackage resource descriptor
+        encoding (str): encoding of the file, utf-8 if None
+        cancelled (function): called every CANCEL_CHECK_INTERVAL lines, building is cancelled if it returns True
+
+    Returns:
+        (array) offsets as unsigned 64-bit integers, None if cancelled
+
+    Raises:
+        ValueError: if the encoding is not compatible with ascii, e.g. utf-16
+    """
+    encoding = codec_name(encoding)
+    if encoding.startswith(("utf-16", "utf-32")):
+        raise ValueError("Can't index rows of a file with encoding {}".format(encoding))
+    quote = dialect.get("quoteChar", '"').encode(encoding)
+    escape = dialect.get("escapeChar")
+    escaped_quote = escape.encode(encoding) + quote if escape else None
+    offsets = array("Q")
+    with open(path, "rb") as f:
+        position = len(codecs.BOM_UTF8) if f.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8 else 0
+        f.seek(position)
+        row_start = position
+        in_quotes = False
+        for line_number, line in enumerate(f, 1):
+            if cancelled is not None and line_number % CANCEL_CHECK_INTERVAL == 0 and cancelled():
+                return None
+            if not in_quotes:
+                row_start = position
+            quote_count = line.count(quote)
+            if escaped_quote:
+                quote_count -= line.count(escaped_quote)
+            if quote_count % 2:
+                in_quotes = not in_quotes
+            position += len(line)
+            if not in_quotes:
+                offsets.append(row_start)
+        if in_quotes:
+            # unterminated quote at the end of the file
+            offsets.append(row_start)
+    if dialect.get("header", True):
+        del offsets[:1]
+    return offsets
+
+
+def load_row_offsets(path, dialect):
+    """Loads row offsets from the sidecar file of a csv file.
+
+    Args:
+        path (str): path to csv file
+        dialect (dict): csv dialect of a datapackage resource descriptor
+
+    Returns:
+        (array) offsets, None if there's no sidecar file or the csv file has changed since
+    """
+    try:
+        key = file_key(path, dialect)
+        with open(row_index_filepath(path), "rb") as f:
+            stored_key = json.loads(f.readline().decode("utf-8"))
+            if stored_key != key:
+                return None
+            offsets = array("Q")
+            offsets.frombytes(f.read())
+    except (OSError, ValueError):
+        return None
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    return offsets
+
+
+def save_row_offsets(path, dialect, offsets):
+    """Saves row offsets into the sidecar file of a csv file.
+    The first line of the sidecar file is the file key as json, offsets follow as little-endian
+    unsigned 64-bit integers.
+
+    Args:
+        path (str): path to csv file
+        dialect (dict): csv dialect of a datapackage resource descriptor
+        offsets (array): offsets as given by build_row_offsets
+    """
+    if sys.byteorder == "big":
+        offsets = array("Q", offsets)
+        offsets.byteswap()
+    with open(row_index_filepath(path), "wb") as f:
+        f.write(json.dumps(file_key(path, dialect)).encode("utf-8") + b"\n")
+        f.write(offsets.tobytes())
+
+
+def iter_rows_from(path, offset, dialect, encoding=None):
+    """Iterate over the rows of a csv file starting from given byte offset.
+
+    Args:
+        path (str): path to csv file
+        offset (int): byte offset of the first row to read, as given by row_offsets
+        dialect (dict): csv dialect of a datapackage resource descriptor
+        encoding (str): encoding of the file, utf-8 if None
+
+    Returns:
+        (generator) rows as lists of strings
+    """
+    encoding = codec_name(encoding)
+    if encoding == "utf-8-sig":
+        # byte order mark is before the first offset
+        encoding = "utf-8"
+    with open(path, "rb") as raw:
+        raw.seek(offset)
+        f = io.TextIOWrapper(raw, encoding=encoding, newline="")
+        reader = csv.reader(
+            f,
+            delimiter=dialect.get("delimiter", ","),
+            quotechar=dialect.get("quoteChar", '"'),
+            doublequote=dialect.get("doubleQuote", True),
+            escapechar=dialect.get("escapeChar"),
+            skipinitialspace=dialect.get("skipInitialSpace", False)
+        )
+        for row in reader:
+            yield row
+
+
+def codec_name(encoding):
+    """Returns the normalized name of an encoding, utf-8 if None."""
+    return codecs.lookup(encoding or "utf-8").name
@@ -20,7 +20,7 @@ import os
 import shutil
 import logging
 from collections import Counter
-from PySide2.QtCore import Slot, QUrl, QFileSystemWatcher, Qt, QFileInfo
+from PySide2.QtCore import Slot, Signal, QObject, QThread, QUrl, QFileSystemWatcher, Qt, QFileInfo
 from PySide2.QtGui import QDesktopServices, QStandardItem, QStandardItemModel, QIcon, QPixmap
 from PySide2.QtWidgets import QFileDialog, QMessageBox, QStyle, QFileIconProvider
 from project_item import ProjectItem
@@ -28,6 +28,8 @@ from widgets.spine_datapackage_widget import SpineDatapackageWidget
 from helpers import create_dir
 from config import APPLICATION_PATH, HEADER_POINTSIZE
 from datapackage import Package
+from datapackage_inference import infer_datapackage_descriptor, INFER_SAMPLE_SIZE
+from csv_row_index import CsvRowReader, ROW_INDEX_SUFFIX
 from graphics_items import DataConnectionImage
 
 
@@ -42,6 +44,9 @@ class DataConnection(ProjectItem):
         x (int): Initial X coordinate of item icon
         y (int): Initial Y coordinate of item icon
     """
+    csv_rows_indexed = Signal(str, name="csv_rows_indexed")
+    csv_row_index_requested = Signal(str, "QVariant", "QVariant", name="csv_row_index_requested")
+
     def __init__(self, toolbox, name, description, references, x, y):
         """Class constructor."""
         super().__init__(name, description)
@@ -69,6 +74,12 @@ class DataConnection(ProjectItem):
         self.populate_data_list(data_files)
         self._graphics_item = DataConnectionImage(self._toolbox, x - 35, y - 35, 70, 70, self.name)
         self.spine_datapackage_form = None
+        self.inference_thread = None
+        self.inference_worker = None
+        self.csv_row_readers = dict()  # Row indexes of csv files, keyed by path
+        self.row_index_thread = None
+        self.row_index_worker = None
+        self.pending_row_indexes = set()  # Paths of csv files being indexed in the row index thread
         # self.ui.toolButton_datapackage.setMenu(self.datapackage_popup_menu)  # TODO: OBSOLETE?
         self._sigs = self.make_signal_handler_dict()
 
@@ -263,13 +274,72 @@ class DataConnection(ProjectItem):
         self.infer_datapackage()
 
     def infer_datapackage(self):
-        """Infer datapackage from CSV files in data directory and save it."""
+        """Infer datapackage from CSV files in data directory in a background thread.
+        The datapackage is saved when the inference is finished."""
+        if self.inference_thread:
+            self._toolbox.msg_warning.emit("Datapackage is already being inferred from {}".format(self.data_dir))
+            return
         msg = "Inferring datapackage from {}".format(self.data_dir)
         self._toolbox.msg.emit(msg)
-        datapackage = CustomPackage(base_path=self.data_dir)
-        datapackage.infer(os.path.join(self.data_dir, '*.csv'))
+        try:
+            sample_size = int(self._toolbox._config.get("settings", "datapackage_sample_size"))
+        except ValueError:
+            sample_size = INFER_SAMPLE_SIZE
+        self.inference_thread = QThread()
+        self.inference_worker = DatapackageInferenceWorker(self.data_dir, sample_size)
+        self.inference_worker.moveToThread(self.inference_thread)
+        self.inference_thread.started.connect(self.inference_worker.run)
+        self.inference_worker.progressed.connect(self.datapackage_inference_progressed)
+        self.inference_worker.inferred.connect(self.datapackage_inferred)
+        self.inference_worker.failed.connect(self.datapackage_inference_failed)
+        self.inference_thread.start()
+
+    @Slot(int, int, name="datapackage_inference_progressed")
+    def datapackage_inference_progressed(self, done, total):
+        """Report progress of datapackage inference about every ten percent."""
+        if not self.inference_thread:
+            return
+        if done == total or done % max(1, total // 10) == 0:
+            self._toolbox.msg.emit("\tInferred {} of {} resources".format(done, total))
+
+    @Slot("QVariant", name="datapackage_inferred")
+    def datapackage_inferred(self, descriptor):
+        """Save datapackage inferred in the background thread."""
+        if not self.inference_thread:
+            return
+        self.finish_datapackage_inference()
+        datapackage = CustomPackage(descriptor, base_path=self.data_dir)
         self.save_datapackage(datapackage)
 
+    @Slot(str, name="datapackage_inference_failed")
+    def datapackage_inference_failed(self, msg):
+        """Report failed datapackage inference."""
+        if not self.inference_thread:
+            return
+        self.finish_datapackage_inference()
+        self._toolbox.msg_error.emit("Inferring datapackage from {} failed: {}".format(self.data_dir, msg))
+
+    def tear_down(self):
+        """Stops datapackage inference and row indexing before this Data Connection is removed or
+        the application is closed. Resources being inferred are finished, the rest are left out and nothing is saved."""
+        self.finish_csv_row_indexing()
+        if not self.inference_thread:
+            return
+        self.inference_worker.progressed.disconnect(self.datapackage_inference_progressed)
+        self.inference_worker.inferred.disconnect(self.datapackage_inferred)
+        self.inference_worker.failed.disconnect(self.datapackage_inference_failed)
+        self.inference_worker.cancel()
+        self.finish_datapackage_inference()
+
+    def finish_datapackage_inference(self):
+        """Stop datapackage inference thread."""
+        self.inference_thread.quit()
+        self.inference_thread.wait()
+        self.inference_worker.deleteLater()
+        self.inference_thread.deleteLater()
+        self.inference_worker = None
+        self.inference_thread = None
+
     def save_datapackage(self, datapackage):
         """Write datapackage to file 'datapackage.json' in data directory."""
         if os.path.isfile(os.path.join(self.data_dir, "datapackage.json")):
@@ -319,10 +389,105 @@ class DataConnection(ProjectItem):
         return self.references
 
     def data_files(self):
-        """Return a list of files that are in the data directory."""
+        """Return a list of files that are in the data directory, not including row index sidecar files."""
         if not os.path.isdir(self.data_dir):
             return None
-        return os.listdir(self.data_dir)
+        return [f for f in os.listdir(self.data_dir) if not f.endswith(ROW_INDEX_SUFFIX)]
+
+    def csv_row_reader(self, path, dialect=None, encoding=None):
+        """Return a reader for random access to the rows of a csv file, see csv_row_index.
+        Readers are kept in memory and rebuilt when the file changes.
+
+        Args:
+            path (str): path to csv file
+            dialect (dict): csv dialect of a datapackage resource descriptor
+            encoding (str): encoding of the file, utf-8 if None
+
+        Returns:
+            (CsvRowReader) reader, None if rows of the file can't be indexed
+        """
+        reader = self.cached_csv_row_reader(path, dialect, encoding)
+        if reader is not None:
+            return reader
+        try:
+            reader = CsvRowReader(path, dialect, encoding)
+        except (OSError, ValueError) as e:
+            logging.debug("Couldn't index rows of {}: {}".format(path, e))
+            self.csv_row_readers.pop(path, None)
+            return None
+        self.csv_row_readers[path] = reader
+        return reader
+
+    def cached_csv_row_reader(self, path, dialect=None, encoding=None):
+        """Return the reader of a csv file kept in memory if the file hasn't changed since, see csv_row_reader.
+
+        Returns:
+            (CsvRowReader) reader, None if there's no up to date reader in memory
+        """
+        reader = self.csv_row_readers.get(path)
+        if reader is not None and reader.is_valid() and reader.dialect == (dialect or {}) \
+                and reader.encoding == encoding:
+            return reader
+        return None
+
+    def request_csv_row_reader(self, path, dialect=None, encoding=None):
+        """Return the reader of a csv file if it's in memory, otherwise load or build the row index
+        in a background thread and return None. Signal `csv_rows_indexed` is emitted with the path
+        when the reader is ready, see csv_row_reader.
+
+        Args:
+            path (str): path to csv file
+            dialect (dict): csv dialect of a datapackage resource descriptor
+            encoding (str): encoding of the file, utf-8 if None
+
+        Returns:
+            (CsvRowReader) reader, None if the file is being indexed
+        """
+        reader = self.cached_csv_row_reader(path, dialect, encoding)
+        if reader is not None:
+            return reader
+        if path in self.pending_row_indexes:
+            return None
+        if not self.row_index_thread:
+            self.row_index_thread = QThread()
+            self.row_index_worker = CsvRowIndexWorker()
+            self.row_index_worker.moveToThread(self.row_index_thread)
+            self.csv_row_index_requested.connect(self.row_index_worker.index_rows)
+            self.row_index_worker.indexed.connect(self.csv_row_reader_ready)
+            self.row_index_worker.failed.connect(self.csv_row_index_failed)
+            self.row_index_thread.start()
+        self.pending_row_indexes.add(path)
+        self.csv_row_index_requested.emit(path, dialect, encoding)
+        return None
+
+    @Slot(str, "QVariant", name="csv_row_reader_ready")
+    def csv_row_reader_ready(self, path, reader):
+        """Keep reader built in the row index thread and tell that rows of the file can be read by number."""
+        self.pending_row_indexes.discard(path)
+        self.csv_row_readers[path] = reader
+        self.csv_rows_indexed.emit(path)
+
+    @Slot(str, str, name="csv_row_index_failed")
+    def csv_row_index_failed(self, path, msg):
+        """Log failed row index, rows of the file are read from the resource instead."""
+        self.pending_row_indexes.discard(path)
+        logging.debug("Couldn't index rows of {}: {}".format(path, msg))
+
+    def finish_csv_row_indexing(self):
+        """Cancel indexes being built and stop the row index thread."""
+        if not self.row_index_thread:
+            return
+        self.csv_row_index_requested.disconnect(self.row_index_worker.index_rows)
+        self.row_index_worker.indexed.disconnect(self.csv_row_reader_ready)
+        self.row_index_worker.failed.disconnect(self.csv_row_index_failed)
+        self.row_index_worker.cancel()
+        self.row_index_thread.quit()
+        self.row_index_thread.wait()
+        self.row_index_worker.deleteLater()
+        self.row_index_thread.deleteLater()
+        self.row_index_worker = None
+        self.row_index_thread = None
+        self.pending_row_indexes.clear()
 
     @Slot(name="refresh")
     def refresh(self):
@@ -524,3 +689,84 @@ class CustomPackage(Package):
             if foreign_key in self.descriptor['resources'][i]['schema']['foreignKeys']:
                 self.descriptor['resources'][i]['schema']['foreignKeys'].remove(foreign_key)
                 self.commit()
+
+
+class DatapackageInferenceWorker(QObject):
+    """Infers a datapackage descriptor from CSV files in a thread, see datapackage_inference.
+
+    Attributes:
+        base_path (str): path to directory of CSV files
+        sample_size (int): number of rows read from each file to infer field types
+    """
+    progressed = Signal(int, int, name="progressed")
+    inferred = Signal("QVariant", name="inferred")
+    failed = Signal(str, name="failed")
+
+    def __init__(self, base_path, sample_size=INFER_SAMPLE_SIZE):
+        """Class constructor."""
+        super().__init__()
+        self.base_path = base_path
+        self.sample_size = sample_size
+        self._cancelled = False
+
+    def cancel(self):
+        """Requests inference to stop, called from the main thread. No signal is emitted after that."""
+        self._cancelled = True
+
+    def is_cancelled(self):
+        """Returns True if inference has been cancelled."""
+        return self._cancelled
+
+    @Slot(name="run")
+    def run(self):
+        """Infer descriptor and emit it in `inferred` signal, or error message in `failed` signal.
+        Nothing is emitted if inference is cancelled."""
+        try:
+            descriptor = infer_datapackage_descriptor(self.base_path, sample_size=self.sample_size,
+                                                      progress=self.progressed.emit, cancelled=self.is_cancelled)
+        except Exception as e:
+            if not self._cancelled:
+                self.failed.emit(str(e))
+            return
+        if descriptor is not None and not self._cancelled:
+            self.inferred.emit(descriptor)
+
+
+class CsvRowIndexWorker(QObject):
+    """Loads or builds row indexes of csv files in a thread, one file at a time in the order they are requested,
+    see csv_row_index."""
+    indexed = Signal(str, "QVariant", name="indexed")
+    failed = Signal(str, str, name="failed")
+
+    def __init__(self):
+        """Class constructor."""
+        super().__init__()
+        self._cancelled = False
+
+    def cancel(self):
+        """Requests indexing to stop, called from the main thread. No signal is emitted after that."""
+        self._cancelled = True
+
+    def is_cancelled(self):
+        """Returns True if indexing has been cancelled."""
+        return self._cancelled
+
+    @Slot(str, "QVariant", "QVariant", name="index_rows")
+    def index_rows(self, path, dialect, encoding):
+        """Emit reader of a csv file in `indexed` signal, or error message in `failed` signal.
+
+        Args:
+            path (str): path to csv file
+            dialect (dict): csv dialect of a datapackage resource descriptor
+            encoding (str): encoding of the file, utf-8 if None
+        """
+        if self._cancelled:
+            return
+        try:
+            reader = CsvRowReader(path, dialect, encoding, cancelled=self.is_cancelled)
+        except (OSError, ValueError) as e:
+            if not self._cancelled:
+                self.failed.emit(path, str(e))
+            return
+        if not self._cancelled:
+            self.indexed.emit(path, reader)
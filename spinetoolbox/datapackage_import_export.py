@@ -16,182 +16,848 @@ Functions to import/export between spine database and frictionless data's datapa
 :date:   28.8.2018
 """
 
+import csv
+import json
+import math
+import os
+import re
+from collections import Counter
+from itertools import islice
 from datapackage import Package
+from tableschema.exceptions import CastError
 from spinedatabase_api import SpineDBAPIError
-from helpers import busy_effect
+from excel_import_export import stream_unstacked_objects, stream_unstacked_relationships
 import logging
 
+# number of items inserted with one call to the database mapping
+IMPORT_BATCH_SIZE = 1000
+# kinds of batches read from a datapackage, see ImportBatchWriter
+CLASS_BATCH = "classes"
+OBJECT_BATCH = "objects"
+RELATIONSHIP_BATCH = "relationships"
 
-@busy_effect
-def import_datapackage(data_store_form, datapackage_path):
-    """Import datapackage from `datapackage_path` into `data_store_form`."""
-    data_store_form.msg.emit("Importing datapackage... ")
-    mapping = data_store_form.mapping
-    object_class_name_list = [x.name for x in mapping.object_class_list()]
+
+def import_datapackage(db_map, datapackage_path, cast=False):
+    """Import datapackage from `datapackage_path` into `db_map`, see iter_import_datapackage.
+
+    Args:
+        db_map (DiffDatabaseMapping): database mapping to import into
+        datapackage_path (str): path to datapackage descriptor file
+        cast (bool): if True, parameter values are cast according to the field types in resource schemas
+
+    Returns:
+        (list) error log, one entry for each field with values that couldn't be cast
+    """
+    error_log = list()
+    for _ in iter_import_datapackage(db_map, datapackage_path, error_log, cast=cast):
+        pass
+    return error_log
+
+
+def iter_import_datapackage(db_map, datapackage_path, error_log, cast=False):
+    """Import datapackage from `datapackage_path` into `db_map` one batch of rows at a time.
+    Resources named after object classes are imported first, then relationships from their foreign keys.
+    The import can be stopped between batches by not iterating further. Batches are read with
+    read_datapackage_batches and added with ImportBatchWriter, which can also be done in different threads.
+
+    Args:
+        db_map (DiffDatabaseMapping): database mapping to import into
+        datapackage_path (str): path to datapackage descriptor file
+        error_log (list): list to append errors to, one entry for each field with values that couldn't be cast
+            and one for each resource with rows whose primary key is empty
+        cast (bool): if True, parameter values are cast according to the field types in resource schemas
+
+    Yields:
+        (str, int) name of the resource being imported and number of its rows processed so far
+    """
+    object_class_id_dict = {x.name: x.id for x in db_map.object_class_list()}
+    writer = ImportBatchWriter(db_map, object_class_id_dict)
+    for batch in read_datapackage_batches(datapackage_path, set(object_class_id_dict), error_log, cast=cast):
+        progress = writer.add_batch(batch)
+        if progress is not None:
+            yield progress
+    writer.finish()
+
+
+def read_datapackage_batches(datapackage_path, object_class_names, error_log, batch_size=IMPORT_BATCH_SIZE,
+                             cast=False):
+    """Read a datapackage into batches of objects, parameter values and relationships to import,
+    see read_resource_batches and read_foreign_key_batches. The database is not used, so batches
+    can be read in a worker thread and added in the thread of the database mapping.
+
+    Args:
+        datapackage_path (str): path to datapackage descriptor file
+        object_class_names (set): names of the object classes in the database
+        error_log (list): list to append errors to, see iter_import_datapackage
+        batch_size (int): number of rows in a batch
+        cast (bool): if True, parameter values are cast according to the field types in resource schemas
+
+    Yields:
+        (tuple) batches to add with ImportBatchWriter
+    """
     datapackage = Package(datapackage_path)
     for resource in datapackage.resources:
-        if resource.name not in object_class_name_list:
+        if resource.name not in object_class_names:
             logging.debug("Ignoring resource '{}'.".format(resource.name))
             continue
         logging.debug("Importing resource '{}'.".format(resource.name))
-        object_class_name = resource.name
-        object_class = mapping.single_object_class(name=object_class_name).one_or_none()
-        if not object_class:
+        yield from read_resource_batches(resource, object_class_names, error_log, batch_size, cast)
+    yield from read_foreign_key_batches(datapackage, object_class_names, batch_size)
+
+
+def export_datapackage(db_map, dirpath):
+    """Export a database into a datapackage in directory `dirpath`, with one csv resource
+    per object class and per relationship class. Object class resources have the object names
+    as primary key and one field per parameter. Relationship class resources have one field
+    per object class, with foreign keys to the object class resources, followed by parameters.
+    Rows are streamed from the database one class at a time, see stream_unstacked_objects.
+
+    Resource names are made valid datapackage names from class names, see resource_name,
+    and the class names are kept as resource titles. Types of parameter fields are inferred
+    from the values, see value_field_type.
+
+    Args:
+        db_map (DatabaseMapping): database mapping to export from
+        dirpath (str): path to directory to save the datapackage to, created if it doesn't exist
+
+    Returns:
+        (str) path to the datapackage descriptor file
+    """
+    os.makedirs(dirpath, exist_ok=True)
+    resources = list()
+    resource_names = set()
+    object_class_resource_names = dict()
+    for object_class_name, rows, object_class_names, parameters in stream_unstacked_objects(db_map):
+        name = resource_name(object_class_name, resource_names)
+        object_class_resource_names[object_class_name] = name
+        field_names = unique_field_names(object_class_names + parameters)
+        schema = {
+            "fields": [{"name": field_name, "type": "string"} for field_name in field_names],
+            "primaryKey": field_names[:1]
+        }
+        resources.append(write_csv_resource(dirpath, name, object_class_name, schema, rows, 1))
+    for relationship_class_name, rows, object_class_names, parameters in stream_unstacked_relationships(db_map):
+        name = resource_name(relationship_class_name, resource_names)
+        field_names = unique_field_names(object_class_names + parameters)
+        dimension = len(object_class_names)
+        schema = {
+            "fields": [{"name": field_name, "type": "string"} for field_name in field_names],
+            "primaryKey": field_names[:dimension],
+            "foreignKeys": [
+                {"fields": [field_name],
+                 "reference": {"resource": object_class_resource_names.get(object_class_name, object_class_name),
+                               "fields": [object_class_name]}}
+                for field_name, object_class_name in zip(field_names, object_class_names)
+            ]
+        }
+        resources.append(write_csv_resource(dirpath, name, relationship_class_name, schema, rows, dimension))
+    descriptor = {"profile": "tabular-data-package", "resources": resources}
+    descriptor_path = os.path.join(dirpath, "datapackage.json")
+    with open(descriptor_path, "w", encoding="utf-8") as f:
+        json.dump(descriptor, f, indent=4)
+    return descriptor_path
+
+
+def resource_name(class_name, used_names):
+    """Return a datapackage resource name for a class, made of lower case letters, digits
+    and the characters '-', '_' and '.' as required by the datapackage specification.
+    A number is appended to names already used by other resources.
+
+    Args:
+        class_name (str): name of an object class or relationship class
+        used_names (set): resource names already used, updated with the new name
+
+    Returns:
+        (str) resource name, also used as the base name of the resource file
+    """
+    base_name = re.sub(r"[^a-z0-9\-_.]", "_", class_name.lower()) or "resource"
+    name = base_name
+    i = 2
+    while name in used_names:
+        name = "{}_{}".format(base_name, i)
+        i += 1
+    used_names.add(name)
+    return name
+
+
+def write_csv_resource(dirpath, name, title, schema, rows, key_count):
+    """Write rows of a resource into a csv file named after the resource. The types of fields
+    after the key fields are inferred from the values while the rows are written.
+
+    Args:
+        dirpath (str): path to directory of the datapackage
+        name (str): name of the resource, see resource_name
+        title (str): title of the resource, the name of the exported class
+        schema (dict): table schema of the resource, field types are updated
+        rows (Iterable[List]): rows of the resource, None for missing values
+        key_count (int): number of leading fields holding object names, kept as strings
+
+    Returns:
+        (dict) resource descriptor
+    """
+    path = name + ".csv"
+    fields = schema["fields"]
+    field_types = [None] * len(fields)
+    with open(os.path.join(dirpath, path), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([field["name"] for field in fields])
+        for row in rows:
+            for j in range(key_count, len(row)):
+                field_types[j] = merge_field_types(field_types[j], value_field_type(row[j]))
+            writer.writerow(row)
+    for field, field_type in zip(fields[key_count:], field_types[key_count:]):
+        field["type"] = field_type or "string"
+    return {
+        "name": name,
+        "title": title,
+        "path": path,
+        "profile": "tabular-data-resource",
+        "format": "csv",
+        "mediatype": "text/csv",
+        "encoding": "utf-8",
+        "schema": schema
+    }
+
+
+def value_field_type(value):
+    """Return the table schema type of a value written into a resource file.
+    Text is typed as a number only if it's written exactly as python writes the number.
+
+    Args:
+        value: parameter value, None if missing
+
+    Returns:
+        (str) 'integer', 'number', 'boolean' or 'string', None for missing values
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "number" if math.isfinite(value) else "string"
+    value = str(value)
+    try:
+        if str(int(value)) == value:
+            return "integer"
+    except ValueError:
+        pass
+    try:
+        number = float(value)
+    except ValueError:
+        return "string"
+    return "number" if math.isfinite(number) else "string"
+
+
+def merge_field_types(field_type, value_type):
+    """Return the type of a field that holds values of both types, see value_field_type.
+    Integers and numbers make a number field, other mixed types a string field."""
+    if field_type is None or field_type == value_type:
+        return value_type or field_type
+    if value_type is None:
+        return field_type
+    if {field_type, value_type} == {"integer", "number"}:
+        return "number"
+    return "string"
+
+
+def unique_field_names(names):
+    """Return field names made unique by appending a number to repeated names.
+
+    Args:
+        names (list): names of object classes and parameters
+
+    Returns:
+        (list) unique field names
+    """
+    field_names = list()
+    used = set()
+    for name in names:
+        field_name = name
+        i = 2
+        while field_name in used:
+            field_name = "{}_{}".format(name, i)
+            i += 1
+        used.add(field_name)
+        field_names.append(field_name)
+    return field_names
+
+
+def import_resource(db_map, resource, object_class_id_dict, batch_size=IMPORT_BATCH_SIZE, cast=False):
+    """Import one resource of a datapackage into the object class with the same name,
+    see iter_import_resource.
+
+    Args:
+        db_map (DiffDatabaseMapping): database mapping to import into
+        resource (datapackage.Resource): resource to import
+        object_class_id_dict (dict): object class ids keyed by name
+        batch_size (int): number of rows inserted with one call to the database mapping
+        cast (bool): if True, parameter values are cast according to field types
+
+    Returns:
+        (list) error log, one entry for each field with values that couldn't be cast
+    """
+    error_log = list()
+    for _ in iter_import_resource(db_map, resource, object_class_id_dict, error_log, batch_size, cast):
+        pass
+    return error_log
+
+
+def iter_import_resource(db_map, resource, object_class_id_dict, error_log, batch_size=IMPORT_BATCH_SIZE,
+                         cast=False):
+    """Import one resource of a datapackage into the object class with the same name,
+    see read_resource_batches and ImportBatchWriter.
+
+    Args:
+        db_map (DiffDatabaseMapping): database mapping to import into
+        resource (datapackage.Resource): resource to import
+        object_class_id_dict (dict): object class ids keyed by name
+        error_log (list): list to append errors to, one entry for each field with values that couldn't be cast
+            and one for each resource with rows whose primary key is empty
+        batch_size (int): number of rows inserted with one call to the database mapping
+        cast (bool): if True, parameter values are cast according to field types, see field_converter.
+            Values that can't be cast are left out.
+
+    Yields:
+        (str, int) name of the resource and number of its rows processed so far, after each batch
+    """
+    writer = ImportBatchWriter(db_map, object_class_id_dict, batch_size)
+    for batch in read_resource_batches(resource, set(object_class_id_dict), error_log, batch_size, cast):
+        progress = writer.add_batch(batch)
+        if progress is not None:
+            yield progress
+    writer.finish()
+
+
+def read_resource_batches(resource, object_class_names, error_log, batch_size=IMPORT_BATCH_SIZE, cast=False):
+    """Read one resource of a datapackage to import into the object class with the same name.
+    Rows become objects and fields not in the primary key or foreign keys become parameters.
+    Foreign keys to other object classes create relationship classes.
+    Rows are read and values cast in batches of `batch_size` rows.
+
+    Args:
+        resource (datapackage.Resource): resource to import
+        object_class_names (set): names of the object classes in the database
+        error_log (list): list to append errors to, one entry for each field with values that couldn't be cast
+            and one for each resource with rows whose primary key is empty
+        batch_size (int): number of rows in a batch
+        cast (bool): if True, parameter values are cast according to field types, see field_converter.
+            Values that can't be cast are left out.
+
+    Yields:
+        (tuple) first a CLASS_BATCH of relationship class and parameter names, then an OBJECT_BATCH
+        for every `batch_size` rows, see ImportBatchWriter
+    """
+    object_class_name = resource.name
+    primary_key = resource.schema.primary_key
+    foreign_keys = resource.schema.foreign_keys
+    foreign_key_fields = set(x for foreign_key in foreign_keys for x in foreign_key["fields"])
+    parameter_names = list()
+    child_object_class_names = list()
+    for field in resource.schema.fields:
+        logging.debug("Checking field '{}'.".format(field.name))
+        # Skip fields in primary key
+        if field.name in primary_key:
             continue
-        object_class_id = object_class.id
-        primary_key = resource.schema.primary_key
-        foreign_keys = resource.schema.foreign_keys
-        for field in resource.schema.fields:
-            logging.debug("Checking field '{}'.".format(field.name))
-            # Skip fields in primary key
-            if field.name in primary_key:
-                continue
-            # Find field in foreign keys, and prepare list of child object classes
-            child_object_class_name_list = list()
-            for foreign_key in foreign_keys:
-                if field.name in foreign_key['fields']:
-                    child_object_class_name = foreign_key['reference']['resource']
-                    if child_object_class_name not in object_class_name_list:
-                        continue
-                    child_object_class_name_list.append(child_object_class_name)
-            # If field is not in any foreign keys, use it to create a parameter
-            if not child_object_class_name_list:
-                try:
-                    parameter = mapping.add_parameter(object_class_id=object_class_id, name=field.name)
-                except SpineDBAPIError as e:
-                    logging.error(e.msg)
-                continue
-            # Create relationship classes
-            for child_object_class_name in child_object_class_name_list:
-                child_object_class = mapping.single_object_class(name=child_object_class_name).\
-                    one_or_none()
-                if not child_object_class:
+        # Find field in foreign keys, and prepare list of child object classes
+        child_object_class_name_list = list()
+        for foreign_key in foreign_keys:
+            if field.name in foreign_key['fields']:
+                child_object_class_name = foreign_key['reference']['resource']
+                if child_object_class_name not in object_class_names:
                     continue
-                relationship_class_name = object_class_name + "_" + child_object_class.name
-                try:
-                    wide_relationship_class = mapping.add_wide_relationship_class(
-                        object_class_id_list=[object_class_id, child_object_class.id],
-                        name=relationship_class_name
-                    )
-                    data_store_form.object_tree_model.add_relationship_class(wide_relationship_class._asdict())
-                except SpineDBAPIError as e:
-                    logging.error(e.msg)
-        # Iterate over resource rows to create objects and parameter values
-        for i, row in enumerate(resource.read(cast=False)):  # TODO: try and get field keys from read method too
-            row_dict = dict(zip(resource.schema.field_names, row))
+                child_object_class_name_list.append(child_object_class_name)
+        # If field is not in any foreign keys, use it to create a parameter
+        if not child_object_class_name_list:
+            parameter_names.append(field.name)
+            continue
+        # Create relationship classes
+        child_object_class_names.extend(child_object_class_name_list)
+    yield CLASS_BATCH, object_class_name, 0, (child_object_class_names, parameter_names)
+    parameter_fields = [
+        (i, name) for i, name in enumerate(resource.schema.field_names)
+        if name in parameter_names and name not in foreign_key_fields
+    ]
+    primary_key_fields = [resource.schema.field_names.index(field) for field in primary_key]
+    # Values that stand for a missing value in the resource, empty string by default
+    missing_values = set(resource.schema.missing_values)
+    missing_values.add(None)
+    # Converters are built once per field, not per value
+    converters = dict()
+    if cast:
+        for j, _ in parameter_fields:
+            converter = field_converter(resource.schema.fields[j])
+            if converter is not None:
+                converters[j] = converter
+    cast_errors = dict()
+    # Stream resource rows in batches to create objects and parameter values
+    rows = enumerate(iter_resource_rows(resource))
+    field_count = len(resource.schema.field_names)
+    empty_key_rows = list()
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        objects = list()
+        for i, row in batch:
+            if len(row) < field_count:
+                # missing cells at the end of the row
+                row = row + [None] * (field_count - len(row))
             # Create object
-            if primary_key:
-                object_name = "_".join(row_dict[field] for field in primary_key)
-            else:
-                object_name = object_class_name + str(i)
-            try:
-                object_ = mapping.add_object(class_id=object_class_id, name=object_name)
-                data_store_form.object_tree_model.add_object(object_.__dict__)
-            except SpineDBAPIError as e:
-                logging.error(e.msg)
+            object_name = row_object_name(row, i, primary_key_fields, object_class_name)
+            if object_name is None:
+                empty_key_rows.append(i)
                 continue
-            # Create parameters
-            object_id = object_.id
-            for field_name, value in row_dict.items():
-                if field_name in primary_key:
+            # Create parameter values
+            values = list()
+            for j, parameter_name in parameter_fields:
+                value = row[j]
+                if value in missing_values:
                     continue
-                if field_name in [x for a in foreign_keys for x in a["fields"]]:  # TODO: compute this outside the loop
+                converter = converters.get(j)
+                if converter is not None:
+                    try:
+                        value = converter(value)
+                    except (ValueError, CastError):
+                        cast_errors.setdefault(j, list()).append((i, value))
+                        continue
+                values.append((parameter_name, value))
+            objects.append((object_name, values))
+        yield OBJECT_BATCH, object_class_name, batch[-1][0] + 1, objects
+    if empty_key_rows:
+        error_log.append(["resource", object_class_name,
+                          "{} rows with an empty primary key were skipped, first one on row {}".format(
+                              len(empty_key_rows), empty_key_rows[0] + 1)])
+    for j, errors in sorted(cast_errors.items()):
+        field = resource.schema.fields[j]
+        row, value = errors[0]
+        error_log.append(["resource", object_class_name,
+                          "{} values of field '{}' couldn't be cast into {}, first one '{}' on row {}".format(
+                              len(errors), field.name, field.type, value, row + 1)])
+
+
+def field_converter(field):
+    """Return a function that casts a value read from a resource according to the type of a field.
+    Integers, numbers and booleans are converted into python types with builtins where the field
+    format allows it. Values of other types are validated by the field but kept as they are.
+
+    Args:
+        field (tableschema.Field): field of a resource schema
+
+    Returns:
+        (function) converter raising ValueError or CastError for values that can't be cast,
+        None for string fields which need no conversion
+    """
+    descriptor = field.descriptor
+    if field.type in ("string", "any"):
+        return None
+    bare_number = descriptor.get("bareNumber", True)
+    if field.type == "integer" and bare_number:
+        return int
+    if field.type == "number" and bare_number:
+        decimal_char = descriptor.get("decimalChar", ".")
+        group_char = descriptor.get("groupChar", "")
+        if decimal_char == "." and not group_char:
+            return float
+
+        def convert_number(value):
+            return float(value.replace(group_char, "").replace(decimal_char, "."))
+        return convert_number
+    if field.type == "boolean":
+        true_values = set(descriptor.get("trueValues", ["true", "True", "TRUE", "1"]))
+        false_values = set(descriptor.get("falseValues", ["false", "False", "FALSE", "0"]))
+
+        def convert_boolean(value):
+            if value in true_values:
+                return True
+            if value in false_values:
+                return False
+            raise ValueError("not a boolean")
+        return convert_boolean
+
+    def validate(value):
+        # tableschema raises CastError for values that don't match the type and format
+        field.cast_value(value)
+        return value
+    return validate
+
+
+def import_foreign_keys(db_map, datapackage, object_class_id_dict, batch_size=IMPORT_BATCH_SIZE):
+    """Create relationships from the foreign keys of resources imported into object classes,
+    see iter_import_foreign_keys.
+
+    Args:
+        db_map (DiffDatabaseMapping): database mapping to import into
+        datapackage (datapackage.Package): datapackage whose resources were imported
+        object_class_id_dict (dict): object class ids keyed by name
+        batch_size (int): number of relationships inserted with one call to the database mapping
+    """
+    for _ in iter_import_foreign_keys(db_map, datapackage, object_class_id_dict, batch_size):
+        pass
+
+
+def iter_import_foreign_keys(db_map, datapackage, object_class_id_dict, batch_size=IMPORT_BATCH_SIZE):
+    """Create relationships from the foreign keys of resources imported into object classes,
+    see read_foreign_key_batches and ImportBatchWriter.
+
+    Args:
+        db_map (DiffDatabaseMapping): database mapping to import into
+        datapackage (datapackage.Package): datapackage whose resources were imported
+        object_class_id_dict (dict): object class ids keyed by name
+        batch_size (int): number of relationships inserted with one call to the database mapping
+
+    Yields:
+        (str, int) name of the resource and number of its rows processed so far, every `batch_size` rows
+    """
+    writer = ImportBatchWriter(db_map, object_class_id_dict, batch_size)
+    for batch in read_foreign_key_batches(datapackage, set(object_class_id_dict), batch_size):
+        progress = writer.add_batch(batch)
+        if progress is not None:
+            yield progress
+    writer.finish()
+
+
+def read_foreign_key_batches(datapackage, object_class_names, batch_size=IMPORT_BATCH_SIZE):
+    """Read the relationships given by the foreign keys of resources imported into object classes.
+    References are resolved with a hash index of the referenced resource, built once per
+    resource and referenced fields, so resolving N references takes O(N) time.
+
+    Args:
+        datapackage (datapackage.Package): datapackage whose resources were imported
+        object_class_names (set): names of the object classes in the database
+        batch_size (int): number of rows in a batch
+
+    Yields:
+        (tuple) a RELATIONSHIP_BATCH for every `batch_size` rows, see ImportBatchWriter
+    """
+    resources = [x for x in datapackage.resources if x.name in object_class_names and x.schema.foreign_keys]
+    indexes = dict()
+    for resource in resources:
+        object_class_name = resource.name
+        field_names = resource.schema.field_names
+        references = list()
+        for foreign_key in resource.schema.foreign_keys:
+            child_object_class_name = foreign_key['reference']['resource']
+            if child_object_class_name not in object_class_names:
+                continue
+            reference_fields = tuple(field_list(foreign_key['reference']['fields']))
+            index_key = (child_object_class_name, reference_fields)
+            if index_key not in indexes:
+                child_resource = datapackage.get_resource(child_object_class_name)
+                indexes[index_key] = object_name_index(child_resource, reference_fields)
+            references.append((
+                object_class_name + "_" + child_object_class_name,
+                [field_names.index(field) for field in field_list(foreign_key['fields'])],
+                indexes[index_key],
+                child_object_class_name
+            ))
+        if not references:
+            continue
+        primary_key_fields = [field_names.index(field) for field in resource.schema.primary_key]
+        field_count = len(field_names)
+        relationships = list()
+        row_count = 0
+        for i, row in enumerate(iter_resource_rows(resource)):
+            if i and i % batch_size == 0:
+                yield RELATIONSHIP_BATCH, object_class_name, i, relationships
+                relationships = list()
+            row_count = i + 1
+            if len(row) < field_count:
+                row = row + [None] * (field_count - len(row))
+            object_name = row_object_name(row, i, primary_key_fields, object_class_name)
+            if object_name is None:
+                continue
+            for relationship_class_name, fields, index, child_object_class_name in references:
+                value = tuple(row[j] for j in fields)
+                if all(x is None or x == "" for x in value):
+                    # No reference in this row
                     continue
-                parameter = mapping.single_parameter(name=field_name).one_or_none()
-                if not parameter:
+                relationships.append((relationship_class_name, object_name, child_object_class_name,
+                                      index.get(value)))
+        yield RELATIONSHIP_BATCH, object_class_name, row_count, relationships
+
+
+class ImportBatchWriter:
+    """Adds batches read from a datapackage into a database mapping, see read_datapackage_batches.
+    Names in the batches are resolved into ids here, so this is the only part of the import that uses
+    the database mapping. Batches are tuples of kind, resource name, number of rows of the resource read
+    so far, and items:
+
+    - CLASS_BATCH: names of the child object classes of the relationship classes and names of the parameters
+      of the object class
+    - OBJECT_BATCH: list of object names with their parameter values as lists of (parameter name, value) tuples
+    - RELATIONSHIP_BATCH: list of (relationship class name, object name, child object class name,
+      child object name) tuples, child object name is None if the reference was not found
+
+    Attributes:
+        db_map (DiffDatabaseMapping): database mapping to import into
+        object_class_id_dict (dict): object class ids keyed by name
+        batch_size (int): number of items inserted with one call to the database mapping
+    """
+    def __init__(self, db_map, object_class_id_dict, batch_size=IMPORT_BATCH_SIZE):
+        """Class constructor."""
+        self.db_map = db_map
+        self.object_class_id_dict = object_class_id_dict
+        self.batch_size = batch_size
+        self._parameter_id_dict = dict()
+        self._existing_object_names = set()
+        # Resolved when the first relationships are added, after all objects
+        self._relationship_class_id_dict = None
+        self._object_id_dict = None
+        self._relationship_names = None
+        self._skipped = Counter()
+        self._missing = Counter()
+
+    def add_batch(self, batch):
+        """Add one batch into the database mapping.
+
+        Args:
+            batch (tuple): batch as given by read_datapackage_batches
+
+        Returns:
+            (str, int) name of the resource and number of its rows processed so far,
+            None for a CLASS_BATCH
+        """
+        kind, object_class_name, row_count, items = batch
+        if kind == CLASS_BATCH:
+            self._add_classes(object_class_name, *items)
+            return None
+        if kind == OBJECT_BATCH:
+            self._add_objects(object_class_name, items)
+        else:
+            self._add_relationships(object_class_name, items)
+        return object_class_name, row_count
+
+    def finish(self):
+        """Log rows that were skipped because their object exists and references that were not found."""
+        for object_class_name, skipped in self._skipped.items():
+            logging.error("Skipped {} rows in resource '{}' whose object already exists.".format(
+                skipped, object_class_name))
+        for object_class_name, missing in self._missing.items():
+            logging.error("Couldn't find {} references in resource '{}'.".format(missing, object_class_name))
+
+    def _add_classes(self, object_class_name, child_object_class_names, parameter_names):
+        """Add relationship classes and parameters of an object class, and resolve parameter ids once."""
+        object_class_id = self.object_class_id_dict[object_class_name]
+        relationship_classes = [
+            {
+                "object_class_id_list": [object_class_id, self.object_class_id_dict[child_object_class_name]],
+                "name": object_class_name + "_" + child_object_class_name
+            }
+            for child_object_class_name in child_object_class_names
+        ]
+        add_in_batches(self.db_map.add_wide_relationship_classes, relationship_classes, self.batch_size)
+        # Resolve parameter ids once, adding parameters that don't exist yet
+        parameter_id_dict = {
+            x.name: x.id for x in self.db_map.parameter_list() if x.object_class_id == object_class_id
+        }
+        new_parameters = [
+            {"object_class_id": object_class_id, "name": name}
+            for name in parameter_names if name not in parameter_id_dict
+        ]
+        for parameter in add_in_batches(self.db_map.add_parameters, new_parameters, self.batch_size):
+            if parameter is not None:
+                parameter_id_dict[parameter.name] = parameter.id
+        self._parameter_id_dict = parameter_id_dict
+        self._existing_object_names = set(x.name for x in self.db_map.object_list() if x.class_id == object_class_id)
+
+    def _add_objects(self, object_class_name, objects):
+        """Add objects that don't exist yet and their parameter values."""
+        object_class_id = self.object_class_id_dict[object_class_name]
+        new_objects = list()
+        object_values = dict()
+        for object_name, values in objects:
+            if object_name in self._existing_object_names:
+                self._skipped[object_class_name] += 1
+                continue
+            self._existing_object_names.add(object_name)
+            new_objects.append({"class_id": object_class_id, "name": object_name})
+            object_values[object_name] = values
+        parameter_values = list()
+        for object_ in add_in_batches(self.db_map.add_objects, new_objects, self.batch_size):
+            if object_ is None:
+                continue
+            # Match added objects to rows by name, not by position
+            for parameter_name, value in object_values[object_.name]:
+                parameter_id = self._parameter_id_dict.get(parameter_name)
+                if parameter_id is None:
                     continue
+                parameter_values.append({"object_id": object_.id, "parameter_id": parameter_id, "value": value})
+        add_in_batches(self.db_map.add_parameter_values, parameter_values, self.batch_size)
+
+    def _add_relationships(self, object_class_name, relationships):
+        """Add relationships that don't exist yet between existing objects."""
+        if self._object_id_dict is None:
+            self._relationship_class_id_dict = {x.name: x.id for x in self.db_map.wide_relationship_class_list()}
+            self._object_id_dict = {(x.class_id, x.name): x.id for x in self.db_map.object_list()}
+            self._relationship_names = set((x.class_id, x.name) for x in self.db_map.wide_relationship_list())
+        object_class_id = self.object_class_id_dict[object_class_name]
+        new_relationships = list()
+        for relationship_class_name, object_name, child_object_class_name, child_object_name in relationships:
+            relationship_class_id = self._relationship_class_id_dict.get(relationship_class_name)
+            if relationship_class_id is None:
+                continue
+            object_id = self._object_id_dict.get((object_class_id, object_name))
+            if object_id is None:
+                continue
+            child_object_class_id = self.object_class_id_dict[child_object_class_name]
+            child_object_id = self._object_id_dict.get((child_object_class_id, child_object_name))
+            if child_object_id is None:
+                self._missing[object_class_name] += 1
+                continue
+            relationship_name = relationship_class_name + "_" + object_name + "_" + child_object_name
+            if (relationship_class_id, relationship_name) in self._relationship_names:
+                continue
+            self._relationship_names.add((relationship_class_id, relationship_name))
+            new_relationships.append({
+                "class_id": relationship_class_id,
+                "object_id_list": [object_id, child_object_id],
+                "name": relationship_name
+            })
+        add_in_batches(self.db_map.add_wide_relationships, new_relationships, self.batch_size)
+
+
+def object_name_index(resource, fields):
+    """Index the object names created from the rows of a resource by the values of given fields.
+    If several rows have the same values, the first one is used.
+
+    Args:
+        resource (datapackage.Resource): resource to index
+        fields (Iterable): names of fields whose values are used as keys
+
+    Returns:
+        (dict) object names keyed by tuples of field values
+    """
+    field_names = resource.schema.field_names
+    columns = [field_names.index(field) for field in fields]
+    primary_key_fields = [field_names.index(field) for field in resource.schema.primary_key]
+    field_count = len(field_names)
+    index = dict()
+    for i, row in enumerate(iter_resource_rows(resource)):
+        if len(row) < field_count:
+            row = row + [None] * (field_count - len(row))
+        key = tuple(row[j] for j in columns)
+        if key not in index:
+            object_name = row_object_name(row, i, primary_key_fields, resource.name)
+            if object_name is not None:
+                index[key] = object_name
+    return index
+
+
+def row_object_name(row, i, primary_key_fields, object_class_name):
+    """Return name of the object created from a resource row.
+
+    Args:
+        row (list): row of the resource
+        i (int): index of the row
+        primary_key_fields (list): indexes of primary key fields
+        object_class_name (str): name of the object class, used if there's no primary key
+
+    Returns:
+        (str) primary key values joined by underscore, or class name followed by row index,
+        None if a primary key value is empty
+    """
+    if primary_key_fields:
+        values = [row[j] for j in primary_key_fields]
+        if any(value is None or value == "" for value in values):
+            return None
+        return "_".join(str(value) for value in values)
+    return object_class_name + str(i)
+
+
+def field_list(fields):
+    """Return field names of a foreign key as a list, the descriptor allows a single string too."""
+    if isinstance(fields, str):
+        return [fields]
+    return list(fields)
+
+
+def iter_resource_rows(resource):
+    """Iterate over the rows of a tabular resource without loading the whole table into memory.
+    Local csv files are read directly with the csv module, using the dialect and encoding
+    in the resource descriptor. Other resources are read through `resource.iter`.
+
+    Args:
+        resource (datapackage.Resource): tabular resource to read
+
+    Returns:
+        (iterator) rows as lists of strings, not including the header
+    """
+    path = local_csv_path(resource)
+    if path is None:
+        return resource.iter(cast=False)
+    descriptor = resource.descriptor
+    return iter_csv_rows(path, descriptor.get("dialect", {}), descriptor.get("encoding"))
+
+
+def local_csv_path(resource):
+    """Returns the path to the csv file of a resource, None if the resource is not a single local csv file.
+
+    Args:
+        resource (datapackage.Resource): tabular resource
+
+    Returns:
+        (str) path to csv file
+    """
+    file_format = resource.descriptor.get("format") or os.path.splitext(str(resource.source))[1][1:]
+    if not resource.local or resource.multipart or file_format.lower() != "csv":
+        return None
+    return resource.source
+
+
+def iter_csv_rows(path, dialect, encoding=None):
+    """Iterate over the rows of a csv file described by a datapackage csv dialect.
+
+    Args:
+        path (str): path to csv file
+        dialect (dict): csv dialect of the resource descriptor
+        encoding (str): encoding of the file, utf-8 if None
+
+    Returns:
+        (generator) rows as lists of strings, not including the header unless dialect says there is none
+    """
+    if not encoding or encoding.lower().replace("-", "") == "utf8":
+        # strip byte order mark if any
+        encoding = "utf-8-sig"
+    kwargs = dict(
+        delimiter=dialect.get("delimiter", ","),
+        quotechar=dialect.get("quoteChar", '"'),
+        doublequote=dialect.get("doubleQuote", True),
+        escapechar=dialect.get("escapeChar"),
+        skipinitialspace=dialect.get("skipInitialSpace", False)
+    )
+    with open(path, newline="", encoding=encoding) as f:
+        reader = csv.reader(f, **kwargs)
+        if dialect.get("header", True):
+            next(reader, None)
+        for row in reader:
+            yield row
+
+
+def add_in_batches(add_items, items, batch_size=IMPORT_BATCH_SIZE):
+    """Add items to the database calling `add_items` with at most `batch_size` items at a time.
+    If a batch fails, its items are added one by one so that only the failing ones are left out.
+
+    Args:
+        add_items (function): database mapping method adding items, e.g. `add_objects`
+        items (list): dictionaries of items to add
+        batch_size (int): maximum number of items per call
+
+    Returns:
+        (list) added items in the order of `items`, None for items that couldn't be added
+    """
+    added = list()
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        try:
+            added.extend(add_items(*batch))
+        except SpineDBAPIError:
+            # find failing items by adding them one by one
+            for item in batch:
                 try:
-                    parameter_value = mapping.add_parameter_value(
-                        object_id=object_id,
-                        parameter_id=parameter.id,
-                        value=value
-                    )
+                    added.extend(add_items(item))
                 except SpineDBAPIError as e:
                     logging.error(e.msg)
-
-        # TODO: Import relationships from foreign keys
-        # Iterate over resources (again) to create relationships
-        # for resource in self.datapackage.resources:
-        #    parent_object_class_name = resource.name
-        #    if parent_object_class_name not in self.object_class_name_list:
-        #        continue
-        #    relationship_class_id_dict = dict()
-        #    child_object_class_id_dict = dict()
-        #    for field in resource.schema.fields:
-        #        # A field whose named starts with the object_class is an index and should be skipped
-        #        if field.name.startswith(parent_object_class_name):
-        #            continue
-        #        # Fields whose name ends with an object class name are foreign keys
-        #        # and used to create relationships
-        #        child_object_class_name = None
-        #        for x in self.object_class_name_list:
-        #            if field.name.endswith(x):
-        #                child_object_class_name = x
-        #                break
-        #        if child_object_class_name:
-        #            relationship_class_name = resource.name + "_" + field.name
-        #            relationship_class_id_dict[field.name] = self.session.query(self.RelationshipClass.id).\
-        #                filter_by(name=relationship_class_name).one().id
-        #            child_object_class_id_dict[field.name] = self.session.query(self.ObjectClass.id).\
-        #                filter_by(name=child_object_class_name).one().id
-        #    for i, row in enumerate(self.resource_tables[resource.name][1:]):
-        #        row_dict = dict(zip(resource.schema.field_names, row))
-        #        if parent_object_class_name in row_dict:
-        #            parent_object_name = row_dict[parent_object_class_name]
-        #        else:
-        #            parent_object_name = parent_object_class_name + str(i)
-        #        parent_object_id = self.session.query(self.Object.id).\
-        #            filter_by(name=parent_object_name).one().id
-        #        for field_name, value in row_dict.items():
-        #            if field_name in relationship_class_id_dict:
-        #                relationship_class_id = relationship_class_id_dict[field_name]
-        #                child_object_name = None
-        #                child_object_ref = value
-        #                child_object_class_id = child_object_class_id_dict[field_name]
-        #                child_object_class_name = self.session.query(self.ObjectClass.name).\
-        #                    filter_by(id=child_object_class_id).one().name
-        #                child_resource = self.datapackage.get_resource(child_object_class_name)
-        #                # Collect index and primary key columns in child resource
-        #                indices = list()
-        #                primary_key = None
-        #                for j, field in enumerate(child_resource.schema.fields):
-        #                    # A field whose named starts with the object_class is an index
-        #                    if field.name.startswith(child_object_class_name):
-        #                        indices.append(j)
-        #                        # A field named exactly as the object_class is the primary key
-        #                        if field.name == child_object_class_name:
-        #                            primary_key = j
-        #                # Look up the child object ref. in the child resource table
-        #                for k, row in enumerate(self.resource_tables[child_resource.name][1:]):
-        #                    if child_object_ref in [row[j] for j in indices]:
-        #                        # Found reference in index values
-        #                        if primary_key is not None:
-        #                            child_object_name = row[primary_key]
-        #                        else:
-        #                            child_object_name = child_object_class_name + str(k)
-        #                        break
-        #                if child_object_name is None:
-        #                    msg = "Couldn't find object ref {} to create relationship for field {}".\
-        #                        format(child_object_ref, field_name)
-        #                    self.ui.statusbar.showMessage(msg, 5000)
-        #                    continue
-        #                child_object_id = self.session.query(self.Object.id).\
-        #                    filter_by(name=child_object_name, class_id=child_object_class_id).one().id
-        #                relationship_name = parent_object_name + field_name + child_object_name
-        #                relationship = self.Relationship(
-        #                    commit_id=1,
-        #                    class_id=relationship_class_id,
-        #                    parent_object_id=parent_object_id,
-        #                    child_object_id=child_object_id,
-        #                    name=relationship_name
-        #                )
-        #                try:
-        #                    self.session.add(relationship)
-        #                    self.session.flush()
-        #                    object_id = object_.id
-        #                except DBAPIError as e:
-        #                    msg = "Failed to insert relationship {0} for object {1} of class {2}: {3}".\
-        #                        format(field_name, parent_object_name, parent_object_class_name, e.orig.args)
-        #                    self.ui.statusbar.showMessage(msg, 5000)
-        #                    self.session.rollback()
-        #                    return False
+                    added.append(None)
+    return added
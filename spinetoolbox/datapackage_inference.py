@@ -0,0 +1,101 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Functions to infer a datapackage descriptor from a directory of files,
+one resource schema per worker thread.
+
+:author: M. Marin (KTH)
+:date:   18.10.2026
+"""
+
+import glob
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datapackage import Resource
+
+INFER_SAMPLE_SIZE = 100
+
+
+def infer_datapackage_descriptor(base_path, pattern="*.csv", workers=None, sample_size=INFER_SAMPLE_SIZE,
+                                 progress=None, cancelled=None):
+    """Infers a datapackage descriptor with one resource for each file matching a pattern.
+    Resources are inferred concurrently, each one in a worker thread. Threads rather than processes
+    because reading a small sample of each file is mostly I/O, and worker processes would have to
+    start the application again in frozen builds. A resource is submitted to the pool only when
+    a worker is free, so that a cancelled inference stops once the running resources are inferred.
+
+    Args:
+        base_path (str): path to directory of the datapackage
+        pattern (str): glob pattern of files in `base_path` to add as resources
+        workers (int): number of worker threads, None to use the default of ThreadPoolExecutor,
+            0 to infer in the calling thread
+        sample_size (int): number of rows read from each file to infer field types
+        progress (function): called with the number of inferred resources and the total number of
+            resources after each resource is inferred
+        cancelled (function): called before each resource is started, the inference is cancelled
+            if it returns True
+
+    Returns:
+        (dict) datapackage descriptor, resources in alphabetical order of file paths,
+        None if the inference was cancelled
+    """
+    if cancelled is None:
+        cancelled = lambda: False
+    options = {'recursive': True} if '**' in pattern else {}
+    paths = sorted(os.path.relpath(path, base_path)
+                   for path in glob.glob(os.path.join(base_path, pattern), **options))
+    resources = [None] * len(paths)
+    if workers == 0 or len(paths) <= 1:
+        for i, path in enumerate(paths):
+            if cancelled():
+                return None
+            resources[i] = infer_resource_descriptor(base_path, path, sample_size)
+            if progress:
+                progress(i + 1, len(paths))
+    else:
+        max_workers = workers or min(32, (os.cpu_count() or 1) + 4)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = dict()
+            next_index = 0
+            n_done = 0
+            while pending or (next_index < len(paths) and not cancelled()):
+                while next_index < len(paths) and len(pending) < max_workers and not cancelled():
+                    future = executor.submit(infer_resource_descriptor, base_path, paths[next_index], sample_size)
+                    pending[future] = next_index
+                    next_index += 1
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    resources[pending.pop(future)] = future.result()
+                    n_done += 1
+                    if progress:
+                        progress(n_done, len(paths))
+        if next_index < len(paths):
+            return None
+    descriptor = {'profile': 'data-package', 'resources': resources}
+    if resources and all(r.get('profile') == 'tabular-data-resource' for r in resources):
+        descriptor['profile'] = 'tabular-data-package'
+    return descriptor
+
+
+def infer_resource_descriptor(base_path, path, sample_size=INFER_SAMPLE_SIZE):
+    """Infers the descriptor of one resource, see infer_datapackage_descriptor.
+
+    Args:
+        base_path (str): path to directory of the datapackage
+        path (str): path to resource file relative to `base_path`
+        sample_size (int): number of rows read from the file to infer field types
+
+    Returns:
+        (dict) resource descriptor
+    """
+    resource = Resource({'path': path}, base_path=base_path)
+    return resource.infer(limit=sample_size)
@@ -19,20 +19,52 @@ Functions to import and export from excel to spine database.
 # TODO: PEP8: Do not use bare except. Too broad exception clause
 
 from collections import namedtuple
-from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import groupby, islice, chain, repeat, takewhile
+from operator import itemgetter
+import hashlib
 import json
+import os
+import re
+import zipfile
+from xml.etree import ElementTree
 from openpyxl import Workbook, load_workbook
 from openpyxl.utils import get_column_letter
 from spinedatabase_api import SpineDBAPIError
 import logging
 
+# optional faster json decoders, the json module is used if neither is installed
+try:
+    from orjson import loads as fast_json_loads
+except ImportError:
+    try:
+        from ujson import loads as fast_json_loads
+    except ImportError:
+        fast_json_loads = None
+
 
 SheetData = namedtuple("SheetData", ["sheet_name", "class_name", "object_classes",
                                      "parameters", "parameter_values", "objects",
                                      "class_type"])
 
+DbObject = namedtuple("DbObject", ["id", "class_id"])
+DbParameter = namedtuple("DbParameter", ["id", "object_class_id", "relationship_class_id"])
+DbRelClass = namedtuple("DbRelClass", ["name", "id", "object_classes"])
+
+# number of parameter values updated with one call to the database mapping
+UPDATE_BATCH_SIZE = 1000
+# number of rows fetched from the database at a time when streaming an export
+EXPORT_YIELD_PER = 1000
+
+# xml namespaces and patterns used when fingerprinting sheets of an excel file
+SPREADSHEET_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+RELATIONSHIPS_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+SHEET_DATA_PATTERN = re.compile(rb"<(?:\w+:)?sheetData\b.*</(?:\w+:)?sheetData>", re.DOTALL)
+SHARED_STRING_CELL_PATTERN = re.compile(rb'<(?:\w+:)?c\b[^>]*?\bt="s"[^>]*>\s*<(?:\w+:)?v>(\d+)<')
 
-def import_xlsx_to_db(db, filepath):
+
+def import_xlsx_to_db(db, filepath, read_only=False, processes=None, fingerprints=None):
     """reads excel file in 'filepath' and insert into database in mapping 'db'.
     Returns two list, one with succesful writes to database, one with errors
     when trying to write to database.
@@ -40,49 +72,177 @@ def import_xlsx_to_db(db, filepath):
     Args:
         db (spinedatabase_api.DatabaseMapping): database mapping for database to write to
         filepath (str): str with filepath to excel file to read from
+        read_only (bool): if True, sheets are streamed row by row, see read_spine_xlsx
+        processes (int): number of processes used to parse sheets, see read_spine_xlsx
+        fingerprints (dict): if given, only sheets whose fingerprint differs from the one
+            in this dict are imported and the skipped sheets are reported in the insert log.
+            The dict maps sheet names to fingerprints of the last import into the database
+            and is updated with the fingerprints of this import, see sheet_fingerprints.
 
     Returns:
         (List, List) Returns two lists, first contains all imported data,
         second one contains error information on all failed writes
     """
-
     insert_log = []
     error_log = []
 
-    obj_data, rel_data, error_log_temp = read_spine_xlsx(filepath)
-    error_log = error_log + error_log_temp
+    sheet_names = None
+    if fingerprints is not None:
+        current = sheet_fingerprints(filepath)
+        sheet_names = [s for s, f in current.items() if fingerprints.get(s) != f]
+        insert_log = [["skipped sheet", s] for s in current if s not in sheet_names]
 
-    insert_log_temp, error_log_temp = export_object_classes_to_spine_db(db, obj_data)
-    insert_log = insert_log + insert_log_temp
+    obj_data, rel_data, error_log_temp = read_spine_xlsx(filepath, read_only=read_only,
+                                                      processes=processes, sheet_names=sheet_names)
     error_log = error_log + error_log_temp
 
-    insert_log_temp, error_log_temp = export_object_parameters_spine_db(db, obj_data)
+    insert_log_temp, error_log_temp = export_sheet_data_to_spine_db(db, obj_data, rel_data)
     insert_log = insert_log + insert_log_temp
     error_log = error_log + error_log_temp
 
-    insert_log_temp, error_log_temp = export_object_to_spine_db(db, obj_data)
-    insert_log = insert_log + insert_log_temp
-    error_log = error_log + error_log_temp
+    if fingerprints is not None:
+        for s in [s for s in fingerprints if s not in current]:
+            del fingerprints[s]
+        if not error_log_temp:
+            # sheets that couldn't be read are imported again next time
+            failed_sheets = set(e[1] for e in error_log if e[0] == "sheet")
+            fingerprints.update((s, current[s]) for s in sheet_names if s not in failed_sheets)
 
-    insert_log_temp, error_log_temp = export_object_parameter_values(db, obj_data)
-    insert_log = insert_log + insert_log_temp
-    error_log = error_log + error_log_temp
+    return insert_log, error_log
 
-    insert_log_temp, error_log_temp = export_relationship_class_to_spine_db(db, rel_data)
-    insert_log = insert_log + insert_log_temp
-    error_log = error_log + error_log_temp
 
-    insert_log_temp, error_log_temp = export_relationships_parameters_to_spine_db(db, rel_data)
-    insert_log = insert_log + insert_log_temp
-    error_log = error_log + error_log_temp
+def sheet_fingerprints(filepath):
+    """Computes a fingerprint for each sheet in an excel file without parsing the sheets.
+    The fingerprint is a hash of the cell data in the xml of the sheet together with
+    the shared strings the sheet refers to, so that changing one sheet doesn't change
+    the fingerprints of other sheets.
 
-    insert_log_temp, error_log_temp = export_relationships_to_spine_db(db, rel_data)
-    insert_log = insert_log + insert_log_temp
-    error_log = error_log + error_log_temp
+    Args:
+        filepath (str): str with filepath to excel file
+
+    Returns:
+        (dict) sheet names as keys and fingerprints as values, in workbook order
+    """
+    with zipfile.ZipFile(filepath) as archive:
+        workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+        rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+        targets = {r.get("Id"): r.get("Target") for r in rels}
+        shared_strings = []
+        if "xl/sharedStrings.xml" in archive.namelist():
+            root = ElementTree.fromstring(archive.read("xl/sharedStrings.xml"))
+            shared_strings = ["".join(t.text or "" for t in si.iter("{%s}t" % SPREADSHEET_NS))
+                              for si in root.iter("{%s}si" % SPREADSHEET_NS)]
+        fingerprints = {}
+        for sheet in workbook.iter("{%s}sheet" % SPREADSHEET_NS):
+            target = targets[sheet.get("{%s}id" % RELATIONSHIPS_NS)]
+            # targets are relative to xl/ unless absolute
+            path = target[1:] if target.startswith("/") else "xl/" + target
+            xml = archive.read(path)
+            # only hash cell data, the rest of the sheet changes for example with selection
+            match = SHEET_DATA_PATTERN.search(xml)
+            if match:
+                xml = match.group()
+            sha = hashlib.sha1(xml)
+            for i in SHARED_STRING_CELL_PATTERN.findall(xml):
+                sha.update(shared_strings[int(i)].encode("utf-8") + b"\0")
+            fingerprints[sheet.get("name")] = sha.hexdigest()
+    return fingerprints
+
+
+def fingerprint_filepath(filepath):
+    """Returns the filepath of the sidecar file storing sheet fingerprints of an excel file.
+
+    Args:
+        filepath (str): str with filepath to excel file
+
+    Returns:
+        (str)
+    """
+    return filepath + ".fingerprints.json"
+
+
+def load_sheet_fingerprints(filepath, db_url):
+    """Loads fingerprints of sheets last imported from an excel file into a database.
+
+    Args:
+        filepath (str): str with filepath to excel file
+        db_url (str): url of the database
+
+    Returns:
+        (dict) sheet names as keys and fingerprints as values, empty if there are none
+    """
+    try:
+        with open(fingerprint_filepath(filepath), "r") as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return stored.get(database_key(db_url), {})
+
+
+def save_sheet_fingerprints(filepath, db_url, fingerprints):
+    """Saves fingerprints of sheets imported from an excel file into a database into
+    a sidecar file next to the excel file. Fingerprints of other databases are kept.
+
+    Args:
+        filepath (str): str with filepath to excel file
+        db_url (str): url of the database
+        fingerprints (dict): sheet names as keys and fingerprints as values
+    """
+    sidecar = fingerprint_filepath(filepath)
+    stored = {}
+    if os.path.exists(sidecar):
+        try:
+            with open(sidecar, "r") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            pass
+    stored[database_key(db_url)] = fingerprints
+    with open(sidecar, "w") as f:
+        json.dump(stored, f, indent=4)
+
+
+def database_key(db_url):
+    """Returns a key identifying a database in fingerprint files. The url is hashed
+    so that credentials in it are not written to disk.
+
+    Args:
+        db_url (str): url of the database
+
+    Returns:
+        (str)
+    """
+    return hashlib.sha1(str(db_url).encode("utf-8")).hexdigest()
 
-    insert_log_temp, error_log_temp = export_relationships_parameter_value_to_spine_db(db, rel_data)
-    insert_log = insert_log + insert_log_temp
-    error_log = error_log + error_log_temp
+
+def export_sheet_data_to_spine_db(db, obj_data, rel_data):
+    """Inserts merged sheet data into database in mapping 'db'.
+
+    Args:
+        db (spinedatabase_api.DatabaseMapping): database mapping for database to write to
+        obj_data (List[SheetData]): object class data, as given by read_spine_xlsx
+        rel_data (List[SheetData]): relationship class data, as given by read_spine_xlsx
+
+    Returns:
+        (List, List) Returns two lists, first contains all imported data,
+        second one contains error information on all failed writes
+    """
+    insert_log = []
+    error_log = []
+
+    # lookup indexes shared by all stages, each table is queried only once
+    context = ImportContext(db)
+    stages = [(export_object_classes_to_spine_db, obj_data),
+              (export_object_parameters_spine_db, obj_data),
+              (export_object_to_spine_db, obj_data),
+              (export_object_parameter_values, obj_data),
+              (export_relationship_class_to_spine_db, rel_data),
+              (export_relationships_parameters_to_spine_db, rel_data),
+              (export_relationships_to_spine_db, rel_data),
+              (export_relationships_parameter_value_to_spine_db, rel_data)]
+    for export_function, data in stages:
+        insert_log_temp, error_log_temp = export_function(db, data, context)
+        insert_log = insert_log + insert_log_temp
+        error_log = error_log + error_log_temp
 
     return insert_log, error_log
 
@@ -178,6 +338,8 @@ def unstack_list_of_tuples(data, headers, key_cols, value_name_col, value_col):
     """Unstacks list of lists or list of tuples and creates a list of namedtuples
     whit unstacked data (pivoted data)
 
+    Data is pivoted in one pass, collecting values into a dict per unique key.
+
     Args:
         data (List[List]): List of lists with data to unstack
         headers (List[str]): List of header names for data
@@ -189,44 +351,32 @@ def unstack_list_of_tuples(data, headers, key_cols, value_name_col, value_col):
         (List[namedtuple]): List of namedtuples whit fields given by headers
         and unqiue names in value_name_col column
     """
-
     key_names = [headers[n] for n in key_cols]
-
-    # find unique rows for key names.
-    unique_keys = []
-    values = []
-    keyfunc = lambda x: [x[k] for k in key_cols]
-
-    # value names with invalid key_cols
-    value_names = [x[value_name_col] for x in data if None in keyfunc(x)]
-
-    # remove data with invalid key cols
-    data = [x for x in data if None not in keyfunc(x)]
-    data = sorted(data, key=keyfunc)
-    for k, g in groupby(data, key=keyfunc):
-        if not None in k:
-            unique_keys.append(k)
-        vn = {gv[value_name_col]: gv[value_col] for gv in g if gv[value_name_col] is not None}
-        values.append(vn)
-        value_names = value_names + list(vn.keys())
-
-    # names of values to create pivoted values for
-    value_names = list(set([v for v in value_names if v is not None]))
+    keyfunc = key_getter(key_cols)
+
+    # names of values to create pivoted values for, in order of appearance.
+    # value names with invalid key_cols are included.
+    value_names = {}
+    # values by value name for each unique key
+    key_values = {}
+    for x in data:
+        value_name = x[value_name_col]
+        if value_name is not None and value_name not in value_names:
+            value_names[value_name] = None
+        key = keyfunc(x)
+        # skip data with invalid key cols
+        if None in key:
+            continue
+        values = key_values.get(key)
+        if values is None:
+            values = key_values[key] = {}
+        if value_name is not None:
+            values[value_name] = x[value_col]
 
     # pivot/unstack data
-    PivotedData = namedtuple("Data", key_names+value_names)
-
-    data_list_out = []
-    for k, value_dict in zip(unique_keys, values):
-        value_list = []
-        for key in value_names:
-            if key in value_dict:
-                value_list.append(value_dict[key])
-            else:
-                value_list.append(None)
-        data_list_out.append(PivotedData._make(k+value_list))
-
-    return data_list_out
+    PivotedData = data_tuple(tuple(key_names + list(value_names)))
+    return [PivotedData._make(k + tuple(key_values[k].get(v) for v in value_names))
+            for k in sorted(key_values)]
 
 
 def stack_list_of_tuples(data, headers, key_cols, value_cols):
@@ -245,48 +395,100 @@ def stack_list_of_tuples(data, headers, key_cols, value_cols):
     """
     value_names = [headers[n] for n in value_cols]
     key_names = [headers[n] for n in key_cols]
-    new_tuple_names = key_names + ["parameter", "value"]
-    NewDataTuple = namedtuple("Data", new_tuple_names)
+    make = data_tuple(tuple(key_names + ["parameter", "value"]))._make
+    keyfunc = key_getter(key_cols)
+    value_name_cols = list(zip(value_names, value_cols))
     # takes unstacked data and duplicates columns in key_cols and then zips
     # them with values in value_cols
-    new_data_list = [list(map(
-            NewDataTuple._make,
-            [a+[b]+[c] for a, b, c in zip([[dl[k] for k in key_cols]]*len(value_cols),
-                                          value_names, [dl[vk] for vk in value_cols])])) for dl in data]
-    new_data_list = [item for sublist in new_data_list for item in sublist]
+    new_data_list = []
+    for dl in data:
+        key = keyfunc(dl)
+        new_data_list.extend([make(key + (name, dl[col])) for name, col in value_name_cols])
     return new_data_list
 
 
+def key_getter(key_cols):
+    """Returns a function that gets the values of given columns from a row as a tuple.
+
+    Args:
+        key_cols (List[Int]): List of index for columns to get
+
+    Returns:
+        (function)
+    """
+    if len(key_cols) == 1:
+        key_col = key_cols[0]
+        return lambda x: (x[key_col],)
+    if not key_cols:
+        return lambda x: ()
+    return itemgetter(*key_cols)
+
+
+@lru_cache(maxsize=128)
+def data_tuple(field_names):
+    """Returns a namedtuple class named 'Data' with given field names. Classes are
+    cached so that pivoting many classes with the same fields creates only one.
+
+    Args:
+        field_names (Tuple[str]): names of the fields
+
+    Returns:
+        (type) namedtuple class
+    """
+    return namedtuple("Data", field_names)
+
+
+def load_json(value):
+    """Parses a json string, using orjson or ujson if installed. Falls back to the
+    json module for input they reject, for example NaN and Infinity.
+
+    Args:
+        value (str): json string
+
+    Returns:
+        parsed value
+
+    Raises:
+        ValueError: if value is not valid json
+    """
+    if fast_json_loads is not None:
+        try:
+            return fast_json_loads(value)
+        except ValueError:
+            pass
+    return json.loads(value)
+
+
 def unpack_json_parameters(data, json_index):
     out_data = []
     for data_row in data:
-        json_data = json.loads(data_row[json_index].replace("\n", ""))
-
-        if json_index == 0:
-            key_cols = [list(data_row[json_index+1:])]*len(json_data)
-        else:
-            key_cols = [list(data_row[:json_index]) +
-                        list(data_row[json_index+1:])]*len(json_data)
-
-        out_data += [a + [b] + [c] for a, b, c in
-                     zip(key_cols, range(0, len(json_data), 1), json_data)]
+        json_data = load_json(data_row[json_index].replace("\n", ""))
+        key = list(data_row[:json_index]) + list(data_row[json_index+1:])
+        out_data.extend([key + [i, v] for i, v in enumerate(json_data)])
     return out_data
 
 
 def pack_json_parameters(data, key_cols, value_col, index_col=None):
+    # group values by key cols in one pass, keeping the order of rows in each group
+    groups = {}
+    keyfunc = itemgetter(*key_cols) if len(key_cols) > 1 else lambda x: (x[key_cols[0]],)
+    for row in data:
+        key = keyfunc(row)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = []
+        group.append(row)
     out_data = []
-    # group by keys cols
-    keyfunc = lambda x: [x[k] for k in key_cols]
-    data = sorted(data, key=keyfunc)
-    for key, grouped in groupby(data, key=keyfunc):
+    for key in sorted(groups, key=list):
+        grouped = groups[key]
         # sort if index is given.
         if index_col is not None:
-            grouped = sorted(grouped, key=lambda x: x[index_col])
+            grouped = sorted(grouped, key=itemgetter(index_col))
 
         # pack values into json
         values = [g[value_col] for g in grouped]
         json_val = json.dumps(values)
-        out_data.append(key + [json_val])
+        out_data.append(list(key) + [json_val])
     return out_data
 
 
@@ -314,9 +516,9 @@ def get_unstacked_relationships(db):
             rel_list = row[1].split(',')
             parameter = row[2]
             try:
-                val = json.loads(row[3].replace("\n", ""))
+                val = load_json(row[3].replace("\n", ""))
                 json_vals.append([rel_list+[parameter], val])
-            except json.JSONDecodeError:
+            except ValueError:
                 logging.error("error parsing json value for parameter: {} for relationship {}"
                               .format(parameter, row[1]))
         if json_vals:
@@ -361,9 +563,9 @@ def get_unstacked_objects(db):
             obj = row[1]
             parameter = row[2]
             try:
-                val = json.loads(row[3].replace("\n", ""))
+                val = load_json(row[3].replace("\n", ""))
                 json_vals.append([[obj, parameter], val])
-            except json.JSONDecodeError:
+            except ValueError:
                 logging.error("error parsing json value for parameter: {} for object {}".format(parameter, obj))
         if json_vals:
             parsed_json.append([k, [k], json_vals])
@@ -515,13 +717,27 @@ def write_objects_to_xlsx(wb, object_data):
                 ws.cell(row=start_row + r, column=start_col + c).value = val
 
 
-def export_spine_database_to_xlsx(db, filepath):
+def export_spine_database_to_xlsx(db, filepath, write_only=False):
     """Writes all data in a spine database into an excel file.
 
     Args:
         db (spinedatabase_api.DatabaseMapping): database mapping for database.
         filepath (str): str with filepath to save excel file to.
+        write_only (bool): if True, data is streamed from the database one class
+            at a time into a write-only workbook, instead of building the whole
+            workbook in memory.
     """
+    if write_only:
+        wb = Workbook(write_only=True)
+        append_relationships_to_xlsx(wb, stream_unstacked_relationships(db))
+        append_objects_to_xlsx(wb, stream_unstacked_objects(db))
+        append_json_array_to_xlsx(wb, stream_json_arrays(db, "object"), "object")
+        append_json_array_to_xlsx(wb, stream_json_arrays(db, "relationship"), "relationship")
+        if not wb.worksheets:
+            # A workbook without sheets is invalid, write an empty one like Workbook() does by default
+            wb.create_sheet("Sheet")
+        wb.save(filepath)
+        return
     obj_data, obj_json_data = get_unstacked_objects(db)
     rel_data, rel_json_data = get_unstacked_relationships(db)
     wb = Workbook()
@@ -533,64 +749,441 @@ def export_spine_database_to_xlsx(db, filepath):
     wb.close()
 
 
-def read_spine_xlsx(filepath):
+def stream_unstacked_objects(db):
+    """Yields unstacked parameter data for objects one object class at a time,
+    in the same format as get_unstacked_objects. Rows are generated from
+    queries fetching EXPORT_YIELD_PER rows at a time.
+
+    Args:
+        db (spinedatabase_api.DatabaseMapping): database mapping for database
+
+    Yields:
+        (List): object class name, rows of object name and parameter values,
+        object class names and parameter names.
+    """
+    class_parameters = {}
+    for p in db.object_parameter_list().all():
+        class_parameters.setdefault(p.object_class_name, []).append(p.parameter_name)
+    for oc in db.object_class_list().all():
+        parameters = sorted(class_parameters.get(oc.name, []))
+        yield [oc.name, unstacked_object_rows(db, oc.id, parameters), [oc.name], parameters]
+
+
+def unstacked_object_rows(db, object_class_id, parameters):
+    """Yields one row per object of the given class, object name followed by
+    the values of the given parameters.
+
+    Args:
+        db (spinedatabase_api.DatabaseMapping): database mapping for database
+        object_class_id (int): id of object class
+        parameters (List[str]): parameter names, one column each
+
+    Yields:
+        (List)
+    """
+    par_index = {p: i + 1 for i, p in enumerate(parameters)}
+    values = db.object_parameter_value_list().subquery()
+    qry = db.session.query(values.c.object_name, values.c.parameter_name, values.c.value).\
+        filter(values.c.object_class_id == object_class_id).\
+        order_by(values.c.object_name).yield_per(EXPORT_YIELD_PER)
+    objects_with_values = set()
+    for object_name, group in groupby(qry, key=lambda x: x.object_name):
+        row = [object_name] + [None] * len(parameters)
+        for v in group:
+            if v.parameter_name in par_index:
+                row[par_index[v.parameter_name]] = v.value
+        objects_with_values.add(object_name)
+        yield row
+    # objects without parameter values
+    objects = db.object_list().subquery()
+    qry = db.session.query(objects.c.name).filter(objects.c.class_id == object_class_id).\
+        yield_per(EXPORT_YIELD_PER)
+    for o in qry:
+        if o.name not in objects_with_values:
+            yield [o.name] + [None] * len(parameters)
+
+
+def stream_unstacked_relationships(db):
+    """Yields unstacked parameter data for relationships one relationship class
+    at a time, in the same format as get_unstacked_relationships. Rows are
+    generated from queries fetching EXPORT_YIELD_PER rows at a time.
+
+    Args:
+        db (spinedatabase_api.DatabaseMapping): database mapping for database
+
+    Yields:
+        (List): relationship class name, rows of object names and parameter values,
+        object class names and parameter names.
+    """
+    class_parameters = {}
+    for p in db.relationship_parameter_list().all():
+        class_parameters.setdefault(p.relationship_class_name, []).append(p.parameter_name)
+    for rc in db.wide_relationship_class_list().all():
+        parameters = sorted(class_parameters.get(rc.name, []))
+        yield [rc.name, unstacked_relationship_rows(db, rc.id, parameters),
+               rc.object_class_name_list.split(','), parameters]
+
+
+def unstacked_relationship_rows(db, relationship_class_id, parameters):
+    """Yields one row per relationship of the given class, object names followed by
+    the values of the given parameters.
+
+    Args:
+        db (spinedatabase_api.DatabaseMapping): database mapping for database
+        relationship_class_id (int): id of relationship class
+        parameters (List[str]): parameter names, one column each
+
+    Yields:
+        (List)
+    """
+    par_index = {p: i for i, p in enumerate(parameters)}
+    values = db.relationship_parameter_value_list().subquery()
+    qry = db.session.query(values.c.object_name_list, values.c.parameter_name, values.c.value).\
+        filter(values.c.relationship_class_id == relationship_class_id).\
+        order_by(values.c.object_name_list).yield_per(EXPORT_YIELD_PER)
+    relationships_with_values = set()
+    for object_name_list, group in groupby(qry, key=lambda x: x.object_name_list):
+        row = [None] * len(parameters)
+        for v in group:
+            if v.parameter_name in par_index:
+                row[par_index[v.parameter_name]] = v.value
+        relationships_with_values.add(object_name_list)
+        yield object_name_list.split(',') + row
+    # relationships without parameter values
+    relationships = db.wide_relationship_list().subquery()
+    qry = db.session.query(relationships.c.object_name_list).\
+        filter(relationships.c.class_id == relationship_class_id).yield_per(EXPORT_YIELD_PER)
+    for r in qry:
+        if r.object_name_list not in relationships_with_values:
+            yield r.object_name_list.split(',') + [None] * len(parameters)
+
+
+def stream_json_arrays(db, sheet_type):
+    """Yields json array data one object or relationship class at a time, in the
+    same format as the json data of get_unstacked_objects and get_unstacked_relationships.
+    The values of one class are kept in memory since json sheets are written column wise.
+
+    Args:
+        db (spinedatabase_api.DatabaseMapping): database mapping for database
+        sheet_type (str): str with value "relationship" or "object"
+
+    Yields:
+        (List): class name, object class names and list of object path and json values.
+    """
+    if sheet_type == "relationship":
+        values = db.relationship_parameter_value_list().subquery()
+        class_name = values.c.relationship_class_name
+        path = values.c.object_name_list
+        class_2_obj_list = {rc.name: rc.object_class_name_list.split(',')
+                            for rc in db.wide_relationship_class_list().all()}
+    elif sheet_type == "object":
+        values = db.object_parameter_value_list().subquery()
+        class_name = values.c.object_class_name
+        path = values.c.object_name
+        class_2_obj_list = None
+    else:
+        raise ValueError("sheet_type must be a str with value 'relationship' or 'object'")
+    qry = db.session.query(class_name.label("class_name"), path.label("path"),
+                           values.c.parameter_name, values.c.json).\
+        filter(values.c.json.isnot(None)).order_by(class_name).yield_per(EXPORT_YIELD_PER)
+    for k, rows in groupby(qry, key=lambda x: x.class_name):
+        json_vals = []
+        for row in rows:
+            try:
+                val = load_json(row.json.replace("\n", ""))
+                json_vals.append([row.path.split(',') + [row.parameter_name], val])
+            except ValueError:
+                logging.error("error parsing json value for parameter: {} for {} {}"
+                              .format(row.parameter_name, sheet_type, row.path))
+        if json_vals:
+            object_classes = class_2_obj_list[k] if class_2_obj_list is not None else [k]
+            yield [k, object_classes, json_vals]
+
+
+def append_relationships_to_xlsx(wb, relationship_data):
+    """Appends Classes, parameter and parameter values for relationships
+    to a write-only workbook, see write_relationships_to_xlsx.
+
+    Args:
+        wb (openpyxl.Workbook): write-only excel workbook to write too.
+        relationship_data (Iterable[List]): relationship data given by function
+            stream_unstacked_relationships or get_unstacked_relationships
+    """
+    for rel in relationship_data:
+        # try setting the sheetname to relationship class name
+        # sheet name can only be 31 chars log
+        title = "rel_" + rel[0]
+        ws = wb.create_sheet(title if len(title) < 32 else None)
+        for row in relationship_sheet_rows(rel):
+            ws.append(row)
+
+
+def append_objects_to_xlsx(wb, object_data):
+    """Appends Classes, parameter and parameter values for objects
+    to a write-only workbook, see write_objects_to_xlsx.
+
+    Args:
+        wb (openpyxl.Workbook): write-only excel workbook to write too.
+        object_data (Iterable[List]): object data given by function
+            stream_unstacked_objects or get_unstacked_objects
+    """
+    for i, obj in enumerate(object_data):
+        # try setting the sheetname to object class name
+        # sheet name can only be 31 chars log
+        title = "obj_" + obj[0]
+        ws = wb.create_sheet(title if len(title) < 32 else "object_class{}".format(i))
+        for row in object_sheet_rows(obj):
+            ws.append(row)
+
+
+def append_json_array_to_xlsx(wb, data, sheet_type):
+    """Appends json array data for object classes and relationship classes
+    to a write-only workbook, see write_json_array_to_xlsx.
+
+    Args:
+        wb (openpyxl.Workbook): write-only excel workbook to write too.
+        data (Iterable[List]): json data given by function stream_json_arrays
+        sheet_type (str): str with value "relationship" or "object"
+    """
+    if sheet_type not in ("relationship", "object"):
+        raise ValueError("sheet_type must be a str with value 'relationship' or 'object'")
+    for i, d in enumerate(data):
+        # sheet name can only be 31 chars log
+        title = "json_" + d[0]
+        ws = wb.create_sheet(title if len(title) < 32 else '{}_json{}'.format(sheet_type, i))
+        for row in json_array_sheet_rows(d, sheet_type):
+            ws.append(row)
+
+
+def relationship_sheet_rows(rel):
+    """Yields the rows of a parameter sheet for one relationship class.
+
+    Args:
+        rel (List): relationship class data, one item of stream_unstacked_relationships
+
+    Yields:
+        (List) rows of the sheet
+    """
+    yield ["Sheet type", "Data type", "relationship class name", "Number of relationship dimensions",
+           "Number of pivoted relationship dimensions"]
+    yield ["relationship", "Parameter", rel[0], len(rel[2]), 0]
+    yield []
+    yield list(rel[2]) + list(rel[3])
+    for line in rel[1]:
+        yield line
+
+
+def object_sheet_rows(obj):
+    """Yields the rows of a parameter sheet for one object class.
+
+    Args:
+        obj (List): object class data, one item of stream_unstacked_objects
+
+    Yields:
+        (List) rows of the sheet
+    """
+    yield ["Sheet type", "Data type", "object class name"]
+    yield ["object", "Parameter", obj[0]]
+    yield []
+    yield list(obj[2]) + list(obj[3])
+    for line in obj[1]:
+        yield line
+
+
+def json_array_sheet_rows(d, sheet_type):
+    """Yields the rows of a json array sheet for one class. The columns
+    of the class are transposed into rows.
+
+    Args:
+        d (List): json data, one item of stream_json_arrays
+        sheet_type (str): str with value "relationship" or "object"
+
+    Yields:
+        (List) rows of the sheet
+    """
+    if sheet_type == "relationship":
+        yield ["Sheet type", "Data type", sheet_type + " class name", "Number of relationship dimensions"]
+        yield [sheet_type, "json array", d[0], len(d[1])]
+    else:
+        yield ["Sheet type", "Data type", sheet_type + " class name"]
+        yield [sheet_type, "json array", d[0]]
+    yield []
+    title_rows = d[1] + ["json parameter"]
+    for r, val in enumerate(title_rows):
+        yield [val] + [obj_list[0][r] for obj_list in d[2]]
+    max_len = max((len(obj_list[1]) for obj_list in d[2]), default=0)
+    for r in range(max_len):
+        yield [None] + [obj_list[1][r] if r < len(obj_list[1]) else None for obj_list in d[2]]
+
+
+def read_spine_xlsx(filepath, read_only=False, processes=None, sheet_names=None):
     """reads all data from a excel file where the sheets are in valid spine data format
 
     Args:
         filepath (str): str with filepath to excel file to read from.
+        read_only (bool): if True, the workbook is opened in openpyxl's read-only mode
+            and each sheet is parsed row by row without loading the cells into memory.
+        processes (int): if larger than one, sheets are parsed in parallel by a pool
+            of this many processes, each opening the file in read-only mode.
+            Sheets are merged in workbook order regardless of which finishes first.
+        sheet_names (List[str]): names of sheets to read, all sheets are read if None
     """
-    wb = load_workbook(filepath)
-    sheets = wb.sheetnames
+    if processes is not None and processes > 1:
+        sheets = sheet_names
+        if sheets is None:
+            wb = load_workbook(filepath, read_only=True)
+            sheets = wb.sheetnames
+            wb.close()
+        processes = min(processes, len(sheets))
+    if sheet_names is not None and not sheet_names:
+        results = []
+    elif processes is not None and processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            # map returns results in the order of the sheets
+            results = list(executor.map(read_sheet_from_file, repeat(filepath), sheets))
+        results = [unpack_sheet_result(r) for r in results]
+    else:
+        wb = load_workbook(filepath, read_only=read_only)
+        sheets = wb.sheetnames if sheet_names is None else sheet_names
+        results = [read_sheet(wb[s], read_only) for s in sheets]
+        wb.close()
+
+    return merge_sheet_results(results)
 
+
+def merge_sheet_results(results):
+    """Sorts read sheets by class type and merges sheets that have the same class.
+
+    Args:
+        results (Iterable[Tuple]): results given by read_sheet, in the order the sheets were read
+
+    Returns:
+        (List, List, List) object class data, relationship class data and error log
+    """
     obj_data = []
     rel_data = []
     obj_json_data = []
     rel_json_data = []
     error_log = []
 
-    # read all sheets
-    for s in sheets:
-        ws = wb[s]
+    for result in results:
+        if result is None:
+            # not a valid spine sheet
+            continue
+        sheet_type, sheet_data, data, error = result
+        if error is not None:
+            error_log.append(error)
+        elif sheet_data == "parameter":
+            if sheet_type == "relationship":
+                rel_data.append(data)
+            else:
+                obj_data.append(data)
+        elif sheet_type == "relationship":
+            rel_json_data.append(data)
+        else:
+            obj_json_data.append(data)
+
+    # merge sheets that have the same class.
+    obj_data, el = merge_spine_xlsx_data(obj_data + obj_json_data)
+    error_log = error_log + el
+
+    rel_data, el = merge_spine_xlsx_data(rel_data + rel_json_data)
+    error_log = error_log + el
+
+    return obj_data, rel_data, error_log
+
+
+def read_sheet(ws, read_only=False):
+    """Reads one worksheet of a spine excel file.
+
+    Args:
+        ws (openpyxl.workbook.worksheet): worksheet to read
+        read_only (bool): if True, the sheet is parsed row by row, see read_spine_xlsx
 
+    Returns:
+        (Tuple) sheet type, sheet data type, SheetData and error information,
+        SheetData is None if the sheet couldn't be read. Returns None if the
+        sheet is not in valid spine format.
+    """
+    if read_only:
+        # stream rows, only the header is read before validating
+        rows = ws.iter_rows(values_only=True)
+        header = read_header_rows(rows)
+        if not validate_header_rows(header):
+            return None
+        sheet_type = header[1][0].lower()
+        sheet_data = header[1][1].lower()
+    else:
         # check if valid
         if not validate_sheet(ws):
-            continue
-
+            return None
         sheet_type = ws['A2'].value.lower()
         sheet_data = ws['B2'].value.lower()
 
+    try:
         if sheet_data == "parameter":
             # read sheet with data type: 'parameter'
-            try:
+            if read_only:
+                data = read_parameter_rows(ws.title, header, rows)
+            else:
                 data = read_parameter_sheet(ws)
-                if sheet_type == "relationship":
-                    rel_data.append(data)
-                else:
-                    obj_data.append(data)
-            except Exception as e:
-                error_log.append(["sheet", ws.title,
-                                  "Error reading sheet {}: {}".format(ws.title, e)])
         elif sheet_data == "json array":
             # read sheet with data type: 'json array'
-            try:
+            if read_only:
+                data = read_json_rows(ws.title, sheet_type, header, rows)
+            else:
                 data = read_json_sheet(ws, sheet_type)
-                if sheet_type == "relationship":
-                    rel_json_data.append(data)
-                else:
-                    obj_json_data.append(data)
-            except Exception as e:
-                error_log.append(["sheet", ws.title,
-                                  "Error reading sheet {}: {}".format(ws.title, e)])
-    wb.close()
+        else:
+            return None
+    except Exception as e:
+        return sheet_type, sheet_data, None, ["sheet", ws.title,
+                                              "Error reading sheet {}: {}".format(ws.title, e)]
+    return sheet_type, sheet_data, data, None
 
-    # merge sheets that have the same class.
-    obj_data, el = merge_spine_xlsx_data(obj_data + obj_json_data)
-    error_log = error_log + el
 
-    rel_data, el = merge_spine_xlsx_data(rel_data + rel_json_data)
-    error_log = error_log + el
+def read_sheet_from_file(filepath, sheet_name):
+    """Opens excel file in read-only mode and reads one sheet, used by the process
+    pool in read_spine_xlsx. The parameter values of the returned SheetData are
+    plain tuples so that the result can be sent between processes,
+    see unpack_sheet_result.
 
-    return obj_data, rel_data, error_log
+    Args:
+        filepath (str): str with filepath to excel file to read from
+        sheet_name (str): name of sheet to read
+
+    Returns:
+        (Tuple) same as read_sheet with an extra item containing the field names
+        of the parameter values
+    """
+    wb = load_workbook(filepath, read_only=True)
+    try:
+        result = read_sheet(wb[sheet_name], read_only=True)
+    finally:
+        wb.close()
+    if result is None or result[2] is None:
+        return result
+    sheet_type, sheet_data, data, error = result
+    fields = data.parameter_values[0]._fields if data.parameter_values else ()
+    data = data._replace(parameter_values=[tuple(v) for v in data.parameter_values])
+    return sheet_type, sheet_data, data, error, fields
+
+
+def unpack_sheet_result(result):
+    """Turns the parameter values returned by read_sheet_from_file back into namedtuples.
+
+    Args:
+        result (Tuple): result from read_sheet_from_file
+
+    Returns:
+        (Tuple) same as read_sheet
+    """
+    if result is None or result[2] is None:
+        return result
+    sheet_type, sheet_data, data, error, fields = result
+    if fields:
+        make = data_tuple(fields)._make
+        data = data._replace(parameter_values=[make(v) for v in data.parameter_values])
+    return sheet_type, sheet_data, data, error
 
 
 def merge_spine_xlsx_data(data):
@@ -726,8 +1319,6 @@ def read_json_sheet(ws, sheet_type):
     else:
         dim = 1
 
-    path = ["object" + str(i) for i in range(dim)]
-
     class_name = ws['C2'].value
 
     object_classes = []
@@ -743,35 +1334,55 @@ def read_json_sheet(ws, sheet_type):
             else:
                 read_cols.append(c+1)
 
-    Data = namedtuple("Data", ["parameter_type"] + path + ["parameter", "value"])
+    # fetch the whole json block at once from the fourth row down and split it column by column.
+    columns = []
+    if read_cols:
+        block = ws.iter_rows(min_row=4, max_row=max(ws.max_row, 4), min_col=read_cols[0],
+                             max_col=read_cols[-1], values_only=True)
+        columns = [json_column(col, dim) for col in zip(*block)]
+
+    return json_sheet_data(ws.title, sheet_type, class_name, object_classes, columns)
+
+
+def json_column(col, dim):
+    """Splits a column of a json array sheet into object path, parameter and values.
+
+    Args:
+        col (Sequence): values of the column from the fourth row down
+        dim (int): number of object classes
+
+    Returns:
+        (Tuple) (object path, [parameter], values), see json_sheet_data
+    """
+    obj_path = list(col[:dim])
+    parameter = list(col[dim:dim + 1])
+    if None in obj_path or not parameter or parameter[0] is None:
+        # invalid column, skip
+        return obj_path, parameter, []
+    # get values until first empty cell
+    json_vals = list(takewhile(lambda v: v is not None, islice(col, dim + 1, None)))
+    return obj_path, parameter, json_vals
+
+
+def json_sheet_data(sheet_name, sheet_type, class_name, object_classes, columns):
+    """Packs the columns read from a json array sheet into SheetData
+
+    Args:
+        sheet_name (str): name of the sheet
+        sheet_type (str): str with value "relationship" or "object"
+        class_name (str): object class or relationship class name
+        object_classes (List[str]): object class names of the class
+        columns (List[Tuple]): one tuple (object path, [parameter], values) per column
+
+    Returns:
+        (SheetData)
+    """
+    path = ["object" + str(i) for i in range(len(object_classes))]
+    Data = data_tuple(tuple(["parameter_type"] + path + ["parameter", "value"]))
 
     unique_parameters = []
     json_data = []
-    # red columnwise from second column.
-    for c in read_cols:
-        obj_path = []
-        parameter = []
-        json_vals = []
-        for r, cell in enumerate(ws[get_column_letter(c)]):
-            if r > 2 and r < 3+dim:
-                # get object path
-                obj_path.append(cell.value)
-                if cell.value is None:
-                    # invalid column, skip
-                    break
-            elif r == 3+dim:
-                # get parameter name
-                parameter = [cell.value]
-                if cell.value is None:
-                    # invalid column, skip
-                    break
-            elif r > 3+dim:
-                # get values until first empty cell
-                if cell.value is None:
-                    break
-                else:
-                    json_vals.append(cell.value)
-
+    for obj_path, parameter, json_vals in columns:
         if json_vals and parameter and None not in obj_path:
             # save values if there is json data, a parameter name
             # and the obj_path doesn't contain None.
@@ -779,7 +1390,7 @@ def read_json_sheet(ws, sheet_type):
             packed_json = json.dumps(json_vals)
             json_data.append(Data._make(["json"] + obj_path+parameter+[packed_json]))
 
-    return SheetData(sheet_name=ws.title,
+    return SheetData(sheet_name=sheet_name,
                      class_name=class_name,
                      object_classes=object_classes,
                      parameters=list(set(unique_parameters)),
@@ -788,6 +1399,52 @@ def read_json_sheet(ws, sheet_type):
                      class_type=sheet_type)
 
 
+def read_json_rows(sheet_name, sheet_type, header, rows):
+    """Reads a json array sheet row by row, see read_json_sheet.
+
+    Args:
+        sheet_name (str): name of the sheet
+        sheet_type (str): str with value "relationship" or "object"
+        header (List[tuple]): header rows given by read_header_rows
+        rows (Iterator[tuple]): iterator over the remaining rows of the sheet
+
+    Returns:
+        (SheetData)
+    """
+    if sheet_type == "relationship":
+        dim = header_value(header, 2, 4)
+    else:
+        dim = 1
+
+    class_name = header_value(header, 2, 3)
+    object_classes = [header_value(header, r, 1) for r in range(4, 4 + dim)]
+
+    # search row for until first empty cell
+    read_cols = []
+    for c, value in enumerate(header[3] if len(header) > 3 else []):
+        if c > 0:
+            if value is None:
+                break
+            else:
+                read_cols.append(c)
+
+    # collect the json block until a row where all columns are empty
+    # and then split it column by column.
+    width = read_cols[-1] + 1 if read_cols else 0
+    get_cols = itemgetter(*read_cols) if len(read_cols) > 1 else lambda x: tuple(x[c] for c in read_cols)
+    block = []
+    for row in chain(header[3:], rows):
+        if len(row) < width:
+            row = tuple(row) + (None,) * (width - len(row))
+        values = get_cols(row)
+        if all(v is None for v in values):
+            break
+        block.append(values)
+    columns = [json_column(col, dim) for col in zip(*block)] if block else [([], [], []) for _ in read_cols]
+
+    return json_sheet_data(sheet_name, sheet_type, class_name, object_classes, columns)
+
+
 def read_parameter_sheet(ws):
     """Reads a sheet containg parameter data for objects and relationships
 
@@ -822,6 +1479,25 @@ def read_parameter_sheet(ws):
     # get data
     data = read_2d(ws, 5, len(ws['A']), 1, dim + len(parameters))
 
+    return parameter_sheet_data(ws.title, sheet_type, class_name, object_classes, parameters, data)
+
+
+def parameter_sheet_data(sheet_name, sheet_type, class_name, object_classes, parameters, data):
+    """Stacks the rows read from a parameter sheet into SheetData
+
+    Args:
+        sheet_name (str): name of the sheet
+        sheet_type (str): str with value "relationship" or "object"
+        class_name (str): object class or relationship class name
+        object_classes (List[str]): object class names of the class
+        parameters (List[str]): parameter names, one per value column
+        data (List[List]): data rows, object names followed by parameter values
+
+    Returns:
+        (SheetData)
+    """
+    dim = len(object_classes)
+
     keyfunc = lambda x: [x[i] for i, _ in enumerate(object_classes)]
 
     # remove data where not all dimensions exists
@@ -845,7 +1521,7 @@ def read_parameter_sheet(ws):
         # flatten list if only one object per row
         objects = [item for sublist in objects for item in sublist]
 
-    return SheetData(sheet_name=ws.title,
+    return SheetData(sheet_name=sheet_name,
                      class_name=class_name,
                      object_classes=object_classes,
                      parameters=parameters,
@@ -854,6 +1530,138 @@ def read_parameter_sheet(ws):
                      class_type=sheet_type)
 
 
+def read_parameter_rows(sheet_name, header, rows):
+    """Reads a parameter sheet row by row, see read_parameter_sheet.
+
+    Args:
+        sheet_name (str): name of the sheet
+        header (List[tuple]): header rows given by read_header_rows
+        rows (Iterator[tuple]): iterator over the remaining rows of the sheet
+
+    Returns:
+        (SheetData)
+    """
+    sheet_type = header_value(header, 2, 1).lower()
+    class_name = header_value(header, 2, 3)
+
+    if sheet_type == "object":
+        dim = 1
+    elif sheet_type == "relationship":
+        dim = header_value(header, 2, 4)
+    else:
+        raise ValueError("sheet_type must be a str with value 'relationship' or 'object'")
+
+    # object classes
+    object_classes = [header_value(header, 4, c) for c in range(1, dim + 1)]
+
+    # read all columns to the right of the number of cells in dim. Read until
+    # encounters a empty cell.
+    parameters = []
+    for c, value in enumerate(header[3] if len(header) > 3 else []):
+        if value is None:
+            break
+        elif c >= dim:
+            parameters.append(value)
+
+    # get data, pad short rows so all rows have the same width
+    width = dim + len(parameters)
+    data = []
+    for row in chain(header[4:], rows):
+        row = list(row[:width])
+        if len(row) < width:
+            row += [None] * (width - len(row))
+        data.append(row)
+
+    return parameter_sheet_data(sheet_name, sheet_type, class_name, object_classes, parameters, data)
+
+
+def read_header_rows(rows):
+    """Reads the header rows of a sheet from a row iterator. The first four rows
+    are always read, for relationship json array sheets also the rows with the
+    object class names.
+
+    Args:
+        rows (Iterator[tuple]): iterator over the rows of a sheet, as given by
+            openpyxl's iter_rows(values_only=True)
+
+    Returns:
+        (List[tuple]) List of header rows
+    """
+    header = list(islice(rows, 4))
+    sheet_type = header_value(header, 2, 1)
+    sheet_data = header_value(header, 2, 2)
+    dim = header_value(header, 2, 4)
+    if isinstance(sheet_type, str) and sheet_type.lower() == "relationship" \
+            and isinstance(sheet_data, str) and sheet_data.lower() == "json array" \
+            and isinstance(dim, int) and dim > 1:
+        header = header + list(islice(rows, dim - 1))
+    return header
+
+
+def header_value(header, row, col):
+    """Returns value from header rows, None if the cell is outside of the header.
+
+    Args:
+        header (List[tuple]): header rows given by read_header_rows
+        row (Integer): row index, 1-indexed (as excel)
+        col (Integer): column index, 1-indexed (as excel)
+    """
+    if row > len(header) or col > len(header[row - 1]):
+        return None
+    return header[row - 1][col - 1]
+
+
+def validate_header_rows(header):
+    """Checks if header rows are from a valid import sheet for spine, see validate_sheet.
+
+    Args:
+        header (List[tuple]): header rows given by read_header_rows
+
+    Returns:
+        (bool): True if sheet is valid, False otherwise
+    """
+    sheet_type = header_value(header, 2, 1)
+    sheet_data = header_value(header, 2, 2)
+
+    if not isinstance(sheet_type, str):
+        return False
+    if not isinstance(sheet_data, str):
+        return False
+    if sheet_type.lower() not in ["relationship", "object"]:
+        return False
+    if sheet_data.lower() not in ["parameter", "json array"]:
+        return False
+
+    if sheet_type.lower() == "relationship":
+        rel_dimension = header_value(header, 2, 4)
+        rel_name = header_value(header, 2, 3)
+        if not isinstance(rel_name, str):
+            return False
+        if not rel_name:
+            return False
+        if not isinstance(rel_dimension, int):
+            return False
+        if not rel_dimension > 1:
+            return False
+        if sheet_data.lower() == 'parameter':
+            rel_row = [header_value(header, 4, c) for c in range(1, rel_dimension + 1)]
+        else:
+            rel_row = [header_value(header, r, 1) for r in range(4, 4 + rel_dimension)]
+        if None in rel_row:
+            return False
+        if not all(isinstance(r, str) for r in rel_row):
+            return False
+        if not all(r for r in rel_row):
+            return False
+    else:
+        obj_name = header_value(header, 2, 3)
+        if not isinstance(obj_name, str):
+            return False
+        if not obj_name:
+            return False
+    return True
+
+
 def read_2d(ws, start_row=1, end_row=1, start_col=1, end_col=1):
     """Reads a 2d area from worksheet into a list of lists where each line is
     the inner list.
@@ -892,77 +1700,170 @@ def max_col_in_row(ws, row=1):
     return cell.col_idx
 
 
-def export_object_classes_to_spine_db(db, data):
+class ImportContext(object):
+    """Lookup indexes into a database shared by all stages of an Excel import.
+    Each table is queried once, the first time its index is needed. Stages add
+    the items they insert so that later stages see them without querying again.
+
+    Attributes:
+        db (spinedatabase_api.DatabaseMapping): mapping for database to import into
+    """
+    def __init__(self, db):
+        """Init class."""
+        self.db = db
+        self._object_classes = None
+        self._objects = None
+        self._parameters = None
+        self._relationship_classes = None
+        self._relationships = None
+
+    @property
+    def object_classes(self):
+        """dict: object class id by name."""
+        if self._object_classes is None:
+            self._object_classes = {oc.name: oc.id for oc in self.db.object_class_list().all()}
+        return self._object_classes
+
+    @property
+    def objects(self):
+        """dict: DbObject by object name."""
+        if self._objects is None:
+            self._objects = {o.name: DbObject(o.id, o.class_id) for o in self.db.object_list().all()}
+        return self._objects
+
+    @property
+    def parameters(self):
+        """dict: DbParameter by parameter name."""
+        if self._parameters is None:
+            self._parameters = {p.name: DbParameter(p.id, p.object_class_id, p.relationship_class_id)
+                                for p in self.db.parameter_list().all()}
+        return self._parameters
+
+    @property
+    def relationship_classes(self):
+        """dict: DbRelClass by relationship class name."""
+        if self._relationship_classes is None:
+            db_rel_classes = self.db.relationship_class_list().\
+                order_by(self.db.RelationshipClass.name, self.db.RelationshipClass.dimension).all()
+            self._relationship_classes = {}
+            for key, val in groupby(db_rel_classes, key=lambda x: x.name):
+                val = sorted(val, key=lambda x: x.dimension)
+                self._relationship_classes[key] = DbRelClass(key,
+                                                             val[0].id,
+                                                             [v.object_class_id for v in val])
+        return self._relationship_classes
+
+    @property
+    def relationships(self):
+        """dict: relationship id by relationship class id and comma separated object names."""
+        if self._relationships is None:
+            self._relationships = {(r.class_id, r.object_name_list): r.id
+                                   for r in self.db.wide_relationship_list().all()}
+        return self._relationships
+
+    def add_object_classes(self, object_classes):
+        """Adds object classes inserted into the database to the indexes."""
+        for oc in object_classes:
+            self.object_classes[oc.name] = oc.id
+
+    def add_objects(self, objects):
+        """Adds objects inserted into the database to the indexes."""
+        for o in objects:
+            self.objects[o.name] = DbObject(o.id, o.class_id)
+
+    def add_parameters(self, parameters):
+        """Adds parameters inserted into the database to the indexes."""
+        for p in parameters:
+            self.parameters[p.name] = DbParameter(p.id, p.object_class_id, p.relationship_class_id)
+
+    def add_relationship_classes(self, wide_relationship_classes):
+        """Adds relationship classes inserted into the database to the indexes."""
+        for rc in wide_relationship_classes:
+            object_classes = [int(i) for i in rc.object_class_id_list.split(",")]
+            self.relationship_classes[rc.name] = DbRelClass(rc.name, rc.id, object_classes)
+
+    def add_relationships(self, wide_relationships, object_name_lists):
+        """Adds relationships inserted into the database to the indexes.
+
+        Args:
+            wide_relationships (list): relationships returned by the database mapping
+            object_name_lists (dict): comma separated object names by relationship name
+        """
+        for r in wide_relationships:
+            self.relationships[(r.class_id, object_name_lists[r.name])] = r.id
+
+
+def export_object_classes_to_spine_db(db, data, context=None):
     """Tries to insert object classes into given database mapping.
     Filters out duplicates before inserting.
 
     Args:
         db (spinedatabase_api.DatabaseMapping): mapping for database to insert into
         data (List[SheetData]): data to insert
+        context (ImportContext): lookup indexes into the database, created if not given
 
     Returns:
         (List, List) Tuple of two lists, first one a list of successful inserts.
         Second one a list of failed inserts.
     """
-    obj_classes = list(set([o.class_name for o in data]))
+    if context is None:
+        context = ImportContext(db)
 
-    existing_classes = db.object_class_list().all()
+    obj_classes = list(set([o.class_name for o in data]))
 
     # filter classes that don't already exist in db
-    new_classes = [{"name": o} for o in obj_classes if o not in [e.name for e in existing_classes]]
+    new_classes = [{"name": o} for o in obj_classes if o not in context.object_classes]
 
     error_log = []
     import_log = []
     try:
-        db.add_object_classes(*new_classes)
+        context.add_object_classes(db.add_object_classes(*new_classes))
         import_log = import_log + [["object_class", nc["name"]] for nc in new_classes]
     except SpineDBAPIError as e:
         error_log = error_log + [["object_class", nc["name"], e.msg] for nc in new_classes]
     return import_log, error_log
 
 
-def export_object_parameters_spine_db(db, data):
+def export_object_parameters_spine_db(db, data, context=None):
     """Tries to insert object class parameter into given database mapping.
     Filters out duplicates before inserting. Filters if class exists.
 
     Args:
         db (spinedatabase_api.DatabaseMapping): mapping for database to insert into
         data (List[SheetData]): data to insert
+        context (ImportContext): lookup indexes into the database, created if not given
 
     Returns:
         (List, List) Tuple of two lists, first one a list of successful inserts.
         Second one a list of failed inserts.
     """
+    if context is None:
+        context = ImportContext(db)
+
     parameters = [[[object_list.class_name, p] for p in object_list.parameters]
                   for object_list in data]
     parameters = [item for sublist in parameters for item in sublist]
-    object_classes = set([c[0] for c in parameters])
 
     # existing object classes
-    db_classes = db.object_class_list().\
-        filter(db.ObjectClass.name.in_(object_classes)).all()
-    obj_class_name_2_id = {o.name: o.id for o in db_classes}
+    obj_class_name_2_id = context.object_classes
 
     # check if the parameters object class exists in db.
     error_log = [["object_parameter", p[1],
                   "object_class '{}' did not exist in database".format(p[0])]
-                 for p in parameters if p[0] not in obj_class_name_2_id.keys()]
+                 for p in parameters if p[0] not in obj_class_name_2_id]
 
     parameters = [[obj_class_name_2_id[p[0]], p[0], p[1]] for p in parameters
-                  if p[0] in obj_class_name_2_id.keys()]
+                  if p[0] in obj_class_name_2_id]
 
     # existing parameters in database
-    db_parameters = db.object_parameter_list().\
-        filter(db.Parameter.name.in_([p[2] for p in parameters])).all()
-    db_parameters = [[d.object_class_name, d.parameter_name]
-                     for d in db_parameters]
+    db_parameters = set((d.object_class_id, name) for name, d in context.parameters.items())
 
     # remove already existing parameters
-    parameters = [{"name": p[2], "object_class_id": p[0]} for p in parameters if [p[1], p[2]] not in db_parameters]
+    parameters = [{"name": p[2], "object_class_id": p[0]} for p in parameters if (p[0], p[2]) not in db_parameters]
 
     import_log = []
     try:
-        db.add_parameters(*parameters)
+        context.add_parameters(db.add_parameters(*parameters))
         import_log = import_log + [["object_parameter", p["name"]] for p in parameters]
     except SpineDBAPIError as e:
         error_log = error_log + [["object_parameter", p["name"], e.msg] for p in parameters]
@@ -970,46 +1871,47 @@ def export_object_parameters_spine_db(db, data):
     return import_log, error_log
 
 
-def export_object_to_spine_db(db, data):
+def export_object_to_spine_db(db, data, context=None):
     """Tries to insert objects into given database mapping.
     Filters out duplicates before inserting. Filters if class exists.
 
     Args:
         db (spinedatabase_api.DatabaseMapping): mapping for database to insert into
         data (List[SheetData]): data to insert into
+        context (ImportContext): lookup indexes into the database, created if not given
 
     Returns:
         (List, List) Tuple of two lists, first one a list of successful inserts.
         Second one a list of failed inserts.
     """
+    if context is None:
+        context = ImportContext(db)
+
     objects = [[[object_list.class_name, o] for o in object_list.objects]
                for object_list in data]
     objects = [item for sublist in objects for item in sublist]
-    object_classes = set([c[0] for c in objects])
 
     # existing object_classes.
-    db_classes = db.object_class_list().filter(db.ObjectClass.name.in_(object_classes)).all()
-    obj_class_name_2_id = {o.name: o.id for o in db_classes}
+    obj_class_name_2_id = context.object_classes
 
     # remove objects where the object_class does not exist in db.
     error_log = [["object", o[1],
                   "object_class '{}' did not exist in database".format(o[0])]
-                 for o in objects if o[0] not in obj_class_name_2_id.keys()]
+                 for o in objects if o[0] not in obj_class_name_2_id]
 
     objects = [[obj_class_name_2_id[o[0]], o[0], o[1]] for o in objects
-               if o[0] in obj_class_name_2_id.keys()]
+               if o[0] in obj_class_name_2_id]
 
     # existsing objects
-    db_objects = db.object_list().all()
-    db_objects = [[d.class_id, d.name] for d in db_objects]
+    db_objects = set((d.class_id, name) for name, d in context.objects.items())
 
     # remove already existing objects
-    objects = [{"name": o[2], "class_id": o[0]} for o in objects if [o[0], o[2]] not in db_objects]
+    objects = [{"name": o[2], "class_id": o[0]} for o in objects if (o[0], o[2]) not in db_objects]
 
     # export to db
     import_log = []
     try:
-        db.add_objects(*objects)
+        context.add_objects(db.add_objects(*objects))
         import_log = import_log + [["object", o["name"]] for o in objects]
     except SpineDBAPIError as e:
         error_log = error_log + [["object", o["name"], e.msg] for o in objects]
@@ -1017,36 +1919,29 @@ def export_object_to_spine_db(db, data):
     return import_log, error_log
 
 
-def export_object_parameter_values(db, data):
+def export_object_parameter_values(db, data, context=None):
     """Tries to insert objects parameter values into given database mapping.
 
     Args:
         db (spinedatabase_api.DatabaseMapping): mapping for database to insert into
         data (List[SheetData]): data to insert into
+        context (ImportContext): lookup indexes into the database, created if not given
 
     Returns:
         (List, List) Tuple of two lists, first one a list of successful inserts.
         Second one a list of failed inserts.
     """
+    if context is None:
+        context = ImportContext(db)
+
     parameter_values = [[[object_list.class_name, p] for p in object_list.parameter_values]
                         for object_list in data]
     parameter_values = [item for sublist in parameter_values for item in sublist]
-    parameters = set([c[1].parameter for c in parameter_values])
-    object_classes = set([c[0] for c in parameter_values])
-
-    # existing objects.
-    db_objects = db.object_list().all()
-    obj_name_2_id = {o.name: o.id for o in db_objects}
 
-    # existing parameters.
-    db_parameters = db.parameter_list().\
-        filter(db.Parameter.name.in_(parameters)).all()
-    parameter_name_2_id = {o.name: o.id for o in db_parameters}
-
-    # existing object_classes.
-    db_classes = db.object_class_list().\
-        filter(db.ObjectClass.name.in_(object_classes)).all()
-    obj_class_name_2_id = {o.name: o.id for o in db_classes}
+    # existing objects, parameters and object_classes.
+    db_objects = context.objects
+    db_parameters = context.parameters
+    obj_class_name_2_id = context.object_classes
 
     # existing values
     db_parameter_values = db.object_parameter_value_list().all()
@@ -1055,9 +1950,6 @@ def export_object_parameter_values(db, data):
                                           d.parameter_name]): d
                                 for d in db_parameter_values}
 
-    object_class_parameter = set((dp.object_class_id, dp.id) for dp in db_parameters)
-    object_class_object = set((dp.class_id, dp.id) for dp in db_objects)
-
     error_log = []
     update_parameters = []
     insert_parameters = []
@@ -1065,33 +1957,35 @@ def export_object_parameter_values(db, data):
                                    "name", "value", "key", "parameter_type"])
     for p in parameter_values:
         # check if parameter value object class doesn't exists in db
-        if p[0] not in obj_class_name_2_id.keys():
+        if p[0] not in obj_class_name_2_id:
             error_log.append(["object_parameter_value",
                               p[1].parameter,
                               "object_class '{}' did not exist in database".format(p[0])])
             continue
 
         # check if object exists in database
-        if p[1].object0 not in obj_name_2_id.keys():
+        if p[1].object0 not in db_objects:
             error_log.append(["object_parameter_value",
                               p[1].parameter,
                               "object_class '{}' did not exist in database".format(p[0])])
             continue
 
         # check if parameter exists in database
-        if p[1].parameter not in parameter_name_2_id.keys():
+        if p[1].parameter not in db_parameters:
             error_log.append(["object_parameter_value",
                               p[1].parameter,
                               "parameter '{}' did not exist in database".format(p[0])])
             continue
 
-        obj_id = obj_name_2_id[p[1].object0]
+        db_object = db_objects[p[1].object0]
+        db_parameter = db_parameters[p[1].parameter]
+        obj_id = db_object.id
         obj_class_id = obj_class_name_2_id[p[0]]
-        par_id = parameter_name_2_id[p[1].parameter]
+        par_id = db_parameter.id
 
         key = '_'.join([p[0], p[1].object0, p[1].parameter])
 
-        if key in db_parameter_values_dict.keys():
+        if key in db_parameter_values_dict:
             # parameter value exists, see if value needs updating.
             if p[1].parameter_type == "value":
                 compare_with = str(db_parameter_values_dict[key].value)
@@ -1107,13 +2001,13 @@ def export_object_parameter_values(db, data):
         else:
             # parameter value doesn't exists
             # check if object_class for parameter matches db
-            if (obj_class_id, obj_id) not in object_class_object:
+            if db_object.class_id != obj_class_id:
                 error_log.append(["object_parameter_value",
                                   p[1].parameter,
                                   "parameter object did not match object class in database"])
                 continue
             # check if object_class for parameter matches db
-            if (obj_class_id, par_id) not in object_class_parameter:
+            if db_parameter.object_class_id != obj_class_id:
                 error_log.append(["object_parameter_value",
                                   p[1].parameter,
                                   "parameter object class did not match parameter object class in database"])
@@ -1123,16 +2017,10 @@ def export_object_parameter_values(db, data):
                                       p[1].parameter_type: p[1].value})
 
     # update parameter values
-    import_log = []
-    for p in update_parameters:
-        try:
-            db.update_parameter_value(id=p.id,
-                                      field_name=p.parameter_type,
-                                      new_value=p.value)
-            import_log.append(["object_parameter_value_update", p.key])
-        except SpineDBAPIError as e:
-            error_log.append(["object_parameter_value", p.key, e.msg])
-            continue
+    import_log, error_log_temp = batch_update_parameter_values(
+        db, [({"id": p.id, p.parameter_type: p.value}, p.key) for p in update_parameters],
+        "object_parameter_value_update", "object_parameter_value")
+    error_log = error_log + error_log_temp
 
     # insert new parameter values
     try:
@@ -1144,31 +2032,29 @@ def export_object_parameter_values(db, data):
     return import_log, error_log
 
 
-def export_relationship_class_to_spine_db(db, data):
+def export_relationship_class_to_spine_db(db, data, context=None):
     """Tries to insert realtionship classes into given database mapping.
 
     Args:
         db (spinedatabase_api.DatabaseMapping): mapping for database to insert into
         data (List[SheetData]): data to insert into
+        context (ImportContext): lookup indexes into the database, created if not given
 
     Returns:
         (List, List) Tuple of two lists, first one a list of successful inserts.
         Second one a list of failed inserts.
     """
+    if context is None:
+        context = ImportContext(db)
+
     rel_classes = [[o.class_name, o.object_classes] for o in data]
 
-    existing_classes = db.relationship_class_list().all()
-    existing_classes = list(set([ec.name for ec in existing_classes]))
+    existing_classes = context.relationship_classes
 
     rel_classes = [o for o in rel_classes if o[0] not in existing_classes]
 
-    object_classes = [o[1] for o in rel_classes]
-    object_classes = set(item for sublist in object_classes for item in sublist)
-
     # existing object_classes.
-    db_classes = db.object_class_list().\
-        filter(db.ObjectClass.name.in_(object_classes)).all()
-    obj_class_name_2_id = {o.name: o.id for o in db_classes}
+    obj_class_name_2_id = context.object_classes
 
     # find ids for object_class name and make sure they are valid
     error_log = []
@@ -1185,7 +2071,7 @@ def export_relationship_class_to_spine_db(db, data):
     # insert relationship classes
     import_log = []
     try:
-        db.add_wide_relationship_classes(*valid_rel_classes)
+        context.add_relationship_classes(db.add_wide_relationship_classes(*valid_rel_classes))
         import_log = import_log + [["relationship_class", r['name']] for r in valid_rel_classes]
     except SpineDBAPIError as e:
         error_log = error_log + [["relationship_class", r['name'], e.msg] for r in valid_rel_classes]
@@ -1193,63 +2079,40 @@ def export_relationship_class_to_spine_db(db, data):
     return import_log, error_log
 
 
-def export_relationships_to_spine_db(db, data):
+def export_relationships_to_spine_db(db, data, context=None):
     """Tries to insert realtionships into given database mapping.
 
     Args:
         db (spinedatabase_api.DatabaseMapping): mapping for database to insert into
         data (List[SheetData]): data to insert into
+        context (ImportContext): lookup indexes into the database, created if not given
 
     Returns:
         (List, List) Tuple of two lists, first one a list of successful inserts.
         Second one a list of failed inserts.
     """
+    if context is None:
+        context = ImportContext(db)
+
     rels = [list(zip([o.class_name]*len(o.objects),
                      [o.object_classes]*len(o.objects),
                      o.objects)) for o in data]
 
     rels = [item for sublist in rels for item in sublist]
 
-    rel_class = set([r.class_name for r in data])
-
-    object_classes = [o.object_classes for o in data]
-    object_classes = set(item for sublist in object_classes for item in sublist)
-
-    # existing relationship classes
-    db_rel_classes = db.relationship_class_list().\
-        filter(db.RelationshipClass.name.in_(rel_class)).\
-        order_by(db.RelationshipClass.name, db.RelationshipClass.dimension).all()
-
-    # existing objects.
-    db_objects = db.object_list().all()
-    obj_name_2_id = {o.name: o.id for o in db_objects}
-    obj_name_2_class = {o.name: o.class_id for o in db_objects}
-
-    # existing object_classes.
-    db_classes = db.object_class_list().\
-        filter(db.ObjectClass.name.in_(object_classes)).all()
-    obj_class_name_2_id = {o.name: o.id for o in db_classes}
-
-    # existing relationships.
-    db_relationships = db.wide_relationship_list().all()
-    db_relationships = [[r.class_id, r.object_name_list]
-                        for r in db_relationships]
-
-    # pivot db data
-    dbRelClass = namedtuple("dbRelClass", ["name", "id", "object_classes"])
-    db_rel_class_dict = {}
-    for key, val in groupby(db_rel_classes, key=lambda x: x.name):
-        val = sorted(val, key=lambda x: x.dimension)
-        db_rel_class_dict[key] = dbRelClass(key,
-                                            val[0].id,
-                                            [v.object_class_id for v in val])
+    # existing relationship classes, objects, object_classes and relationships.
+    db_rel_class_dict = context.relationship_classes
+    db_objects = context.objects
+    obj_class_name_2_id = context.object_classes
+    db_relationships = context.relationships
 
     error_log = []
     valid_relationships = []
+    rel_name_2_obj_name_list = {}
     for r in rels:
         key = "_".join(r[2])
         # check if relationship class exist in db
-        if r[0] not in db_rel_class_dict.keys():
+        if r[0] not in db_rel_class_dict:
             error_log.append(["relationship",
                               key,
                               "relationship class does not exist in db"])
@@ -1259,7 +2122,7 @@ def export_relationships_to_spine_db(db, data):
         obj_name_list_str = ",".join(r[2])
 
         # check if a relationship for class with same objects exist
-        if [db_rel_class.id, obj_name_list_str] in db_relationships:
+        if (db_rel_class.id, obj_name_list_str) in db_relationships:
             continue
         # check that object classes and objects exits in db
         if not set(r[1]).issubset(obj_class_name_2_id.keys()):
@@ -1267,7 +2130,7 @@ def export_relationships_to_spine_db(db, data):
                               key,
                               "all object class names doesn't exist in db"])
             continue
-        if not set(r[2]).issubset(obj_name_2_id.keys()):
+        if not set(r[2]).issubset(db_objects.keys()):
             error_log.append(["relationship",
                               key,
                               "all object names doesn't exist in db"])
@@ -1275,8 +2138,8 @@ def export_relationships_to_spine_db(db, data):
 
         # convert names to ids
         r_classes = [obj_class_name_2_id[item] for item in r[1]]
-        r_ids = [obj_name_2_id[item] for item in r[2]]
-        r_id_2_class = [obj_name_2_class[item] for item in r[2]]
+        r_ids = [db_objects[item].id for item in r[2]]
+        r_id_2_class = [db_objects[item].class_id for item in r[2]]
 
         # check that object classes are in order and same as db
         if not r_classes == db_rel_class.object_classes:
@@ -1294,11 +2157,12 @@ def export_relationships_to_spine_db(db, data):
         valid_relationships.append({'name': db_rel_class.name + "_" + key,
                                     'class_id': db_rel_class.id,
                                     'object_id_list': r_ids})
+        rel_name_2_obj_name_list[db_rel_class.name + "_" + key] = obj_name_list_str
 
     # insert relationship classes
     import_log = []
     try:
-        db.add_wide_relationships(*valid_relationships)
+        context.add_relationships(db.add_wide_relationships(*valid_relationships), rel_name_2_obj_name_list)
         import_log = import_log + [["relationship", r['name']] for r in valid_relationships]
     except SpineDBAPIError as e:
         error_log = error_log + [["relationship", r['name'], e.msg] for r in valid_relationships]
@@ -1306,56 +2170,45 @@ def export_relationships_to_spine_db(db, data):
     return import_log, error_log
 
 
-def export_relationships_parameters_to_spine_db(db, data):
+def export_relationships_parameters_to_spine_db(db, data, context=None):
     """Tries to insert realtionship parameters into given database mapping.
 
     Args:
         db (spinedatabase_api.DatabaseMapping): mapping for database to insert into
         data (List[SheetData]): data to insert into
+        context (ImportContext): lookup indexes into the database, created if not given
 
     Returns:
         (List, List) Tuple of two lists, first one a list of successful inserts.
         Second one a list of failed inserts.
     """
+    if context is None:
+        context = ImportContext(db)
+
     rels = [list(zip([o.class_name]*len(o.parameters), o.parameters)) for o in data]
     rels = [item for sublist in rels for item in sublist]
 
-    rel_class = set([r[0] for r in rels])
-
-    # existing relationship classes
-    db_rel_classes = db.relationship_class_list().\
-        filter(db.RelationshipClass.name.in_(rel_class)).\
-        order_by(db.RelationshipClass.name, db.RelationshipClass.dimension).all()
-
-    # pivot db data
-    dbRelClass = namedtuple("dbRelClass", ["name", "id", "object_classes"])
-    db_rel_class_dict = {}
-    for key, val in groupby(db_rel_classes, key=lambda x: x.name):
-        val = sorted(val, key=lambda x: x.dimension)
-        db_rel_class_dict[key] = dbRelClass(key,
-                                            val[0].id,
-                                            [v.object_class_id for v in val])
-
-    db_parameters = db.relationship_parameter_list().all()
-    db_parameters = [[d.relationship_class_name, d.parameter_name] for d in db_parameters]
+    # existing relationship classes and parameters
+    db_rel_class_dict = context.relationship_classes
+    db_parameters = set((d.relationship_class_id, name) for name, d in context.parameters.items())
 
     error_log = []
     valid_relationships_parameters = []
     for r in rels:
         # check relationship class exists
-        if r[0] not in db_rel_class_dict.keys():
+        if r[0] not in db_rel_class_dict:
             error_log.append(["relationship_parameter", r[1],
                               "relationship class does not exist in db"])
             continue
         # if a parameter with same class exists don't add
-        if list(r) in db_parameters:
+        if (db_rel_class_dict[r[0]].id, r[1]) in db_parameters:
             continue
         valid_relationships_parameters.append({'relationship_class_id': db_rel_class_dict[r[0]].id, 'name': r[1]})
 
     # insert relationship classes
     import_log = []
     try:
-        db.add_parameters(*valid_relationships_parameters)
+        context.add_parameters(db.add_parameters(*valid_relationships_parameters))
         import_log = import_log + [["relationship_parameter", r['name']] for r in valid_relationships_parameters]
     except SpineDBAPIError as e:
         error_log = error_log + [["relationship_parameter", r['name'], e.msg] for r in valid_relationships_parameters]
@@ -1363,17 +2216,20 @@ def export_relationships_parameters_to_spine_db(db, data):
     return import_log, error_log
 
 
-def export_relationships_parameter_value_to_spine_db(db, data):
+def export_relationships_parameter_value_to_spine_db(db, data, context=None):
     """Tries to insert realtionships parameter values into given database mapping.
 
     Args:
         db (spinedatabase_api.DatabaseMapping): mapping for database to insert into
         data (List[SheetData]): data to insert into
+        context (ImportContext): lookup indexes into the database, created if not given
 
     Returns:
         (List, List) Tuple of two lists, first one a list of successful inserts.
         Second one a list of failed inserts.
     """
+    if context is None:
+        context = ImportContext(db)
 
     rels = [list(zip([o.class_name]*len(o.parameter_values),
                      [o.object_classes]*len(o.parameter_values),
@@ -1381,72 +2237,52 @@ def export_relationships_parameter_value_to_spine_db(db, data):
 
     rels = [item for sublist in rels for item in sublist]
 
-    rel_class = set([r.class_name for r in data])
-
-    # existing relationship classes
-    db_rel_classes = db.relationship_class_list().\
-        filter(db.RelationshipClass.name.in_(rel_class)).\
-        order_by(db.RelationshipClass.name, db.RelationshipClass.dimension).all()
-
-    # existing relationships.
-    db_relationships = db.wide_relationship_list().all()
-    db_rel_2_id = {str(r.class_id) + ',' + r.object_name_list: r.id
-                   for r in db_relationships}
+    # existing relationship classes, relationships and parameters.
+    db_rel_class_dict = context.relationship_classes
+    db_relationships = context.relationships
+    db_parameters = context.parameters
 
     # existing values
     db_rel_par = db.relationship_parameter_value_list().all()
     db_rel_par = {','.join([p.relationship_class_name, p.object_name_list, p.parameter_name]):
                   p for p in db_rel_par}
 
-    # pivot db data
-    dbRelClass = namedtuple("dbRelClass", ["name", "id", "object_classes"])
-    db_rel_class_dict = {}
-    for key, val in groupby(db_rel_classes, key=lambda x: x.name):
-        val = sorted(val, key=lambda x: x.dimension)
-        db_rel_class_dict[key] = dbRelClass(key,
-                                            val[0].id,
-                                            [v.object_class_id for v in val])
-
-    # existing relationship parameters.
-    db_parameters = db.relationship_parameter_list().all()
-    db_parameters = {p.parameter_name: (p.relationship_class_name,
-                                        p.id) for p in db_parameters}
-
     error_log = []
     update_par = []
     insert_par = []
     for r in rels:
         key = "_".join(r[2][1:-1])
         # check if relationship class exists in db
-        if r[0] not in db_rel_class_dict.keys():
+        if r[0] not in db_rel_class_dict:
             error_log.append(["relationship_parameter_value", key,
                               "relationship class does not exist in db"])
             continue
 
         db_rel_class = db_rel_class_dict[r[0]]
-        class_obj_name_list_str = str(db_rel_class.id) + ',' + ",".join(r[2][1:-2])
+        class_obj_name_list = (db_rel_class.id, ",".join(r[2][1:-2]))
         class_name_obj_name_list_par_str = ','.join([r[0], ",".join(r[2][1:-2]), r[2].parameter])
 
         # check if a relationship for class with same objects exits
-        if class_obj_name_list_str not in db_rel_2_id.keys():
+        if class_obj_name_list not in db_relationships:
             error_log.append(["relationship_parameter_value", key,
                               "relationship does not exist in db"])
             continue
 
         # check if parameter exists in db
-        if r[2].parameter not in db_parameters.keys():
+        db_parameter = db_parameters.get(r[2].parameter)
+        if db_parameter is None or db_parameter.relationship_class_id is None:
             error_log.append(["relationship_parameter_value", key,
                               "parameter does not exist in db"])
             continue
 
         # check if parameter relationship class matches given class
-        if db_parameters[r[2].parameter][0] != r[0]:
+        if db_parameter.relationship_class_id != db_rel_class.id:
             error_log.append(["relationship_parameter_value", key,
                               "parameter relationship class does not match the class in db"])
             continue
 
-        par_id = db_parameters[r[2].parameter][1]
-        rel_id = db_rel_2_id[class_obj_name_list_str]
+        par_id = db_parameter.id
+        rel_id = db_relationships[class_obj_name_list]
         value = r[2].value
 
         # spit data into update and insert lists
@@ -1459,9 +2295,8 @@ def export_relationships_parameter_value_to_spine_db(db, data):
 
             if value != compare_with:
                 # parameter does not match existing value, update value
-                update_par.append([{'id': db_rel_par[class_name_obj_name_list_par_str].id,
-                                    'field_name': r[2].parameter_type,
-                                    'new_value': value}, key])
+                update_par.append(({'id': db_rel_par[class_name_obj_name_list_par_str].id,
+                                    r[2].parameter_type: value}, key))
         else:
             # parameter value does not exist, insert new
             insert_par.append([{'parameter_id': par_id,
@@ -1478,12 +2313,41 @@ def export_relationships_parameter_value_to_spine_db(db, data):
         error_log = error_log + [["relationship_parameter_value", r[1], e.msg] for r in insert_par]
 
     # update parameters
-    for r in update_par:
-        try:
-            db.update_parameter_value(**r[0])
-            import_log.append(["relationship_parameter_value", r[1]])
-        except SpineDBAPIError as e:
-            error_log.append(["relationship_parameter_value", r[1], e.msg])
-            continue
+    import_log_temp, error_log_temp = batch_update_parameter_values(
+        db, update_par, "relationship_parameter_value", "relationship_parameter_value")
+    import_log = import_log + import_log_temp
+    error_log = error_log + error_log_temp
+
+    return import_log, error_log
+
+
+def batch_update_parameter_values(db, update_items, import_name, error_name, batch_size=UPDATE_BATCH_SIZE):
+    """Updates parameter values in batches of 'batch_size' items. If a batch fails,
+    its items are updated one by one so that errors are reported per item.
+
+    Args:
+        db (spinedatabase_api.DatabaseMapping): mapping for database to update
+        update_items (List[Tuple[dict, str]]): tuples of update item, with 'id'
+            and the field to update, and a key identifying the item in the logs
+        import_name (str): name of item type used in the import log
+        error_name (str): name of item type used in the error log
 
+    Returns:
+        (List, List) Tuple of two lists, first one a list of successful updates.
+        Second one a list of failed updates.
+    """
+    import_log = []
+    error_log = []
+    for start in range(0, len(update_items), batch_size):
+        batch = update_items[start:start + batch_size]
+        try:
+            db.update_parameter_values(*[item for item, _ in batch])
+            import_log.extend([import_name, key] for _, key in batch)
+        except SpineDBAPIError:
+            for item, key in batch:
+                try:
+                    db.update_parameter_values(item)
+                    import_log.append([import_name, key])
+                except SpineDBAPIError as e:
+                    error_log.append([error_name, key, e.msg])
     return import_log, error_log
@@ -0,0 +1,225 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Functions to stage files into Tool work directories by copying, hard linking, cloning (reflink) or symlinking them.
+Linking and cloning take the same time regardless of file size. A strategy that is not supported
+for a file, e.g. a hard link across file systems, falls back to copying the file.
+Files in persistent work directories are synchronised incrementally, see StagingManifest.
+
+:author: P. Savolainen (VTT)
+:date:   18.10.2026
+"""
+
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import shutil
+import sys
+
+STAGING_STRATEGIES = ("copy", "hardlink", "reflink", "symlink")
+DEFAULT_STAGING_STRATEGY = "reflink"
+
+UNCHANGED = "unchanged"
+STAGING_DESCRIPTIONS = {"copy": "copied", "hardlink": "hard linked", "reflink": "cloned", "symlink": "symlinked",
+                        UNCHANGED: "up to date"}
+STAGING_MANIFEST_FILENAME = ".toolbox_staging.json"
+
+# ioctl request to clone a file on Linux file systems that support it, e.g. Btrfs and XFS
+FICLONE = 0x40049409
+
+
+def staging_strategy(configs):
+    """Returns the staging strategy from application settings, the default strategy if the setting is invalid.
+
+    Args:
+        configs (ConfigurationParser): Application settings
+
+    Returns:
+        (str) one of STAGING_STRATEGIES
+    """
+    strategy = configs.get("settings", "staging_strategy").strip().lower()
+    return strategy if strategy in STAGING_STRATEGIES else DEFAULT_STAGING_STRATEGY
+
+
+def stage_file(src, dst, strategy="copy"):
+    """Stages a file to a destination path, replacing an existing file there.
+
+    Hard links and symlinks share the data of the source file, so a Tool writing into a staged
+    file modifies the source too. A clone shares data blocks only until either file is written,
+    so it's as safe as a copy.
+
+    Args:
+        src (str): path to source file
+        dst (str): destination path
+        strategy (str): one of STAGING_STRATEGIES
+
+    Returns:
+        (str) the strategy that was used, "copy" if the given one was not supported
+
+    Raises:
+        OSError: if copying the file fails
+    """
+    if os.path.lexists(dst):
+        # Never write through an old link into the file it points to
+        os.remove(dst)
+    if strategy != "copy":
+        try:
+            if strategy == "hardlink":
+                os.link(src, dst)
+            elif strategy == "symlink":
+                os.symlink(os.path.abspath(src), dst)
+            elif strategy == "reflink":
+                reflink(src, dst)
+            else:
+                raise ValueError("Unknown staging strategy {0}".format(strategy))
+            return strategy
+        except (OSError, ValueError) as e:
+            logging.debug("Staging {0} by {1} failed, copying instead: {2}".format(src, strategy, e))
+            if os.path.lexists(dst):
+                os.remove(dst)
+    shutil.copyfile(src, dst)
+    return "copy"
+
+
+def describe_staging(counts):
+    """Returns a description of how files were staged, e.g. '3 hard linked, 1 copied'.
+
+    Args:
+        counts (Counter): numbers of files keyed by the strategy used to stage them, as returned by stage_file
+            or StagingManifest.stage
+
+    Returns:
+        (str)
+    """
+    return ", ".join("{0} {1}".format(counts[strategy], STAGING_DESCRIPTIONS[strategy])
+                     for strategy in STAGING_STRATEGIES + (UNCHANGED,) if counts[strategy])
+
+
+def reflink(src, dst):
+    """Clones a file so that the clone shares data blocks with the source until either one is modified.
+
+    Args:
+        src (str): path to source file
+        dst (str): path to clone
+
+    Raises:
+        OSError: if the platform or file system doesn't support cloning
+    """
+    if sys.platform.startswith("linux"):
+        import fcntl
+        with open(src, "rb") as source, open(dst, "wb") as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+    elif sys.platform == "darwin":
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+    else:
+        raise OSError("Cloning files is not supported on {0}".format(sys.platform))
+
+
+def file_stat(path):
+    """Returns the size and modification time of a file, None if it doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class StagingManifest:
+    """Keeps track of the files staged into a work directory so that a persistent work directory
+    can be synchronised incrementally. A file is staged again only if its source, the source's size
+    or modification time, the staged file's size or modification time, or the staging strategy
+    has changed since it was last staged. Files staged earlier but not in the current execution
+    are removed as stale.
+
+    Attributes:
+        work_dir (str): path to work directory
+        persistent (bool): True to load and save the manifest in the work directory
+    """
+    def __init__(self, work_dir, persistent=False):
+        """Class constructor."""
+        self.work_dir = work_dir
+        self.persistent = persistent
+        self._entries = self.load() if persistent else dict()
+        self._staged = set()
+
+    def manifest_path(self):
+        """Returns path to the manifest file in the work directory."""
+        return os.path.join(self.work_dir, STAGING_MANIFEST_FILENAME)
+
+    def load(self):
+        """Returns the entries saved in the work directory, an empty dict if there are none."""
+        try:
+            with open(self.manifest_path()) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return dict()
+        return entries if isinstance(entries, dict) else dict()
+
+    def save(self):
+        """Saves the entries into the work directory if it's persistent."""
+        if not self.persistent:
+            return
+        try:
+            with open(self.manifest_path(), "w") as f:
+                json.dump(self._entries, f)
+        except OSError as e:
+            logging.error("Saving staging manifest failed: {0}".format(e))
+
+    def stage(self, src, dst, strategy):
+        """Stages a file into the work directory unless it's up to date there.
+
+        Args:
+            src (str): path to source file
+            dst (str): destination path in the work directory
+            strategy (str): one of STAGING_STRATEGIES
+
+        Returns:
+            (str) the strategy that was used as returned by stage_file, UNCHANGED if the file was up to date
+
+        Raises:
+            OSError: if copying the file fails
+        """
+        key = os.path.relpath(dst, self.work_dir)
+        self._staged.add(key)
+        src = os.path.abspath(src)
+        src_stat = file_stat(src)
+        entry = self._entries.get(key)
+        if entry is not None and entry.get("src") == src and entry.get("strategy") == strategy \
+                and src_stat is not None and entry.get("src_stat") == src_stat \
+                and entry.get("dst_stat") == file_stat(dst):
+            return UNCHANGED
+        used_strategy = stage_file(src, dst, strategy)
+        self._entries[key] = {"src": src, "strategy": strategy, "src_stat": file_stat(src), "dst_stat": file_stat(dst)}
+        return used_strategy
+
+    def remove_stale(self):
+        """Removes files that were staged earlier but not since this manifest was created.
+
+        Returns:
+            (int) number of removed files
+        """
+        n_removed = 0
+        for key in [key for key in self._entries if key not in self._staged]:
+            del self._entries[key]
+            path = os.path.join(self.work_dir, key)
+            try:
+                if os.path.lexists(path):
+                    os.remove(path)
+                    n_removed += 1
+            except OSError as e:
+                logging.error("Removing stale file {0} failed: {1}".format(path, e))
+        return n_removed
@@ -20,6 +20,7 @@ Note: These are Spine Toolbox internal data models.
 
 import logging
 import os
+from itertools import islice
 from PySide2.QtCore import Qt, Signal, Slot, QModelIndex, QAbstractListModel, QAbstractTableModel, \
     QSortFilterProxyModel, QAbstractItemModel
 from PySide2.QtGui import QStandardItem, QStandardItemModel, QBrush, QFont, QIcon, QPixmap, QPainter
@@ -3147,6 +3148,165 @@ class DatapackageResourcesModel(QStandardItemModel):
             self.setData(index, tool_tip, Qt.ToolTipRole)
 
 
+class DatapackageResourceDataModel(QAbstractTableModel):
+    """A model of datapackage resource data, used by SpineDatapackageWidget.
+    Rows are read from the resource on demand, `fetch_size` rows at a time as the view scrolls down,
+    so only the rows that have been shown are kept in memory. If the resource has a row index
+    (see csv_row_index), rows are read by number instead, one page of `fetch_size` rows at a time,
+    and at most `max_pages` pages are kept in memory. Edited values are kept apart from the rows,
+    in a dictionary keyed by row and column.
+
+    Attributes:
+        parent (QMainWindow): the parent widget, an instance of SpineDatapackageWidget
+        fetch_size (int): number of rows read from the resource at a time
+        max_pages (int): number of pages kept in memory when rows are read by number
+    """
+    def __init__(self, parent=None, fetch_size=500, max_pages=20):
+        """Initialize class"""
+        super().__init__(parent)
+        self.fetch_size = fetch_size
+        self.max_pages = max_pages
+        self.header = list()
+        self.edits = dict()
+        self._rows = list()
+        self._row_iterator = None
+        self._row_reader = None
+        self._pages = dict()
+
+    def reset_model(self, header, row_iterator, edits=None, row_reader=None):
+        """Reset model with a new resource.
+
+        Args:
+            header (list): field names of the resource
+            row_iterator (Iterator): rows of the resource as lists of values
+            edits (dict): edited values keyed by (row, column) tuples, updated as data is set
+            row_reader (CsvRowReader): reader of rows by number, used instead of `row_iterator` if given
+        """
+        self.beginResetModel()
+        self._close_row_iterator()
+        self.header = list(header)
+        self.edits = edits if edits is not None else dict()
+        self._rows = list()
+        self._pages = dict()
+        self._row_reader = row_reader
+        self._row_iterator = row_iterator if row_reader is None else None
+        self.endResetModel()
+        self.fetchMore()
+
+    def clear(self):
+        """Clear all data in model."""
+        self.reset_model([], None)
+
+    def has_row_reader(self):
+        """Returns True if rows are read by number."""
+        return self._row_reader is not None
+
+    def _close_row_iterator(self):
+        """Close the source of the current rows, if it can be closed."""
+        close = getattr(self._row_iterator, "close", None)
+        if close is not None:
+            close()
+        self._row_iterator = None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        """Returns True if there are rows not yet read from the resource."""
+        return self._row_iterator is not None
+
+    def fetchMore(self, parent=QModelIndex()):
+        """Read the next `fetch_size` rows from the resource."""
+        if self._row_iterator is None:
+            return
+        rows = list(islice(self._row_iterator, self.fetch_size))
+        if len(rows) < self.fetch_size:
+            self._close_row_iterator()
+        if not rows:
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        """Number of rows read from the resource so far, or all rows if rows are read by number."""
+        if parent.isValid():
+            return 0
+        if self._row_reader is not None:
+            return len(self._row_reader)
+        return len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        """Number of fields in the resource."""
+        if parent.isValid():
+            return 0
+        return len(self.header)
+
+    def headerData(self, section, orientation=Qt.Horizontal, role=Qt.DisplayRole):
+        """Returns field names as horizontal header and row numbers as vertical header."""
+        if role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        if orientation == Qt.Horizontal:
+            try:
+                return self.header[section]
+            except IndexError:
+                return None
+        return section + 1
+
+    def setHeaderData(self, section, orientation, value, role=Qt.EditRole):
+        """Set field name."""
+        if orientation != Qt.Horizontal or role != Qt.EditRole or not 0 <= section < len(self.header):
+            return False
+        self.header[section] = value
+        self.headerDataChanged.emit(orientation, section, section)
+        return True
+
+    def horizontal_header_labels(self):
+        return list(self.header)
+
+    def flags(self, index):
+        """Returns flags for table items."""
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEditable | Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def data(self, index, role=Qt.DisplayRole):
+        """Returns the edited value of the item if any, otherwise the value read from the resource."""
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        row = index.row()
+        column = index.column()
+        try:
+            return self.edits[row, column]
+        except KeyError:
+            pass
+        try:
+            return self._row(row)[column]
+        except IndexError:
+            # missing cells at the end of the row
+            return None
+
+    def _row(self, row):
+        """Returns given row, reading its page from the row reader if it's not in memory."""
+        if self._row_reader is None:
+            return self._rows[row]
+        page, position = divmod(row, self.fetch_size)
+        rows = self._pages.pop(page, None)
+        if rows is None:
+            rows = self._row_reader.rows(page * self.fetch_size, self.fetch_size)
+            if len(self._pages) >= self.max_pages:
+                # drop least recently used page
+                del self._pages[next(iter(self._pages))]
+        self._pages[page] = rows
+        return rows[position]
+
+    def setData(self, index, value, role=Qt.EditRole):
+        """Set edited value of the item."""
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        self.edits[index.row(), index.column()] = value
+        self.dataChanged.emit(index, index, [Qt.EditRole, Qt.DisplayRole])
+        return True
+
+
 class DatapackageFieldsModel(QStandardItemModel):
     """A model of datapackage field data, used by SpineDatapackageWidget."""
     def __init__(self, spine_datapackage_widget=None):
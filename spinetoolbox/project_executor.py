@@ -0,0 +1,278 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Execution of all Tools in a project in the order given by the connections between project items.
+
+:author: P. Savolainen (VTT)
+:date:   18.10.2026
+"""
+
+import os
+from functools import partial
+from PySide2.QtCore import QObject, Signal, Slot
+
+
+def input_item_graph(connection_model):
+    """Returns the input items of every project item according to the connections.
+
+    Args:
+        connection_model (ConnectionModel): connections between project items
+
+    Returns:
+        (dict) lists of input item names keyed by item name, in the order of the connection table header
+    """
+    names = list(connection_model.header)
+    connections = connection_model.get_connections()
+    graph = dict()
+    for column, name in enumerate(names):
+        graph[name] = [names[row] for row in range(len(connections))
+                       if row != column and column < len(connections[row]) and connections[row][column]]
+    return graph
+
+
+def topological_sort(graph):
+    """Sorts items so that every item comes after its input items.
+    Items that don't depend on each other keep the order of `graph`.
+
+    Args:
+        graph (dict): lists of input item names keyed by item name, see input_item_graph
+
+    Returns:
+        (list) item names
+
+    Raises:
+        ValueError: if the connections have a cycle
+    """
+    pending_input_counts = {name: len(inputs) for name, inputs in graph.items()}
+    output_items = output_item_graph(graph)
+    ready = [name for name, count in pending_input_counts.items() if count == 0]
+    order = list()
+    while ready:
+        name = ready.pop(0)
+        order.append(name)
+        for output_name in output_items[name]:
+            pending_input_counts[output_name] -= 1
+            if pending_input_counts[output_name] == 0:
+                ready.append(output_name)
+    if len(order) < len(graph):
+        cycle = [name for name in graph if name not in order]
+        raise ValueError("Connections between items {0} form a cycle".format(", ".join(cycle)))
+    return order
+
+
+def output_item_graph(graph):
+    """Returns the output items of every project item, i.e. `graph` with the connections reversed.
+
+    Args:
+        graph (dict): lists of input item names keyed by item name, see input_item_graph
+
+    Returns:
+        (dict) lists of output item names keyed by item name
+    """
+    output_items = {name: list() for name in graph}
+    for name, inputs in graph.items():
+        for input_name in inputs:
+            output_items[input_name].append(name)
+    return output_items
+
+
+class ProjectExecutor(QObject):
+    """Executes all Tools of the project. A Tool is started as soon as all Tools upstream of it
+    have finished, and so have created references to their output files in the Data Connections
+    and Data Stores in between. Tools that don't depend on each other run concurrently, up to
+    a maximum number of Tools at a time. Julia Tools executed in the Julia REPL run one at a time
+    since they share the REPL. If a Tool fails, items downstream of it are skipped and the rest
+    of the project is executed.
+
+    Attributes:
+        toolbox (ToolboxUI): QMainWindow instance
+        max_workers (int): maximum number of Tools executed at a time, number of processors if 0
+    """
+    project_execution_finished = Signal(bool, name="project_execution_finished")
+
+    def __init__(self, toolbox, max_workers=0):
+        """Class constructor."""
+        super().__init__()
+        self._toolbox = toolbox
+        self.max_workers = max_workers if max_workers > 0 else (os.cpu_count() or 1)
+        self._order = list()
+        self._output_items = dict()
+        self._pending_input_counts = dict()
+        self._ready = list()
+        self._running = dict()  # Finished signal handlers of running Tools keyed by Tool name
+        self._failed = list()
+        self._stopped = False
+        self._scheduling = False
+
+    def start(self):
+        """Starts executing the project.
+
+        Returns:
+            (bool) True if execution started, False if the connections have a cycle
+        """
+        graph = input_item_graph(self._toolbox.connection_model)
+        try:
+            self._order = topological_sort(graph)
+        except ValueError as e:
+            self._toolbox.msg_error.emit("Project execution aborted. {0}".format(e))
+            return False
+        self._output_items = output_item_graph(graph)
+        self._pending_input_counts = {name: len(inputs) for name, inputs in graph.items()}
+        self._ready = [name for name in self._order if self._pending_input_counts[name] == 0]
+        self._running.clear()
+        self._failed.clear()
+        self._stopped = False
+        n_tools = len([name for name in self._order if self.is_tool(name)])
+        self._toolbox.msg.emit("*** Executing project <b>{0}</b>: {1} Tool(s), at most {2} at a time ***"
+                               .format(self._toolbox.project().name, n_tools, self.max_workers))
+        self.schedule()
+        return True
+
+    def is_running(self):
+        """Returns True if there are Tools running or waiting to be started."""
+        return bool(self._running or self._ready)
+
+    def stop(self):
+        """Stops starting new Tools and terminates the running ones."""
+        self._stopped = True
+        self._ready.clear()
+        running = list(self._running)
+        if not running:
+            self.project_execution_finished.emit(False)
+            return
+        for name in running:
+            tool = self.project_item(name)
+            if tool is not None and tool.instance is not None:
+                tool.stop_process()
+
+    def project_item(self, name):
+        """Returns the project item with given name, None if not found."""
+        index = self._toolbox.project_item_model.find_item(name)
+        if not index:
+            return None
+        return self._toolbox.project_item_model.project_item(index)
+
+    def is_tool(self, name):
+        """Returns True if the project item with given name is a Tool."""
+        item = self.project_item(name)
+        return item is not None and item.item_type == "Tool"
+
+    def schedule(self):
+        """Starts ready items while there are free workers. Items other than Tools have
+        nothing to execute, so they finish as soon as they're ready."""
+        self._scheduling = True
+        i = 0
+        while i < len(self._ready) and not self._stopped:
+            name = self._ready[i]
+            if not self.is_tool(name):
+                del self._ready[i]
+                self.item_finished(name, True)
+                i = 0
+                continue
+            if len(self._running) >= self.max_workers or (
+                    self.uses_julia_repl(self.project_item(name))
+                    and any(self.uses_julia_repl(self.project_item(running)) for running in self._running)):
+                i += 1
+                continue
+            del self._ready[i]
+            self.start_tool(self.project_item(name))
+            i = 0
+        self._scheduling = False
+        if not self._running and not self._stopped:
+            self.finish()
+
+    def uses_julia_repl(self, tool):
+        """Returns True if given Tool is executed in the shared Julia REPL."""
+        template = tool.tool_template()
+        return template is not None and template.tooltype == "julia" \
+            and self._toolbox._config.getboolean("settings", "use_repl")
+
+    def start_tool(self, tool):
+        """Starts executing a Tool. A Tool that fails before its process is started is finished immediately.
+
+        Args:
+            tool (Tool): Tool to execute
+        """
+        handler = partial(self.tool_finished, tool.name)
+        self._running[tool.name] = handler
+        tool.execution_finished_signal.connect(handler)
+        if not tool.execute():
+            tool.execution_finished_signal.disconnect(handler)
+            del self._running[tool.name]
+            self.item_finished(tool.name, False)
+
+    @Slot(str, int, name="tool_finished")
+    def tool_finished(self, name, return_code):
+        """Finishes a Tool when its execution is finished and schedules the next items.
+
+        Args:
+            name (str): Tool name
+            return_code (int): return code of the Tool process
+        """
+        handler = self._running.pop(name, None)
+        if handler is None:
+            return
+        self.project_item(name).execution_finished_signal.disconnect(handler)
+        self.item_finished(name, return_code == 0)
+        if self._stopped:
+            if not self._running:
+                self.project_execution_finished.emit(False)
+            return
+        if not self._scheduling:
+            # A Tool that fails to start finishes while it's being started, the ongoing scheduling takes over
+            self.schedule()
+
+    def item_finished(self, name, success):
+        """Makes output items of a finished item ready when all their inputs are finished.
+        Items downstream of a failed item are skipped.
+
+        Args:
+            name (str): item name
+            success (bool): True if the item was executed successfully
+        """
+        if not success:
+            self.skip_downstream(name)
+            return
+        for output_name in self._output_items[name]:
+            if output_name in self._failed:
+                continue
+            self._pending_input_counts[output_name] -= 1
+            if self._pending_input_counts[output_name] == 0:
+                self._ready.append(output_name)
+        self._ready.sort(key=self._order.index)
+
+    def skip_downstream(self, name):
+        """Marks an item and all items downstream of it as failed.
+
+        Args:
+            name (str): name of the failed item
+        """
+        stack = [name]
+        while stack:
+            failed_name = stack.pop()
+            if failed_name in self._failed:
+                continue
+            self._failed.append(failed_name)
+            if failed_name != name:
+                self._toolbox.msg_warning.emit("\tSkipping <b>{0}</b> since <b>{1}</b> failed"
+                                               .format(failed_name, name))
+            stack.extend(self._output_items[failed_name])
+
+    def finish(self):
+        """Reports the result of the execution."""
+        failed_tools = [name for name in self._failed if self.is_tool(name)]
+        if failed_tools:
+            self._toolbox.msg_error.emit("Project execution finished. Failed or skipped Tool(s): {0}"
+                                         .format(", ".join(failed_tools)))
+        else:
+            self._toolbox.msg_success.emit("Project execution finished")
+        self.project_execution_finished.emit(not failed_tools)
@@ -117,6 +117,11 @@ class ProjectItem(MetaObject):
         child._parent = None
         return True
 
+    def tear_down(self):
+        """Releases resources of this item, e.g. stops its threads, before the item is removed
+        from the project or the application is closed. Reimplement in subclasses that need it."""
+        pass
+
     def connect_signals(self):
         """Connect signals to handlers."""
         for signal, handler in self._sigs.items():
@@ -0,0 +1,200 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Functions to archive Tool output files into results directories and to compress results directories
+of earlier executions.
+
+:author: P. Savolainen (VTT)
+:date:   18.10.2026
+"""
+
+import os
+import shutil
+import zipfile
+from PySide2.QtCore import QObject, Signal, Slot
+from file_staging import stage_file
+
+ARCHIVING_MODES = ("copy", "move", "hardlink")
+PARTIAL_ARCHIVE_SUFFIX = ".tmp"
+
+
+class CompressionStopped(Exception):
+    """Raised inside compress_dir when compression is stopped."""
+
+
+def archiving_mode(configs):
+    """Returns the output archiving mode from application settings, copy if the setting is invalid.
+
+    Args:
+        configs (ConfigurationParser): Application settings
+
+    Returns:
+        (str) one of ARCHIVING_MODES
+    """
+    mode = configs.get("settings", "output_archiving").strip().lower()
+    return mode if mode in ARCHIVING_MODES else "copy"
+
+
+def archive_file(src, target_dir, mode="copy"):
+    """Archives a file into a directory by copying, moving or hard linking it.
+    A file is moved by renaming it if possible, and hard linked if possible, otherwise it's copied.
+
+    Args:
+        src (str): path to file
+        target_dir (str): path to results directory
+        mode (str): one of ARCHIVING_MODES
+
+    Returns:
+        (str) path to archived file
+
+    Raises:
+        OSError: if archiving the file fails
+    """
+    dst = os.path.join(target_dir, os.path.basename(src))
+    if mode == "move":
+        shutil.move(src, dst)
+    elif mode == "hardlink":
+        stage_file(src, dst, "hardlink")
+    else:
+        shutil.copy(src, dst)
+    return dst
+
+
+def compress_dir(path, stop_requested=None):
+    """Compresses a directory into a zip file next to it and removes the directory.
+    The zip file is written under a temporary name first, so an interrupted compression leaves
+    the directory intact.
+
+    Args:
+        path (str): path to directory
+        stop_requested (function): called before each file is compressed, compression is stopped
+            and the temporary zip file removed if it returns True
+
+    Returns:
+        (str) path to zip file, None if compression was stopped
+    """
+    zip_path = path + ".zip"
+    temp_path = zip_path + PARTIAL_ARCHIVE_SUFFIX
+    try:
+        with zipfile.ZipFile(temp_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for dirpath, dirnames, filenames in os.walk(path):
+                for filename in filenames:
+                    if stop_requested is not None and stop_requested():
+                        raise CompressionStopped()
+                    file_path = os.path.join(dirpath, filename)
+                    archive.write(file_path, os.path.relpath(file_path, path))
+        os.replace(temp_path, zip_path)
+    except CompressionStopped:
+        os.remove(temp_path)
+        return None
+    except (OSError, zipfile.BadZipFile):
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    shutil.rmtree(path)
+    return zip_path
+
+
+def remove_partial_archives(tool_output_dir):
+    """Removes temporary zip files left behind by compressions that were interrupted,
+    e.g. when the application was killed, from a Tool output directory and its 'failed' subdirectory.
+
+    Args:
+        tool_output_dir (str): Tool output directory
+
+    Returns:
+        (int) number of removed files
+    """
+    n_removed = 0
+    for parent in (tool_output_dir, os.path.join(tool_output_dir, "failed")):
+        try:
+            names = os.listdir(parent)
+        except OSError:
+            continue
+        for name in names:
+            if name.endswith(".zip" + PARTIAL_ARCHIVE_SUFFIX):
+                try:
+                    os.remove(os.path.join(parent, name))
+                    n_removed += 1
+                except OSError:
+                    continue
+    return n_removed
+
+
+def superseded_result_dirs(tool_output_dir, latest_dir, referenced_paths):
+    """Returns results directories of earlier executions that can be compressed: all timestamped
+    directories in a Tool output directory and in its 'failed' subdirectory, except the latest
+    one and those containing files that project items refer to.
+
+    Args:
+        tool_output_dir (str): Tool output directory
+        latest_dir (str): results directory of the latest execution
+        referenced_paths (list): paths to files that project items refer to
+
+    Returns:
+        (list) paths to directories
+    """
+    referenced_dirs = {os.path.normcase(os.path.dirname(os.path.abspath(p))) for p in referenced_paths}
+    if latest_dir:
+        referenced_dirs.add(os.path.normcase(os.path.abspath(latest_dir)))
+    dirs = list()
+    for parent in (tool_output_dir, os.path.join(tool_output_dir, "failed")):
+        try:
+            names = sorted(os.listdir(parent))
+        except OSError:
+            continue
+        for name in names:
+            path = os.path.abspath(os.path.join(parent, name))
+            if name == "failed" or not os.path.isdir(path) or os.path.normcase(path) in referenced_dirs:
+                continue
+            dirs.append(path)
+    return dirs
+
+
+class ResultCompressionWorker(QObject):
+    """Compresses results directories in a thread, see compress_dir.
+
+    Attributes:
+        paths (list): paths to results directories
+    """
+    compressed = Signal(int, name="compressed")
+    failed = Signal(str, name="failed")
+
+    def __init__(self, paths):
+        """Class constructor."""
+        super().__init__()
+        self.paths = paths
+        self._stopped = False
+
+    def stop(self):
+        """Requests compression to stop. Called from another thread, the directory being
+        compressed is left as it was."""
+        self._stopped = True
+
+    def stop_requested(self):
+        """Returns True if compression should stop."""
+        return self._stopped
+
+    @Slot(name="run")
+    def run(self):
+        """Compress directories and emit their number in `compressed` signal.
+        Errors are emitted in `failed` signal and the remaining directories are still compressed."""
+        n_compressed = 0
+        for path in self.paths:
+            if self._stopped:
+                break
+            try:
+                if compress_dir(path, self.stop_requested) is not None:
+                    n_compressed += 1
+            except Exception as e:
+                self.failed.emit("Compressing {0} failed: {1}".format(path, e))
+        self.compressed.emit(n_compressed)
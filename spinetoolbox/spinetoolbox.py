@@ -18,6 +18,7 @@ Spine Toolbox application main file.
 
 import sys
 import logging
+import multiprocessing
 from PySide2.QtWidgets import QApplication
 from ui_main import ToolboxUI
 from helpers import spinedatabase_api_version_check
@@ -43,4 +44,6 @@ def main(argv):
 
 
 if __name__ == '__main__':
+    # Worker processes of a frozen application must not start the application again
+    multiprocessing.freeze_support()
     sys.exit(main(sys.argv))
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for csv_row_index module.
+"""
+
+import csv
+import os
+import uuid
+import unittest
+from unittest import mock
+
+from csv_row_index import CsvRowReader, row_index_filepath, load_row_offsets, write_row_edits
+
+
+class TestCsvRowIndex(unittest.TestCase):
+
+    def setUp(self):
+        """Overridden method. Runs before each test.
+        """
+        self.path = os.path.abspath(str(uuid.uuid4()) + '.csv')
+        self.rows = [['id', 'value']]
+        self.rows += [[str(i), v] for i, v in enumerate(['a', 'b,c', 'd"e', 'f\ng', 'h\r\ni', '', 'ä'])]
+        with open(self.path, 'w', newline='', encoding='utf-8-sig') as f:
+            csv.writer(f).writerows(self.rows)
+
+    def tearDown(self):
+        """Overridden method. Runs after each test.
+        """
+        for path in [self.path, row_index_filepath(self.path)]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_read_rows_by_number(self):
+        """Test that rows with quoted line breaks are read by number"""
+        reader = CsvRowReader(self.path)
+        self.assertEqual(len(reader), 7)
+        self.assertEqual(reader.row(3), ['3', 'f\ng'])
+        self.assertEqual(reader.row(5), ['5', ''])
+        self.assertEqual(reader.rows(5, 2), self.rows[6:8])
+        self.assertEqual(reader.rows(), self.rows[1:])
+        self.assertEqual(CsvRowReader(self.path, {'header': False}).row(0), ['id', 'value'])
+
+    def test_index_is_rebuilt_when_file_changes(self):
+        """Test that the sidecar file is used until the csv file changes"""
+        reader = CsvRowReader(self.path)
+        self.assertEqual(list(load_row_offsets(self.path, {})), list(reader._offsets))
+        self.assertTrue(reader.is_valid())
+        with open(self.path, 'a', newline='', encoding='utf-8') as f:
+            f.write('7,x\r\n')
+        self.assertFalse(reader.is_valid())
+        self.assertIsNone(load_row_offsets(self.path, {}))
+        reader = CsvRowReader(self.path)
+        self.assertEqual(reader.row(7), ['7', 'x'])
+
+    def test_write_row_edits(self):
+        """Test that edited rows are written and other rows are copied as they are"""
+        with open(self.path, 'rb') as f:
+            original = f.read()
+        reader = CsvRowReader(self.path)
+        edited_rows = write_row_edits(reader, {(3, 1): 'j\nk', (0, 1): 'l', (6, 3): 'm', (6, 0): None})
+        self.assertEqual(edited_rows, 3)
+        with open(self.path, newline='', encoding='utf-8-sig') as f:
+            rows = list(csv.reader(f))
+        expected = [list(row) for row in self.rows]
+        expected[1][1] = 'l'
+        expected[4][1] = 'j\nk'
+        expected[7] = ['', 'ä', '', 'm']
+        self.assertEqual(rows, expected)
+        with open(self.path, 'rb') as f:
+            written = f.read()
+        # byte order mark, header and rows between edited rows are untouched
+        self.assertTrue(written.startswith(original[:reader.offset(0)]))
+        self.assertIn(original[reader.offset(4):reader.offset(6)], written)
+
+    def test_utf16_is_not_indexed(self):
+        """Test that a file in an encoding not compatible with ascii is not indexed"""
+        with self.assertRaises(ValueError):
+            CsvRowReader(self.path, encoding='utf-16')
+
+    def test_cancel_building_index(self):
+        """Test that a cancelled index is not saved into the sidecar file"""
+        with mock.patch('csv_row_index.CANCEL_CHECK_INTERVAL', 2), self.assertRaises(ValueError):
+            CsvRowReader(self.path, cancelled=lambda: True)
+        self.assertFalse(os.path.exists(row_index_filepath(self.path)))
+        self.assertEqual(len(CsvRowReader(self.path, cancelled=lambda: False)), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
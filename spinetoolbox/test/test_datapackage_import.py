@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for datapackage_import_export module.
+"""
+
+import os
+import shutil
+import uuid
+import unittest
+from unittest.mock import MagicMock, patch
+from collections import namedtuple
+
+from spinedatabase_api import SpineDBAPIError
+from datapackage import Package
+from tableschema import Schema
+from datapackage_inference import infer_datapackage_descriptor
+from datapackage_import_export import import_resource, import_foreign_keys, add_in_batches, iter_csv_rows, \
+    export_datapackage, iter_resource_rows, read_resource_batches, CLASS_BATCH, OBJECT_BATCH
+
+
+class TestDatapackageImport(unittest.TestCase):
+
+    def setUp(self):
+        """Overridden method. Runs before each test.
+        """
+        self.Item = namedtuple('Item', ['id', 'name', 'class_id', 'object_class_id'])
+        self.next_id = 0
+
+    def add_items(self, *items):
+        """Returns namedtuples with new ids for given item dictionaries."""
+        added = []
+        for item in items:
+            self.next_id += 1
+            added.append(self.Item(self.next_id, item.get('name'), item.get('class_id'),
+                                   item.get('object_class_id')))
+        return added
+
+    def mock_resource(self, name, field_names, rows, primary_key=None, foreign_keys=None):
+        resource = MagicMock()
+        resource.name = name
+        resource.schema.field_names = field_names
+        resource.schema.fields = [MagicMock() for _ in field_names]
+        for field, field_name in zip(resource.schema.fields, field_names):
+            field.name = field_name
+        resource.schema.primary_key = primary_key or []
+        resource.schema.foreign_keys = foreign_keys or []
+        resource.schema.missing_values = ['']
+        resource.local = False
+        resource.iter.side_effect = lambda **kwargs: iter(rows)
+        return resource
+
+    def test_import_resource_batches(self):
+        """Test that objects and parameter values are inserted in batches"""
+        db_map = MagicMock()
+        db_map.parameter_list.return_value = [self.Item(100, 'capacity', None, 1)]
+        db_map.object_list.return_value = [self.Item(200, 'u0', 1, None)]
+        db_map.add_parameters.side_effect = self.add_items
+        db_map.add_objects.side_effect = self.add_items
+        db_map.add_parameter_values.side_effect = lambda *items: list(items)
+        rows = [['u{}'.format(i), str(i), str(2 * i)] for i in range(5)]
+        resource = self.mock_resource('unit', ['unit', 'capacity', 'cost'], rows, primary_key=['unit'])
+
+        import_resource(db_map, resource, {'unit': 1}, batch_size=2)
+
+        # parameter ids are resolved once, only the missing parameter is added
+        db_map.add_parameters.assert_called_once_with({'object_class_id': 1, 'name': 'cost'})
+        # u0 already exists, remaining four objects are added two at a time
+        self.assertEqual([c[0] for c in db_map.add_objects.call_args_list],
+                         [({'class_id': 1, 'name': 'u1'},),
+                          ({'class_id': 1, 'name': 'u2'}, {'class_id': 1, 'name': 'u3'}),
+                          ({'class_id': 1, 'name': 'u4'},)])
+        values = [v for c in db_map.add_parameter_values.call_args_list for v in c[0]]
+        self.assertTrue(all(len(c[0]) <= 2 for c in db_map.add_parameter_values.call_args_list))
+        self.assertEqual(len(values), 8)
+        self.assertIn({'object_id': 2, 'parameter_id': 100, 'value': '1'}, values)
+        self.assertIn({'object_id': 2, 'parameter_id': 1, 'value': '2'}, values)
+
+    def test_import_resource_cast(self):
+        """Test that values are cast by field type and bad values end up in the error log"""
+        db_map = MagicMock()
+        db_map.parameter_list.return_value = []
+        db_map.object_list.return_value = []
+        db_map.add_parameters.side_effect = self.add_items
+        db_map.add_objects.side_effect = self.add_items
+        db_map.add_parameter_values.side_effect = lambda *items: list(items)
+        schema = Schema({'fields': [{'name': 'unit', 'type': 'string'},
+                                    {'name': 'capacity', 'type': 'integer'},
+                                    {'name': 'cost', 'type': 'number', 'decimalChar': ',', 'groupChar': ' '},
+                                    {'name': 'online', 'type': 'boolean'},
+                                    {'name': 'built', 'type': 'date'}],
+                         'primaryKey': ['unit']})
+        rows = [['u1', '3', '1 000,5', 'true', '2018-01-01'],
+                ['u2', 'x', '2', 'no', '2018-13-01'],
+                ['u3', '4.5', '', '0', '']]
+        resource = self.mock_resource('unit', schema.field_names, rows, primary_key=['unit'])
+        resource.schema = schema
+        error_log = import_resource(db_map, resource, {'unit': 1}, cast=True)
+        values = [v for c in db_map.add_parameter_values.call_args_list for v in c[0]]
+        # parameters capacity, cost, online and built get ids 1 to 4, objects u1 to u3 ids 5 to 7
+        self.assertEqual(values, [{'object_id': 5, 'parameter_id': 1, 'value': 3},
+                                  {'object_id': 5, 'parameter_id': 2, 'value': 1000.5},
+                                  {'object_id': 5, 'parameter_id': 3, 'value': True},
+                                  {'object_id': 5, 'parameter_id': 4, 'value': '2018-01-01'},
+                                  {'object_id': 6, 'parameter_id': 2, 'value': 2.0},
+                                  {'object_id': 7, 'parameter_id': 3, 'value': False}])
+        self.assertEqual([e[2].split(',')[0] for e in error_log],
+                         ["2 values of field 'capacity' couldn't be cast into integer",
+                          "1 values of field 'online' couldn't be cast into boolean",
+                          "1 values of field 'built' couldn't be cast into date"])
+        self.assertIn("first one 'x' on row 2", error_log[0][2])
+
+    def test_read_resource_batches(self):
+        """Test that rows are read and cast into batches of object names and values without a database"""
+        schema = Schema({'fields': [{'name': 'unit', 'type': 'string'},
+                                    {'name': 'capacity', 'type': 'integer'},
+                                    {'name': 'node', 'type': 'string'}],
+                         'primaryKey': ['unit'],
+                         'foreignKeys': [{'fields': ['node'], 'reference': {'resource': 'node', 'fields': ['id']}}]})
+        rows = [['u1', '3', 'n1'], ['u2', 'x', 'n2'], ['u3', '', 'n1']]
+        resource = self.mock_resource('unit', schema.field_names, rows, primary_key=['unit'])
+        resource.schema = schema
+        error_log = list()
+        batches = list(read_resource_batches(resource, {'unit', 'node'}, error_log, batch_size=2, cast=True))
+        self.assertEqual(batches, [(CLASS_BATCH, 'unit', 0, (['node'], ['capacity'])),
+                                   (OBJECT_BATCH, 'unit', 2, [('u1', [('capacity', 3)]), ('u2', [])]),
+                                   (OBJECT_BATCH, 'unit', 3, [('u3', [])])])
+        self.assertEqual(len(error_log), 1)
+
+    def test_add_in_batches_failing_item(self):
+        """Test that a failing batch is added one by one and failing items are None"""
+        def add_objects(*items):
+            if any(item['name'] == 'bad' for item in items):
+                raise SpineDBAPIError('bad name')
+            return self.add_items(*items)
+        items = [{'name': 'a'}, {'name': 'bad'}, {'name': 'b'}]
+        added = add_in_batches(add_objects, items, batch_size=2)
+        self.assertEqual([a.name if a else None for a in added], ['a', None, 'b'])
+
+    def test_import_resource_short_rows(self):
+        """Test that missing cells at the end of a row don't create parameter values"""
+        db_map = MagicMock()
+        db_map.parameter_list.return_value = [self.Item(100, 'capacity', None, 1)]
+        db_map.object_list.return_value = []
+        db_map.add_objects.side_effect = self.add_items
+        db_map.add_parameter_values.side_effect = lambda *items: list(items)
+        resource = self.mock_resource('unit', ['unit', 'capacity'], [['u1', '3'], ['u2']], primary_key=['unit'])
+        import_resource(db_map, resource, {'unit': 1})
+        db_map.add_parameter_values.assert_called_once_with({'object_id': 1, 'parameter_id': 100, 'value': '3'})
+
+    def test_import_resource_matches_objects_by_name(self):
+        """Test that added objects are matched to rows by name and rows with an empty primary key are logged"""
+        db_map = MagicMock()
+        db_map.parameter_list.return_value = [self.Item(100, 'capacity', None, 1)]
+        db_map.object_list.return_value = []
+        db_map.add_objects.side_effect = lambda *items: list(reversed(self.add_items(*items)))
+        db_map.add_parameter_values.side_effect = lambda *items: list(items)
+        rows = [['u1', '1'], [None, '2'], ['u2', '3'], ['', '4']]
+        resource = self.mock_resource('unit', ['unit', 'capacity'], rows, primary_key=['unit'])
+        error_log = import_resource(db_map, resource, {'unit': 1})
+        values = [v for c in db_map.add_parameter_values.call_args_list for v in c[0]]
+        # u1 gets id 1 and u2 id 2, but they are returned in reverse order
+        self.assertEqual(sorted(values, key=lambda v: v['object_id']),
+                         [{'object_id': 1, 'parameter_id': 100, 'value': '1'},
+                          {'object_id': 2, 'parameter_id': 100, 'value': '3'}])
+        self.assertEqual(error_log, [["resource", "unit",
+                                      "2 rows with an empty primary key were skipped, first one on row 2"]])
+
+    def test_import_foreign_keys(self):
+        """Test that relationships are created from foreign keys in batches"""
+        Object = namedtuple('Object', ['id', 'class_id', 'name'])
+        RelationshipClass = namedtuple('RelationshipClass', ['id', 'name'])
+        Relationship = namedtuple('Relationship', ['class_id', 'name'])
+        db_map = MagicMock()
+        db_map.object_list.return_value = [Object(1, 1, 'u1'), Object(2, 1, 'u2'), Object(3, 1, 'u3'),
+                                           Object(4, 2, 'n1'), Object(5, 2, 'n2')]
+        db_map.wide_relationship_class_list.return_value = [RelationshipClass(10, 'unit_node')]
+        db_map.wide_relationship_list.return_value = [Relationship(10, 'unit_node_u1_n1')]
+        db_map.add_wide_relationships.side_effect = lambda *items: list(items)
+        foreign_keys = [{'fields': ['node'], 'reference': {'resource': 'node', 'fields': ['name']}}]
+        unit = self.mock_resource('unit', ['unit', 'node'],
+                                  [['u1', 'node 1'], ['u2', 'node 2'], ['u3', 'node 1'], ['u4', 'node 2'], ['u5', 'x']],
+                                  primary_key=['unit'], foreign_keys=foreign_keys)
+        unit_without_node = self.mock_resource('unit', ['unit', 'node'], [['u1', '']], primary_key=['unit'],
+                                               foreign_keys=foreign_keys)
+        node = self.mock_resource('node', ['id', 'name'], [['n1', 'node 1'], ['n2', 'node 2']], primary_key=['id'])
+        datapackage = MagicMock()
+        datapackage.resources = [unit, node]
+        datapackage.get_resource.side_effect = {'node': node}.get
+
+        import_foreign_keys(db_map, datapackage, {'unit': 1, 'node': 2}, batch_size=1)
+
+        # u1 already has the relationship, u4 doesn't exist and node 'x' is not found
+        self.assertEqual([c[0] for c in db_map.add_wide_relationships.call_args_list],
+                         [({'class_id': 10, 'object_id_list': [2, 5], 'name': 'unit_node_u2_n2'},),
+                          ({'class_id': 10, 'object_id_list': [3, 4], 'name': 'unit_node_u3_n1'},)])
+        # node resource is read only once to build the index
+        self.assertEqual(node.iter.call_count, 1)
+        datapackage.resources = [unit_without_node, node]
+        db_map.add_wide_relationships.reset_mock()
+        import_foreign_keys(db_map, datapackage, {'unit': 1, 'node': 2})
+        db_map.add_wide_relationships.assert_not_called()
+
+    def test_iter_csv_rows_dialect(self):
+        """Test streaming rows from a csv file with a datapackage dialect"""
+        path = str(uuid.uuid4()) + '.csv'
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            f.write('a;b\n"x;y";2\n3;"4"""\n')
+        try:
+            rows = list(iter_csv_rows(path, {'delimiter': ';'}))
+            rows_with_header = list(iter_csv_rows(path, {'delimiter': ';', 'header': False}))
+        finally:
+            os.remove(path)
+        self.assertEqual(rows, [['x;y', '2'], ['3', '4"']])
+        self.assertEqual(rows_with_header[0], ['a', 'b'])
+
+    def test_infer_datapackage_descriptor(self):
+        """Test that inferring resources in worker threads gives the same descriptor as Package.infer"""
+        base_path = os.path.abspath(str(uuid.uuid4()))
+        os.mkdir(base_path)
+        try:
+            for name in ['b', 'a', 'c']:
+                with open(os.path.join(base_path, name + '.csv'), 'w') as f:
+                    f.write('id,value\n{0}1,1\n{0}2,2.5\n'.format(name))
+            package = Package(base_path=base_path)
+            expected = package.infer('*.csv')
+            progress = []
+            descriptor = infer_datapackage_descriptor(base_path, workers=2,
+                                                      progress=lambda done, total: progress.append((done, total)))
+            serial_descriptor = infer_datapackage_descriptor(base_path, workers=0)
+        finally:
+            for name in os.listdir(base_path):
+                os.remove(os.path.join(base_path, name))
+            os.rmdir(base_path)
+        expected['resources'].sort(key=lambda r: r['path'])
+        self.assertEqual(descriptor, expected)
+        self.assertEqual(serial_descriptor, expected)
+        self.assertEqual(progress, [(1, 3), (2, 3), (3, 3)])
+        self.assertEqual([r['name'] for r in descriptor['resources']], ['a', 'b', 'c'])
+
+    def test_cancel_infer_datapackage_descriptor(self):
+        """Test that no more resources are inferred after inference is cancelled"""
+        base_path = os.path.abspath(str(uuid.uuid4()))
+        os.mkdir(base_path)
+        try:
+            for name in ['a', 'b', 'c', 'd', 'e']:
+                with open(os.path.join(base_path, name + '.csv'), 'w') as f:
+                    f.write('id,value\n{0}1,1\n'.format(name))
+            for workers in (0, 2):
+                progress = []
+                descriptor = infer_datapackage_descriptor(base_path, workers=workers,
+                                                          progress=lambda done, total: progress.append(done),
+                                                          cancelled=lambda: len(progress) >= 2)
+                self.assertIsNone(descriptor)
+                self.assertLessEqual(len(progress), 3)
+        finally:
+            for name in os.listdir(base_path):
+                os.remove(os.path.join(base_path, name))
+            os.rmdir(base_path)
+
+    def test_export_datapackage(self):
+        """Test that object and relationship classes are exported as valid resources with keys and typed fields"""
+        objects = [['unit', iter([['u1', '2', None, '1.5'], ['u2', None, 'x', '3']]), ['unit'],
+                    ['capacity', 'unit', 'cost']],
+                   ['Power Node', iter([['n1']]), ['Power Node'], []]]
+        relationships = [['unit__Power Node', iter([['u1', 'n1', '3']]), ['unit', 'Power Node'], ['flow']]]
+        dirpath = os.path.abspath(str(uuid.uuid4()))
+        try:
+            with patch('datapackage_import_export.stream_unstacked_objects', return_value=iter(objects)), \
+                    patch('datapackage_import_export.stream_unstacked_relationships',
+                          return_value=iter(relationships)):
+                path = export_datapackage(MagicMock(), dirpath)
+            package = Package(path)
+            rows = {r.name: list(iter_resource_rows(r)) for r in package.resources}
+            unit = package.get_resource('unit')
+            relationship = package.get_resource('unit__power_node')
+        finally:
+            shutil.rmtree(dirpath)
+        self.assertTrue(package.valid, package.errors)
+        self.assertEqual(package.resource_names, ['unit', 'power_node', 'unit__power_node'])
+        self.assertEqual([r.descriptor['title'] for r in package.resources],
+                         ['unit', 'Power Node', 'unit__Power Node'])
+        self.assertEqual(unit.schema.field_names, ['unit', 'capacity', 'unit_2', 'cost'])
+        self.assertEqual([f.type for f in unit.schema.fields], ['string', 'integer', 'string', 'number'])
+        self.assertEqual(unit.schema.primary_key, ['unit'])
+        self.assertEqual(rows['unit'], [['u1', '2', '', '1.5'], ['u2', '', 'x', '3']])
+        self.assertEqual(relationship.schema.field_names, ['unit', 'Power Node', 'flow'])
+        self.assertEqual([f.type for f in relationship.schema.fields], ['string', 'string', 'integer'])
+        self.assertEqual(relationship.schema.primary_key, ['unit', 'Power Node'])
+        self.assertEqual([(fk['fields'], fk['reference']) for fk in relationship.schema.foreign_keys],
+                         [(['unit'], {'resource': 'unit', 'fields': ['unit']}),
+                          (['Power Node'], {'resource': 'power_node', 'fields': ['Power Node']})])
+        self.assertEqual(rows['unit__power_node'], [['u1', 'n1', '3']])
+
+if __name__ == '__main__':
+    unittest.main()
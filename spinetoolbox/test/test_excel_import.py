@@ -6,15 +6,21 @@ Created on Mon Nov 12 13:40:52 2018
 """
 
 import os
+import shutil
 import uuid
 import unittest
 from unittest import mock
 from unittest.mock import MagicMock
 from collections import namedtuple
 from sqlalchemy.orm import Session
+from openpyxl import Workbook, load_workbook
 
-from spinedatabase_api import DatabaseMapping, DiffDatabaseMapping, create_new_spine_database
-from excel_import_export import stack_list_of_tuples, unstack_list_of_tuples, validate_sheet, SheetData, read_parameter_sheet, read_json_sheet, merge_spine_xlsx_data, read_spine_xlsx, export_spine_database_to_xlsx, get_unstacked_objects, import_xlsx_to_db
+from spinedatabase_api import DatabaseMapping, DiffDatabaseMapping, create_new_spine_database, SpineDBAPIError
+from excel_import_export import stack_list_of_tuples, unstack_list_of_tuples, validate_sheet, SheetData, read_parameter_sheet, read_json_sheet, merge_spine_xlsx_data, read_spine_xlsx, export_spine_database_to_xlsx, get_unstacked_objects, import_xlsx_to_db, export_object_to_spine_db, \
+    batch_update_parameter_values, read_header_rows, validate_header_rows, read_parameter_rows, read_json_rows, \
+    sheet_fingerprints, load_json, pack_json_parameters, unpack_json_parameters
+from csv_import_export import export_spine_database_to_csv, import_csv_to_db, read_csv_sheet, write_csv_sheet, \
+    cell_value, write_parquet_sheet, read_file_rows
 
 
 class TestExcelIntegration(unittest.TestCase):
@@ -201,6 +207,95 @@ class TestExcelIntegration(unittest.TestCase):
         # compare dbs
         self.compare_dbs(self.empty_db_map, self.db_map)
 
+    def test_export_import_read_only(self):
+        """Integration test exporting an excel and then importing it to a new database in read only mode."""
+        # export to excel
+        export_spine_database_to_xlsx(self.db_map, self.temp_excel_filename)
+
+        # import into empty database
+        import_xlsx_to_db(self.empty_db_map, self.temp_excel_filename, read_only=True)
+        self.empty_db_map.commit_session('Excel import')
+
+        # compare dbs
+        self.compare_dbs(self.empty_db_map, self.db_map)
+
+    def test_export_import_write_only(self):
+        """Integration test exporting an excel in write only mode and then importing it to a new database."""
+        # export to excel
+        export_spine_database_to_xlsx(self.db_map, self.temp_excel_filename, write_only=True)
+
+        # import into empty database
+        import_xlsx_to_db(self.empty_db_map, self.temp_excel_filename)
+        self.empty_db_map.commit_session('Excel import')
+
+        # compare dbs
+        self.compare_dbs(self.empty_db_map, self.db_map)
+
+    def test_export_import_processes(self):
+        """Integration test exporting an excel and then importing it to a new database parsing sheets in parallel."""
+        # export to excel
+        export_spine_database_to_xlsx(self.db_map, self.temp_excel_filename)
+
+        # import into empty database
+        import_xlsx_to_db(self.empty_db_map, self.temp_excel_filename, processes=2)
+        self.empty_db_map.commit_session('Excel import')
+
+        # compare dbs
+        self.compare_dbs(self.empty_db_map, self.db_map)
+
+    def test_export_import_csv(self):
+        """Integration test exporting a directory of csv files and then importing it to a new database."""
+        temp_dir = str(uuid.uuid4())
+        try:
+            export_spine_database_to_csv(self.db_map, temp_dir)
+            import_csv_to_db(self.empty_db_map, temp_dir)
+            self.empty_db_map.commit_session('CSV import')
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        # compare dbs
+        self.compare_dbs(self.empty_db_map, self.db_map)
+
+    def test_export_import_parquet(self):
+        """Integration test exporting a directory of parquet files and then importing it to a new database."""
+        try:
+            import pyarrow
+        except ImportError:
+            self.skipTest("pyarrow not installed")
+        temp_dir = str(uuid.uuid4())
+        try:
+            export_spine_database_to_csv(self.db_map, temp_dir, "parquet")
+            import_csv_to_db(self.empty_db_map, temp_dir, "parquet")
+            self.empty_db_map.commit_session('Parquet import')
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        # compare dbs
+        self.compare_dbs(self.empty_db_map, self.db_map)
+
+    def test_export_import_incremental(self):
+        """Integration test importing an excel twice in incremental mode, unchanged sheets are skipped."""
+        # export to excel
+        export_spine_database_to_xlsx(self.db_map, self.temp_excel_filename)
+
+        # import into empty database
+        fingerprints = {}
+        insert_log, error_log = import_xlsx_to_db(self.empty_db_map, self.temp_excel_filename,
+                                                  fingerprints=fingerprints)
+        self.empty_db_map.commit_session('Excel import')
+        self.assertEqual(error_log, [])
+        self.assertEqual(fingerprints, sheet_fingerprints(self.temp_excel_filename))
+        self.assertFalse(any(log[0] == 'skipped sheet' for log in insert_log))
+
+        # import again, all sheets are skipped
+        insert_log, error_log = import_xlsx_to_db(self.empty_db_map, self.temp_excel_filename,
+                                                  fingerprints=fingerprints)
+        self.assertEqual(insert_log, [['skipped sheet', s] for s in fingerprints])
+        self.assertEqual(error_log, [])
+
+        # compare dbs
+        self.compare_dbs(self.empty_db_map, self.db_map)
+
     def test_import_to_existing_data(self):
         """Integration test importing data to a database with existing items"""
         # export to excel
@@ -433,7 +528,12 @@ class TestExcelImport(unittest.TestCase):
 
     def test_read_json_sheet_all_valid_relationship(self):
         """Test reading a sheet with object parameter"""
-        ws = self.ws_rel_json
+        ws = Workbook().active
+        ws.title = 'title'
+        for row in [[None], ['relationship', 'json array', 'relationship_name', 2], [None],
+                    ['object_class_name1', 'a_obj1', 'a_obj2'], ['object_class_name2', 'b_obj1', 'b_obj2'],
+                    ['json parameter', 'parameter1', 'parameter2'], [None, 1, 4], [None, 2, 5], [None, 3, 6]]:
+            ws.append(row)
         parameter_values = [self.RelData('json', 'a_obj1', 'b_obj1', 'parameter1', '[1, 2, 3]'),
                             self.RelData('json', 'a_obj2', 'b_obj2', 'parameter2', '[4, 5, 6]')]
         test_data = SheetData('title', 'relationship_name',
@@ -448,7 +548,12 @@ class TestExcelImport(unittest.TestCase):
 
     def test_read_json_sheet_all_valid_object(self):
         """Test reading a sheet with object parameter"""
-        ws = self.ws_obj_json
+        ws = Workbook().active
+        ws.title = 'title'
+        for row in [[None], ['object', 'json array', 'object_class_name'], [None],
+                    ['object_class_name', 'obj1', 'obj2'], ['json parameter', 'parameter1', 'parameter2'],
+                    [None, 1, 4], [None, 2, 5], [None, 3, 6]]:
+            ws.append(row)
         parameter_values = [self.ObjData('json', 'obj1', 'parameter1', '[1, 2, 3]'),
                             self.ObjData('json', 'obj2', 'parameter2', '[4, 5, 6]')]
         test_data = SheetData('title', 'object_class_name',
@@ -530,6 +635,173 @@ class TestExcelImport(unittest.TestCase):
             out_data = read_parameter_sheet(ws)
         self.assertEqualSheetData(test_data, out_data)
 
+    def test_read_parameter_rows_relationship(self):
+        """Test reading rows from a sheet with relationship parameter"""
+        rows = iter([(None,), ('relationship', 'parameter', 'relationship_name', 2),
+                     (None,), ('object_class_name1', 'object_class_name2', 'parameter1', 'parameter2'),
+                     ('a_obj1', 'b_obj1', 1, 'a'), ('a_obj2', 'b_obj2', 2), (None, 'b_obj3', 3, 'c')])
+        parameter_values = [self.RelData('value', 'a_obj1', 'b_obj1', 'parameter1', 1),
+                            self.RelData('value', 'a_obj1', 'b_obj1', 'parameter2', 'a'),
+                            self.RelData('value', 'a_obj2', 'b_obj2', 'parameter1', 2)]
+        test_data = SheetData('title', 'relationship_name',
+                              self.data_class_rel[0], self.data_parameter,
+                              parameter_values, self.class_obj_rel, 'relationship')
+        header = read_header_rows(rows)
+        self.assertTrue(validate_header_rows(header))
+        out_data = read_parameter_rows('title', header, rows)
+        self.assertEqualSheetData(test_data, out_data)
+
+    def test_read_json_rows_relationship(self):
+        """Test reading rows from a sheet with relationship json arrays"""
+        rows = iter([(None, None, None), ('relationship', 'json array', 'relationship_name', 2),
+                     (None, None, None), ('object_class_name1', 'a_obj1', 'a_obj2'),
+                     ('object_class_name2', 'b_obj1', 'b_obj2'), ('json parameter', 'parameter1', 'parameter2'),
+                     (None, 1, 4), (None, 2, 5), (None, 3, None), (None, None, 6)])
+        parameter_values = [self.RelData('json', 'a_obj1', 'b_obj1', 'parameter1', '[1, 2, 3]'),
+                            self.RelData('json', 'a_obj2', 'b_obj2', 'parameter2', '[4, 5]')]
+        test_data = SheetData('title', 'relationship_name',
+                              self.data_class_rel[0], self.data_parameter,
+                              parameter_values, [], 'relationship')
+        header = read_header_rows(rows)
+        self.assertTrue(validate_header_rows(header))
+        out_data = read_json_rows('title', 'relationship', header, rows)
+        self.assertEqualSheetData(test_data, out_data)
+
+    def test_read_csv_sheet_relationship(self):
+        """Test reading a csv file with relationship parameter, numbers are read as int or float"""
+        temp_filename = str(uuid.uuid4()) + '.csv'
+        write_csv_sheet(temp_filename, [[None], ['relationship', 'parameter', 'relationship_name', 2],
+                                        [None], ['object_class_name1', 'object_class_name2',
+                                                 'parameter1', 'parameter2'],
+                                        ['a_obj1', 'b_obj1', 1, 'a'], ['a_obj2', 'b_obj2', 2.5]])
+        parameter_values = [self.RelData('value', 'a_obj1', 'b_obj1', 'parameter1', 1),
+                            self.RelData('value', 'a_obj1', 'b_obj1', 'parameter2', 'a'),
+                            self.RelData('value', 'a_obj2', 'b_obj2', 'parameter1', 2.5)]
+        test_data = SheetData(temp_filename[:-4], 'relationship_name',
+                              self.data_class_rel[0], self.data_parameter,
+                              parameter_values, self.class_obj_rel, 'relationship')
+        try:
+            sheet_type, sheet_data, out_data, error = read_csv_sheet(temp_filename)
+        finally:
+            os.remove(temp_filename)
+        self.assertEqual((sheet_type, sheet_data, error), ('relationship', 'parameter', None))
+        self.assertEqualSheetData(test_data, out_data)
+
+    def test_write_parquet_sheet_in_chunks(self):
+        """Test that a sheet written in chunks reads back with short rows padded to the header width"""
+        try:
+            import pyarrow
+        except ImportError:
+            self.skipTest("pyarrow not installed")
+        temp_filename = str(uuid.uuid4()) + '.parquet'
+        rows = [['object', 'Parameter', 'unit'], [], ['unit', 'capacity', 'cost']] + \
+               [['u{}'.format(i), i, None] for i in range(5)]
+        try:
+            write_parquet_sheet(temp_filename, iter(rows), chunk_size=2)
+            out_rows = list(read_file_rows(temp_filename))
+        finally:
+            os.remove(temp_filename)
+        self.assertEqual(out_rows[:3], [('object', 'Parameter', 'unit'), (None, None, None),
+                                        ('unit', 'capacity', 'cost')])
+        self.assertEqual(out_rows[3:], [('u{}'.format(i), str(i), None) for i in range(5)])
+
+    def test_cell_value(self):
+        """Test that only numbers written exactly as str() writes them are converted"""
+        self.assertEqual(cell_value('7'), 7)
+        self.assertEqual(cell_value('-2.5'), -2.5)
+        for value in ('007', '1e3', '1.50', 'nan', 'inf', ' 1', 'a'):
+            self.assertEqual(cell_value(value), value)
+        self.assertIsNone(cell_value(None))
+
+    def test_sheet_fingerprints(self):
+        """Test that only the fingerprint of the edited sheet changes"""
+        temp_filename = str(uuid.uuid4()) + '.xlsx'
+        wb = Workbook()
+        wb.active.title = 'sheet1'
+        wb.active.append(['a', 'b', 1])
+        wb.create_sheet('sheet2').append(['c', 'd', 2])
+        wb.save(temp_filename)
+        try:
+            fingerprints = sheet_fingerprints(temp_filename)
+            wb = load_workbook(temp_filename)
+            wb['sheet2'].append(['new string', 3])
+            wb.save(temp_filename)
+            new_fingerprints = sheet_fingerprints(temp_filename)
+        finally:
+            os.remove(temp_filename)
+        self.assertEqual(list(fingerprints), ['sheet1', 'sheet2'])
+        self.assertEqual(fingerprints['sheet1'], new_fingerprints['sheet1'])
+        self.assertNotEqual(fingerprints['sheet2'], new_fingerprints['sheet2'])
+
+    def test_read_json_sheet_uneven_columns(self):
+        """Test reading a sheet with json arrays of different length and an invalid column"""
+        ws = Workbook().active
+        ws.title = 'title'
+        for row in [[None], ['object', 'json array', 'object_class_name'], [None],
+                    ['object_class_name', 'obj1', 'obj2', 'obj3'], ['json parameter', 'parameter1', None, 'parameter2'],
+                    [None, 1, 4, 7], [None, 2, 5], [None, None, 6, 8]]:
+            ws.append(row)
+        parameter_values = [self.ObjData('json', 'obj1', 'parameter1', '[1, 2]'),
+                            self.ObjData('json', 'obj3', 'parameter2', '[7]')]
+        test_data = SheetData('title', 'object_class_name', self.data_class_obj[0],
+                              ['parameter1', 'parameter2'], parameter_values, [], 'object')
+        self.assertEqualSheetData(test_data, read_json_sheet(ws, 'object'))
+        rows = ws.iter_rows(values_only=True)
+        header = read_header_rows(rows)
+        self.assertEqualSheetData(test_data, read_json_rows('title', 'object', header, rows))
+
+    def test_load_json(self):
+        """Test parsing json, also values only the json module accepts"""
+        self.assertEqual(load_json('[1, 2.5, "a"]'), [1, 2.5, 'a'])
+        self.assertTrue(load_json('[NaN]')[0] != load_json('[NaN]')[0])
+        with self.assertRaises(ValueError):
+            load_json('[1, 2')
+
+    def test_pack_unpack_json_parameters(self):
+        """Test packing rows into json arrays and unpacking them back"""
+        data = [['obj2', 'p', 1, 'b'], ['obj1', 'p', 0, 'x'], ['obj2', 'p', 0, 'a'], ['obj1', 'p', 1, 'y']]
+        packed = pack_json_parameters(data, [0, 1], 3, index_col=2)
+        self.assertEqual(packed, [['obj1', 'p', '["x", "y"]'], ['obj2', 'p', '["a", "b"]']])
+        unpacked = unpack_json_parameters(packed, 2)
+        self.assertEqual(unpacked, [['obj1', 'p', 0, 'x'], ['obj1', 'p', 1, 'y'],
+                                    ['obj2', 'p', 0, 'a'], ['obj2', 'p', 1, 'b']])
+
+    def test_validate_header_rows_invalid(self):
+        """Test that header rows from invalid sheets are not valid"""
+        self.assertFalse(validate_header_rows([]))
+        self.assertFalse(validate_header_rows([(None,), ('object', 'parameter', '')]))
+        self.assertFalse(validate_header_rows([(None,), ('relationship', 'parameter', 'rel', 1)]))
+        self.assertFalse(validate_header_rows([(None,), ('relationship', 'json array', 'rel', 2),
+                                               (None,), ('object_class_name1',)]))
+
+    def test_export_object_to_spine_db_skips_existing(self):
+        """Test that only objects that don't exist in the database are inserted"""
+        DbItem = namedtuple('DbItem', ['id', 'name', 'class_id'])
+        db = MagicMock()
+        db.object_class_list.return_value.all.return_value = [DbItem(1, 'object_class_name', None)]
+        db.object_list.return_value.all.return_value = [DbItem(1, 'obj1', 1), DbItem(2, 'obj2', 2)]
+        data = SheetData('title', 'object_class_name', self.data_class_obj[0], [], [],
+                         ['obj1', 'obj2', 'obj3'], 'object')
+        import_log, error_log = export_object_to_spine_db(db, [data])
+        db.add_objects.assert_called_once_with({'name': 'obj2', 'class_id': 1}, {'name': 'obj3', 'class_id': 1})
+        self.assertEqual(import_log, [['object', 'obj2'], ['object', 'obj3']])
+        self.assertEqual(error_log, [])
+
+    def test_batch_update_parameter_values(self):
+        """Test that parameter values are updated in batches and failing items are logged one by one"""
+        db = MagicMock()
+        items = [({'id': i, 'value': i}, 'key{}'.format(i)) for i in range(5)]
+
+        def update_parameter_values(*items):
+            if {'id': 3, 'value': 3} in items:
+                raise SpineDBAPIError("invalid value")
+        db.update_parameter_values.side_effect = update_parameter_values
+        import_log, error_log = batch_update_parameter_values(db, items, 'update', 'error', batch_size=2)
+        self.assertEqual(import_log, [['update', 'key0'], ['update', 'key1'], ['update', 'key2'], ['update', 'key4']])
+        self.assertEqual(error_log, [['error', 'key3', 'invalid value']])
+        # two batches of two, retried batch one by one, and the last batch
+        self.assertEqual(db.update_parameter_values.call_count, 5)
+
     def test_validate_sheet_valid_relationship(self):
         """Test that a valid sheet with relationship as sheet_type will return true"""
         with mock.patch('excel_import_export.read_2d') as mock_read_2d:
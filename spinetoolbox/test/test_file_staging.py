@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for file_staging module.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+from unittest.mock import patch
+
+from file_staging import stage_file, describe_staging, StagingManifest, UNCHANGED
+
+
+class TestFileStaging(unittest.TestCase):
+
+    def setUp(self):
+        """Overridden method. Runs before each test.
+        """
+        self.base_dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.base_dir, "input.gdx")
+        with open(self.src, "w") as f:
+            f.write("data")
+        self.dst = os.path.join(self.base_dir, "work_input.gdx")
+
+    def tearDown(self):
+        """Overridden method. Runs after each test.
+        """
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def test_hardlink(self):
+        """Test that a hard linked file shares the source file"""
+        self.assertEqual(stage_file(self.src, self.dst, "hardlink"), "hardlink")
+        self.assertTrue(os.path.samefile(self.src, self.dst))
+
+    def test_reflink_is_independent_of_source(self):
+        """Test that a cloned file, or a copy where cloning is not supported, doesn't share the source"""
+        self.assertIn(stage_file(self.src, self.dst, "reflink"), ("reflink", "copy"))
+        with open(self.dst, "w") as f:
+            f.write("changed")
+        self.assertEqual(self.read(self.src), "data")
+
+    def test_fallback_to_copy(self):
+        """Test that a file is copied if linking fails"""
+        with patch("file_staging.os.link", side_effect=OSError("Invalid cross-device link")):
+            self.assertEqual(stage_file(self.src, self.dst, "hardlink"), "copy")
+        self.assertFalse(os.path.samefile(self.src, self.dst))
+        self.assertEqual(self.read(self.dst), "data")
+
+    def test_existing_link_is_replaced(self):
+        """Test that staging over an old symlink doesn't write into the file it points to"""
+        other = os.path.join(self.base_dir, "other.gdx")
+        with open(other, "w") as f:
+            f.write("other")
+        try:
+            os.symlink(other, self.dst)
+        except OSError:
+            self.skipTest("symlinks not supported")
+        self.assertEqual(stage_file(self.src, self.dst, "copy"), "copy")
+        self.assertFalse(os.path.islink(self.dst))
+        self.assertEqual(self.read(other), "other")
+        self.assertEqual(self.read(self.dst), "data")
+
+    def test_incremental_sync(self):
+        """Test that only changed files are staged again into a persistent work directory and stale files are removed"""
+        work_dir = os.path.join(self.base_dir, "work")
+        os.makedirs(work_dir)
+        other = os.path.join(self.base_dir, "other.gdx")
+        with open(other, "w") as f:
+            f.write("other")
+        manifest = StagingManifest(work_dir, persistent=True)
+        self.assertEqual(manifest.stage(self.src, os.path.join(work_dir, "a.gdx"), "copy"), "copy")
+        self.assertEqual(manifest.stage(other, os.path.join(work_dir, "b.gdx"), "copy"), "copy")
+        manifest.save()
+        manifest = StagingManifest(work_dir, persistent=True)
+        self.assertEqual(manifest.stage(self.src, os.path.join(work_dir, "a.gdx"), "copy"), UNCHANGED)
+        self.assertEqual(manifest.stage(self.src, os.path.join(work_dir, "a.gdx"), "hardlink"), "hardlink")
+        self.assertEqual(manifest.remove_stale(), 1)
+        self.assertFalse(os.path.exists(os.path.join(work_dir, "b.gdx")))
+        manifest.save()
+        manifest = StagingManifest(work_dir, persistent=True)
+        self.assertEqual(manifest.stage(self.src, os.path.join(work_dir, "a.gdx"), "hardlink"), UNCHANGED)
+        os.remove(self.src)
+        with open(self.src, "w") as f:
+            f.write("new data")
+        self.assertEqual(manifest.stage(self.src, os.path.join(work_dir, "a.gdx"), "hardlink"), "hardlink")
+        self.assertEqual(self.read(os.path.join(work_dir, "a.gdx")), "new data")
+
+    def test_describe_staging(self):
+        """Test that staging counts are described in a fixed order"""
+        self.assertEqual(describe_staging(Counter({"copy": 1, "hardlink": 3})), "1 copied, 3 hard linked")
+        self.assertEqual(describe_staging(Counter({UNCHANGED: 2, "reflink": 1})), "1 cloned, 2 up to date")
+
+
+if __name__ == '__main__':
+    unittest.main()
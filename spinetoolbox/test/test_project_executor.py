@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for project_executor module.
+"""
+
+import unittest
+from unittest.mock import MagicMock
+
+from project_executor import ProjectExecutor, input_item_graph, topological_sort
+
+
+class TestProjectExecutor(unittest.TestCase):
+
+    def setUp(self):
+        """Overridden method. Runs before each test.
+        Makes a project where tools a and b write into data connection dc, read by tool c.
+        Tool d doesn't depend on the others.
+        """
+        self.names = ['a', 'b', 'dc', 'c', 'd']
+        self.links = [('a', 'dc'), ('b', 'dc'), ('dc', 'c')]
+        self.items = dict()
+        self.started = list()
+        for name in self.names:
+            item = MagicMock()
+            item.name = name
+            item.item_type = "Data Connection" if name == 'dc' else "Tool"
+            item.tool_template.return_value.tooltype = "gams"
+            item.execute.side_effect = lambda name=name: self.started.append(name) or True
+            self.items[name] = item
+        self.toolbox = MagicMock()
+        self.toolbox.connection_model.header = self.names
+        self.toolbox.connection_model.get_connections.return_value = [
+            [(row, column) in self.links for column in self.names] for row in self.names]
+        self.toolbox.project_item_model.find_item.side_effect = lambda name: name
+        self.toolbox.project_item_model.project_item.side_effect = lambda name: self.items[name]
+        self.toolbox._config.getboolean.return_value = False
+
+    def test_topological_sort(self):
+        """Test that items come after their input items and cycles are detected"""
+        graph = input_item_graph(self.toolbox.connection_model)
+        self.assertEqual(graph, {'a': [], 'b': [], 'dc': ['a', 'b'], 'c': ['dc'], 'd': []})
+        self.assertEqual(topological_sort(graph), ['a', 'b', 'd', 'dc', 'c'])
+        graph['a'] = ['c']
+        with self.assertRaises(ValueError):
+            topological_sort(graph)
+
+    def test_tools_start_when_inputs_are_finished(self):
+        """Test that independent tools run up to the worker limit and downstream tools wait for inputs"""
+        executor = ProjectExecutor(self.toolbox, max_workers=2)
+        finished = MagicMock()
+        executor.project_execution_finished.connect(finished)
+        self.assertTrue(executor.start())
+        self.assertEqual(self.started, ['a', 'b'])
+        executor.tool_finished('a', 0)
+        self.assertEqual(self.started, ['a', 'b', 'd'])
+        executor.tool_finished('b', 0)
+        self.assertEqual(self.started, ['a', 'b', 'd', 'c'])
+        executor.tool_finished('d', 0)
+        executor.tool_finished('c', 0)
+        finished.assert_called_once_with(True)
+
+    def test_failed_tool_skips_downstream_items(self):
+        """Test that items downstream of a failed tool are skipped and the rest are executed"""
+        executor = ProjectExecutor(self.toolbox, max_workers=1)
+        finished = MagicMock()
+        executor.project_execution_finished.connect(finished)
+        executor.start()
+        executor.tool_finished('a', 1)
+        executor.tool_finished('b', 0)
+        executor.tool_finished('d', 0)
+        self.assertEqual(self.started, ['a', 'b', 'd'])
+        finished.assert_called_once_with(False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for result_archive module.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from result_archive import archive_file, compress_dir, superseded_result_dirs, remove_partial_archives, \
+    ResultCompressionWorker
+
+
+class TestResultArchive(unittest.TestCase):
+
+    def setUp(self):
+        """Overridden method. Runs before each test.
+        """
+        self.base_dir = tempfile.mkdtemp()
+        self.work_dir = os.path.join(self.base_dir, "work")
+        self.output_dir = os.path.join(self.base_dir, "output")
+        os.makedirs(self.work_dir)
+        os.makedirs(self.output_dir)
+
+    def tearDown(self):
+        """Overridden method. Runs after each test.
+        """
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def write(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_archive_file(self):
+        """Test that output files are copied, moved or hard linked into the results directory"""
+        for mode in ("copy", "move", "hardlink"):
+            src = self.write(os.path.join(self.work_dir, mode + ".csv"), mode)
+            dst = archive_file(src, self.output_dir, mode)
+            with open(dst) as f:
+                self.assertEqual(f.read(), mode)
+            self.assertEqual(os.path.exists(src), mode != "move")
+            if mode == "hardlink":
+                self.assertTrue(os.path.samefile(src, dst))
+
+    def test_compress_superseded_result_dirs(self):
+        """Test that results directories other than the latest and referenced ones are compressed"""
+        old = os.path.join(self.output_dir, "2018-10-01T10.00.00")
+        referenced = os.path.join(self.output_dir, "2018-10-02T10.00.00")
+        latest = os.path.join(self.output_dir, "2018-10-03T10.00.00")
+        failed = os.path.join(self.output_dir, "failed", "2018-10-02T11.00.00")
+        for path in (old, referenced, latest, failed):
+            self.write(os.path.join(path, "out.csv"), "1,2")
+        dirs = superseded_result_dirs(self.output_dir, latest, [os.path.join(referenced, "out.csv")])
+        self.assertEqual(dirs, [old, failed])
+        zip_path = compress_dir(old)
+        self.assertFalse(os.path.exists(old))
+        with zipfile.ZipFile(zip_path) as archive:
+            self.assertEqual(archive.read("out.csv"), b"1,2")
+        self.assertEqual(superseded_result_dirs(self.output_dir, latest, [os.path.join(referenced, "out.csv")]),
+                         [failed])
+
+
+    def test_stop_compression(self):
+        """Test that stopped compression leaves the directory intact and no partial zip file behind"""
+        old = os.path.join(self.output_dir, "2018-10-01T10.00.00")
+        self.write(os.path.join(old, "out.csv"), "1,2")
+        worker = ResultCompressionWorker([old])
+        worker.stop()
+        self.assertIsNone(compress_dir(old, worker.stop_requested))
+        self.assertEqual(os.listdir(self.output_dir), ["2018-10-01T10.00.00"])
+        self.assertTrue(os.path.exists(os.path.join(old, "out.csv")))
+
+    def test_remove_partial_archives(self):
+        """Test that temporary zip files of interrupted compressions are removed"""
+        self.write(os.path.join(self.output_dir, "2018-10-01T10.00.00.zip.tmp"), "")
+        self.write(os.path.join(self.output_dir, "failed", "2018-10-02T10.00.00.zip.tmp"), "")
+        self.write(os.path.join(self.output_dir, "2018-10-03T10.00.00.zip"), "")
+        self.assertEqual(remove_partial_archives(self.output_dir), 2)
+        self.assertEqual(sorted(os.listdir(self.output_dir)), ["2018-10-03T10.00.00.zip", "failed"])
+
+if __name__ == '__main__':
+    unittest.main()
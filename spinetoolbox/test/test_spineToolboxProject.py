@@ -20,6 +20,9 @@ import unittest
 from unittest import mock
 import logging
 import sys
+import threading
+import time
+from PySide2.QtWidgets import QApplication
 from ui_main import ToolboxUI
 
 
@@ -171,6 +174,30 @@ class TestSpineToolboxProject(unittest.TestCase):
         # # There should now be 4 items in the model
         # self.assertEqual(self.mw.project_item_model.n_items("all"), 4)
 
+    def test_remove_data_connection_during_datapackage_inference(self):
+        """Test that removing a Data Connection stops its datapackage inference thread
+        and that the inferred datapackage is not saved."""
+        dc_name = self.add_dc()
+        dc = self.toolbox.project_item_model.project_item(self.toolbox.project_item_model.find_item(dc_name))
+        started = threading.Event()
+
+        def infer_until_cancelled(base_path, sample_size, progress, cancelled):
+            started.set()
+            while not cancelled():
+                time.sleep(0.01)
+            return None
+
+        with mock.patch("data_connection.infer_datapackage_descriptor", side_effect=infer_until_cancelled), \
+                mock.patch.object(dc, "save_datapackage") as mock_save_datapackage:
+            dc.infer_datapackage()
+            self.assertTrue(started.wait(5))
+            thread = dc.inference_thread
+            self.toolbox.remove_item(self.toolbox.project_item_model.find_item(dc_name))
+            self.assertIsNone(dc.inference_thread)
+            self.assertTrue(thread.isFinished())
+            QApplication.processEvents()
+            mock_save_datapackage.assert_not_called()
+
     # def test_add_item_to_model_in_random_order(self):
     #     """Add items to model in order DC->View->Tool->DS and check that it still works."""
     #     self.fail()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for tool_cache module.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from tool_cache import ToolResultCache, cache_key
+from tool_instance import ToolInstance
+
+
+class TestToolCache(unittest.TestCase):
+
+    def setUp(self):
+        """Overridden method. Runs before each test.
+        """
+        self.base_dir = tempfile.mkdtemp()
+        self.template = MagicMock()
+        self.template.tooltype = "julia"
+        self.template.main_prgm = "main.jl"
+        self.template.path = os.path.join(self.base_dir, "template")
+        self.template.includes = ["main.jl"]
+        self.template.outputfiles = {"out.csv"}
+        os.makedirs(self.template.path)
+        self.main_file = self.write(os.path.join(self.template.path, "main.jl"), "println(1)")
+        self.input_file = self.write(os.path.join(self.base_dir, "in.csv"), "a,b")
+        self.cache = ToolResultCache(os.path.join(self.base_dir, "cache"), 1024)
+
+    def tearDown(self):
+        """Overridden method. Runs after each test.
+        """
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def write(self, path, content):
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_cache_key(self):
+        """Test that the key depends on sources, input files and arguments"""
+        key = cache_key(self.template, {"in.csv": self.input_file}, "")
+        self.assertEqual(key, cache_key(self.template, {"in.csv": self.input_file}, ""))
+        self.assertNotEqual(key, cache_key(self.template, {"in.csv": self.input_file}, "-x"))
+        self.assertNotEqual(key, cache_key(self.template, {"data/in.csv": self.input_file}, ""))
+        self.write(self.input_file, "a,c")
+        input_key = cache_key(self.template, {"in.csv": self.input_file}, "")
+        self.assertNotEqual(key, input_key)
+        self.write(self.main_file, "println(2)")
+        self.assertNotEqual(input_key, cache_key(self.template, {"in.csv": self.input_file}, ""))
+
+    def test_store_lookup_and_restore(self):
+        """Test that stored files are restored as separate files and a modified entry is discarded"""
+        output_file = self.write(os.path.join(self.base_dir, "out.csv"), "1,2")
+        self.assertIsNone(self.cache.lookup("key"))
+        self.assertTrue(self.cache.store("key", [output_file]))
+        cached_files = self.cache.lookup("key")
+        self.assertEqual([os.path.basename(f) for f in cached_files], ["out.csv"])
+        result_dir = os.path.join(self.base_dir, "results")
+        os.makedirs(result_dir)
+        restored = self.cache.restore(cached_files, result_dir)
+        with open(restored[0]) as f:
+            self.assertEqual(f.read(), "1,2")
+        # Writing into restored or archived files doesn't change the cache or earlier results
+        self.assertFalse(os.path.samefile(restored[0], cached_files[0]))
+        self.assertFalse(os.path.samefile(output_file, cached_files[0]))
+        self.write(restored[0], "3,4")
+        self.write(output_file, "5,6")
+        with open(self.cache.lookup("key")[0]) as f:
+            self.assertEqual(f.read(), "1,2")
+        time.sleep(0.01)
+        self.write(cached_files[0], "7,8")
+        self.assertIsNone(self.cache.lookup("key"))
+        self.assertFalse(os.path.exists(self.cache.entry_dir("key")))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """Test that the oldest entries are removed when the cache grows over its size limit"""
+        for i in range(3):
+            output_file = self.write(os.path.join(self.base_dir, "out{}.csv".format(i)), "x" * 250)
+            self.cache.store("key{}".format(i), [output_file])
+            os.utime(os.path.join(self.cache.entry_dir("key{}".format(i)), "manifest.json"), (i, i))
+        self.assertIsNotNone(self.cache.lookup("key0"))
+        output_file = self.write(os.path.join(self.base_dir, "out3.csv"), "x" * 250)
+        self.cache.store("key3", [output_file])
+        self.assertIsNotNone(self.cache.lookup("key0"))
+        self.assertIsNone(self.cache.lookup("key1"))
+        self.assertIsNotNone(self.cache.lookup("key2"))
+        self.assertIsNotNone(self.cache.lookup("key3"))
+
+    def test_cache_hit_leaves_no_work_directory(self):
+        """Test that a Tool instance restoring its output files from the cache removes its work directory"""
+        output_file = self.write(os.path.join(self.base_dir, "out.csv"), "1,2")
+        self.cache.store("key", [output_file])
+        self.template.short_name = "tool"
+        self.template.inputfiles = set()
+        self.template.inputfiles_opt = set()
+        project = MagicMock()
+        project.work_dir = os.path.join(self.base_dir, "work")
+        os.makedirs(project.work_dir)
+        tool_output_dir = os.path.join(self.base_dir, "output")
+        instance = ToolInstance(self.template, MagicMock(), tool_output_dir, project, cache=self.cache,
+                                cache_key="key")
+        self.assertFalse(os.path.exists(instance.basedir))
+        instance.execute()
+        self.assertEqual(os.listdir(project.work_dir), [])
+        with open(os.path.join(instance.output_dir, "out.csv")) as f:
+            self.assertEqual(f.read(), "1,2")
+
+
+if __name__ == '__main__':
+    unittest.main()
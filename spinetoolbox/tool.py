@@ -18,14 +18,17 @@ Tool class.
 
 import logging
 import os
-import shutil
 import getpass
+from collections import Counter
 from project_item import ProjectItem
-from PySide2.QtCore import Slot, Qt, QUrl, QFileInfo
+from PySide2.QtCore import Signal, Slot, Qt, QUrl, QFileInfo, QThread
 from PySide2.QtGui import QDesktopServices, QStandardItemModel, QStandardItem
 from PySide2.QtWidgets import QStyle, QFileIconProvider
 from tool_instance import ToolInstance
-from config import TOOL_OUTPUT_DIR, GAMS_EXECUTABLE, JULIA_EXECUTABLE, HEADER_POINTSIZE
+from tool_cache import ToolResultCache, cache_key
+from file_staging import describe_staging
+from result_archive import ResultCompressionWorker, superseded_result_dirs, remove_partial_archives
+from config import TOOL_OUTPUT_DIR, TOOL_CACHE_DIR, GAMS_EXECUTABLE, JULIA_EXECUTABLE, HEADER_POINTSIZE
 from graphics_items import ToolImage
 from widgets.custom_menus import ToolTemplateOptionsPopupMenu
 from helpers import create_dir
@@ -42,6 +45,8 @@ class Tool(ProjectItem):
         x (int): Initial X coordinate of item icon
         y (int): Initial Y coordinate of item icon
     """
+    execution_finished_signal = Signal(int, name="execution_finished_signal")
+
     def __init__(self, toolbox, name, description, tool_template, x, y):
         """Class constructor."""
         super().__init__(name, description)
@@ -52,11 +57,16 @@ class Tool(ProjectItem):
         self.populate_input_files_list(None)
         self.output_file_model = QStandardItemModel()
         self.populate_output_files_list(None)
+        self.force_rerun = False  # If True, Tool is executed even if its results are in the Tool result cache
         self._tool_template = None
         self._tool_template_index = None
         self.set_tool_template(tool_template)
         self.tool_template_options_popup_menu = None
         self.instance = None  # Instance of this Tool that can be sent to a subprocess for processing
+        self.executing = False  # True from the start of the instance until execution is finished
+        self._active = False  # True while this Tool is shown in the shared Tool properties widgets
+        self.compression_thread = None
+        self.compression_worker = None
         self.extra_cmdline_args = ''  # This may be used for additional Tool specific command line arguments
         # Make project directory for this Tool
         self.data_dir = os.path.join(self._project.project_dir, self.short_name)
@@ -82,11 +92,14 @@ class Tool(ProjectItem):
 
     def activate(self):
         """Restore selections and connect signals."""
+        self._active = True
         self.restore_selections()
+        self.update_execute_buttons()
         super().connect_signals()
 
     def deactivate(self):
         """Save selections and disconnect signals."""
+        self._active = False
         self.save_selections()
         if not super().disconnect_signals():
             logging.error("Item {0} deactivation failed".format(self.name))
@@ -193,14 +206,32 @@ class Tool(ProjectItem):
         """Returns Tool template."""
         return self._tool_template
 
+    def update_execute_buttons(self):
+        """Enables the shared Execute and Stop buttons according to the state of this Tool if it's shown.
+        A Tool can't be executed by itself while it's being executed or while the project is being executed."""
+        if not self._active:
+            return
+        executor = self._toolbox.project_executor
+        project_executing = executor is not None and executor.is_running()
+        self._toolbox.ui.pushButton_tool_execute.setEnabled(not self.executing and not project_executing)
+        self._toolbox.ui.pushButton_tool_stop.setEnabled(self.executing)
+
     @Slot(bool, name="execute")
     def execute(self, checked=False):
-        """Execute button clicked."""
+        """Execute button clicked. Also called when the project is executed.
+
+        Returns:
+            (bool) True if the Tool instance was started, False if execution was aborted before that
+        """
+        if self.executing:
+            # Starting another instance would replace the running one
+            self._toolbox.msg_warning.emit("Tool <b>{0}</b> is already being executed".format(self.name))
+            return False
         self._toolbox.ui.textBrowser_eventlog.verticalScrollBar().setValue(
                 self._toolbox.ui.textBrowser_eventlog.verticalScrollBar().maximum())
         if not self.tool_template():
             self._toolbox.msg_warning.emit("No Tool template attached to Tool <b>{0}</b>".format(self.name))
-            return
+            return False
         self._toolbox.msg.emit("")
         self._toolbox.msg.emit("----------------------------")
         self._toolbox.msg.emit("Executing Tool <b>{0}</b>".format(self.name))
@@ -213,7 +244,7 @@ class Tool(ProjectItem):
             inputs = self._toolbox.connection_model.input_items(self.name)
             if not inputs:
                 self._toolbox.msg_error.emit("This Tool has no input connections. Cannot find required input files.")
-                return
+                return False
             n_dirs, n_files = self.count_files_and_dirs()
             # logging.debug("Tool requires {0} dirs and {1} files".format(n_dirs, n_files))
             if n_files > 0:
@@ -221,44 +252,84 @@ class Tool(ProjectItem):
                 file_copy_paths = self.find_input_files()
                 if not file_copy_paths:
                     self._toolbox.msg_error.emit("Input files not found. Tool execution aborted.")
-                    return
+                    return False
                 # Required files and dirs should have been found at this point, so create instance
                 try:
-                    self.instance = ToolInstance(self.tool_template(), self._toolbox, self.output_dir, self._project)
+                    self.instance = self.create_instance(file_copy_paths)
                 except OSError as e:
                     self._toolbox.msg_error.emit("Tool instance creation failed. {0}".format(e))
-                    return
-                self._toolbox.msg.emit("*** Copying input files to work directory ***")
-                # Copy input files to ToolInstance work directory
-                if not self.copy_input_files(file_copy_paths):
-                    self._toolbox.msg_error.emit("Unable to copy input files to work directory. "
-                                                 "Tool execution aborted.")
-                    return
+                    return False
+                # Output files of a cached execution are restored without preparing the work directory
+                if self.instance.cached_files is None:
+                    self._toolbox.msg.emit("*** Copying input files to work directory ***")
+                    # Copy input files to ToolInstance work directory
+                    if not self.copy_input_files(file_copy_paths):
+                        self._toolbox.msg_error.emit("Unable to copy input files to work directory. "
+                                                     "Tool execution aborted.")
+                        return False
             else:  # just for testing
                 # logging.debug("No input files to copy")
                 pass
-            if n_dirs > 0:
+            if n_dirs > 0 and self.instance.cached_files is None:
                 self._toolbox.msg.emit("*** Creating subdirectories to work directory ***")
                 if not self.create_dirs_to_work():
                     # Creating directories failed -> abort
                     self._toolbox.msg_error.emit("Creating directories to work failed. Tool execution aborted")
-                    return
+                    return False
             else:  # just for testing
                 # logging.debug("No directories to create")
                 pass
         else:  # Tool template does not have requirements
             try:
-                self.instance = ToolInstance(self.tool_template(), self._toolbox, self.output_dir, self._project)
+                self.instance = self.create_instance(dict())
             except OSError as e:
                 self._toolbox.msg_error.emit("Tool instance creation failed. {0}".format(e))
-                return
+                return False
 
-        self._toolbox.ui.pushButton_tool_stop.setEnabled(True)
-        self._toolbox.ui.pushButton_tool_execute.setEnabled(False)
+        self.executing = True
+        self.update_execute_buttons()
         self._graphics_item.start_wheel_animation()
         self.update_instance()  # Make command and stuff
         self.instance.instance_finished_signal.connect(self.execution_finished)
         self.instance.execute()
+        return True
+
+    def create_instance(self, input_files):
+        """Creates an instance of this Tool. The instance finds the output files of
+        an identical execution from the Tool result cache unless a re-run is forced.
+        If persistent work directories are enabled in settings, the instance reuses
+        the work directory of this Tool.
+
+        Args:
+            input_files (dict): paths to input files keyed by their paths in the work directory
+
+        Returns:
+            ToolInstance
+
+        Raises:
+            OSError: if reading input files or creating the work directory fails
+        """
+        persistent_dir = None
+        if self._toolbox._config.getboolean("settings", "persistent_work_dirs"):
+            persistent_dir = os.path.join(self._project.work_dir,
+                                          self._project.short_name + "__" + self.short_name + "__toolbox")
+        try:
+            max_size = int(self._toolbox._config.get("settings", "tool_cache_size")) * 1024 * 1024
+        except ValueError:
+            max_size = 0
+        if max_size <= 0:
+            return ToolInstance(self.tool_template(), self._toolbox, self.output_dir, self._project,
+                                persistent_dir=persistent_dir)
+        cache = ToolResultCache(os.path.join(self._project.project_dir, TOOL_CACHE_DIR), max_size)
+        cmdline_args = " ".join([self.tool_template().cmdline_args or "", self.extra_cmdline_args])
+        key = cache_key(self.tool_template(), input_files, cmdline_args)
+        return ToolInstance(self.tool_template(), self._toolbox, self.output_dir, self._project,
+                            cache=cache, cache_key=key, force_rerun=self.force_rerun, persistent_dir=persistent_dir)
+
+    @Slot(bool, name="set_force_rerun")
+    def set_force_rerun(self, checked):
+        """Sets whether the Tool is executed even if its results are in the Tool result cache."""
+        self.force_rerun = checked
 
     def count_files_and_dirs(self):
         """Count the number of files and directories in required input files model.
@@ -367,6 +438,8 @@ class Tool(ProjectItem):
 
     def copy_input_files(self, paths):
         """Copy files from given paths to the directories in work directory, where the Tool requires them to be.
+        Files are staged using the staging strategy in settings, e.g. hard linked instead of copied,
+        and files that are up to date in a persistent work directory are skipped.
 
         Args:
             paths (dict): Key is path to destination file, value is path to source file.
@@ -374,7 +447,7 @@ class Tool(ProjectItem):
         Returns:
             Boolean variable depending on operation success
         """
-        n_copied_files = 0
+        staged_files = Counter()
         for dst, src_path in paths.items():
             if not os.path.exists(src_path):
                 self._toolbox.msg_error.emit("\tFile <b>{0}</b> does not exist".format(src_path))
@@ -399,14 +472,14 @@ class Tool(ProjectItem):
                     self._toolbox.msg.emit("\tCopying <b>{0}</b> -> work subdirectory <b>{1}</b>"
                                            .format(fname, dst_subdir))
             try:
-                shutil.copyfile(src_path, dst_path)
-                n_copied_files += 1
+                staged_files[self.instance.stage_file(src_path, dst_path)] += 1
             except OSError as e:
                 logging.error(e)
                 self._toolbox.msg_error.emit("\t[OSError] Copying file <b>{0}</b> to <b>{1}</b> failed"
                                              .format(src_path, dst_path))
                 return False
-        self._toolbox.msg.emit("\tCopied <b>{0}</b> input file(s)".format(n_copied_files))
+        self._toolbox.msg.emit("\tStaged <b>{0}</b> input file(s), {1}"
+                               .format(sum(staged_files.values()), describe_staging(staged_files)))
         return True
 
     def find_output_items(self):
@@ -466,8 +539,8 @@ class Tool(ProjectItem):
     @Slot(int, name="execution_finished")
     def execution_finished(self, return_code):
         """Tool execution finished."""
-        self._toolbox.ui.pushButton_tool_stop.setEnabled(False)
-        self._toolbox.ui.pushButton_tool_execute.setEnabled(True)
+        self.executing = False
+        self.update_execute_buttons()
         self._graphics_item.stop_wheel_animation()
         # Disconnect instance finished signal
         self.instance.instance_finished_signal.disconnect(self.execution_finished)
@@ -480,6 +553,77 @@ class Tool(ProjectItem):
             self._toolbox.msg_success.emit("Tool <b>{0}</b> execution finished".format(self.name))
         else:
             self._toolbox.msg_error.emit("Tool <b>{0}</b> execution failed".format(self.name))
+        if self._toolbox._config.getboolean("settings", "compress_results"):
+            self.compress_previous_results()
+        self.execution_finished_signal.emit(return_code)
+
+    def referenced_paths(self):
+        """Returns paths to files that Data Connections and Data Stores of the project refer to."""
+        paths = list()
+        for item in self._toolbox.project_item_model.items("Data Connections"):
+            paths += item.references
+        for item in self._toolbox.project_item_model.items("Data Stores"):
+            reference = item.reference()
+            if reference and reference.get("url", "").startswith("sqlite:///"):
+                paths.append(reference["url"][len("sqlite:///"):])
+        return paths
+
+    def compress_previous_results(self):
+        """Compresses results directories of earlier executions of this Tool in a thread.
+        Results of the latest execution and results that project items refer to are left as they are."""
+        if self.compression_thread:
+            return
+        remove_partial_archives(self.output_dir)
+        latest_dir = self.instance.output_dir if self.instance else None
+        paths = superseded_result_dirs(self.output_dir, latest_dir, self.referenced_paths())
+        if not paths:
+            return
+        self._toolbox.msg.emit("\tCompressing earlier results of Tool <b>{0}</b> ({1} directories)"
+                               .format(self.name, len(paths)))
+        self.compression_thread = QThread()
+        self.compression_worker = ResultCompressionWorker(paths)
+        self.compression_worker.moveToThread(self.compression_thread)
+        self.compression_thread.started.connect(self.compression_worker.run)
+        self.compression_worker.compressed.connect(self.results_compressed)
+        self.compression_worker.failed.connect(self.results_compression_failed)
+        self.compression_thread.start()
+
+    @Slot(int, name="results_compressed")
+    def results_compressed(self, n_compressed):
+        """Stop compression thread when results directories have been compressed."""
+        if not self.compression_thread:
+            return
+        self._toolbox.msg.emit("Compressed earlier results of Tool <b>{0}</b> ({1} directories)"
+                               .format(self.name, n_compressed))
+        self.end_compression()
+
+    def stop_compression(self):
+        """Stops compressing results and waits until the compression thread has finished.
+        The directory being compressed is left uncompressed."""
+        if not self.compression_thread:
+            return
+        self.compression_worker.compressed.disconnect(self.results_compressed)
+        self.compression_worker.failed.disconnect(self.results_compression_failed)
+        self.compression_worker.stop()
+        self.end_compression()
+
+    def end_compression(self):
+        """Quits the compression thread, waits for it to finish and deletes it."""
+        self.compression_thread.quit()
+        self.compression_thread.wait()
+        self.compression_worker.deleteLater()
+        self.compression_thread.deleteLater()
+        self.compression_worker = None
+        self.compression_thread = None
+
+    def tear_down(self):
+        """Stops compressing results before this Tool is removed or the application is closed."""
+        self.stop_compression()
+
+    @Slot(str, name="results_compression_failed")
+    def results_compression_failed(self, msg):
+        """Show error message about a results directory that couldn't be compressed."""
+        self._toolbox.msg_error.emit(msg)
 
     def update_instance(self):
         """Initialize and update instance so that it is ready for processing. Maybe this is where Tool
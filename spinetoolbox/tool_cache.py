@@ -0,0 +1,223 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Cache of Tool output files keyed by the contents of everything a Tool execution depends on.
+Cached files are clones of the archived output files where the file system supports it, copies otherwise.
+They are never hard links, so results directories never share files with the cache or with each other.
+
+:author: P. Savolainen (VTT)
+:date:   18.10.2026
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from file_staging import stage_file
+
+MANIFEST_FILENAME = "manifest.json"
+
+# Content digests of files keyed by path, valid as long as the size and modification time match
+_file_digests = dict()
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """Returns the sha256 digest of the contents of a file. Digests are remembered and
+    computed again only if the size or modification time of the file changes.
+
+    Args:
+        path (str): path to file
+
+    Returns:
+        (str) hexadecimal digest
+    """
+    stat = os.stat(path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    cached = _file_digests.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+    _file_digests[path] = (key, digest)
+    return digest
+
+
+def cache_key(tool_template, input_files, cmdline_args):
+    """Returns a key identifying a Tool execution by its tool type, source files, input files,
+    command line arguments and expected output files.
+
+    Args:
+        tool_template (ToolTemplate): template of the executed Tool
+        input_files (dict): paths to input files keyed by their paths in the work directory,
+            as given by Tool.find_input_files
+        cmdline_args (str): command line arguments of the execution
+
+    Returns:
+        (str) hexadecimal key
+    """
+    sha = hashlib.sha256()
+
+    def update(*values):
+        for value in values:
+            sha.update(str(value).encode("utf-8"))
+            sha.update(b"\0")
+
+    update(tool_template.tooltype, tool_template.main_prgm, cmdline_args)
+    for pattern in sorted(tool_template.includes):
+        dirname, file_pattern = os.path.split(pattern)
+        update("include", pattern)
+        if not file_pattern:
+            continue
+        for src_file in sorted(glob.glob(os.path.join(tool_template.path, dirname, file_pattern))):
+            update(os.path.relpath(src_file, tool_template.path), file_digest(src_file))
+    for dst in sorted(input_files):
+        update("input", dst, file_digest(input_files[dst]))
+    for output_file in sorted(tool_template.outputfiles):
+        update("output", output_file)
+    return sha.hexdigest()
+
+
+class ToolResultCache:
+    """Output files of Tool executions, one directory per cache key. The least recently used
+    entries are removed when the total size of the cache exceeds the limit.
+
+    Attributes:
+        path (str): cache directory
+        max_size (int): maximum total size of cached files in bytes
+    """
+    def __init__(self, path, max_size):
+        """Class constructor."""
+        self.path = path
+        self.max_size = max_size
+
+    def entry_dir(self, key):
+        """Returns the directory of a cache entry."""
+        return os.path.join(self.path, key)
+
+    def lookup(self, key):
+        """Returns the cached output files for a key and marks the entry as recently used.
+        An entry whose files have changed since they were cached is removed.
+
+        Args:
+            key (str): cache key as given by cache_key
+
+        Returns:
+            (list) paths to cached files, None if there's no valid entry
+        """
+        entry_dir = self.entry_dir(key)
+        manifest_path = os.path.join(entry_dir, MANIFEST_FILENAME)
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            paths = list()
+            for filename, (size, mtime) in manifest.items():
+                path = os.path.join(entry_dir, filename)
+                stat = os.stat(path)
+                if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                    raise ValueError("Cached file {0} has changed".format(path))
+                paths.append(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            logging.debug("Discarding tool cache entry {0}: {1}".format(key, e))
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+        os.utime(manifest_path)
+        return paths
+
+    def store(self, key, files):
+        """Stores output files for a key, replacing an existing entry.
+        Files are written into a temporary directory first, so a partially written
+        entry is never found by lookup.
+
+        Args:
+            key (str): cache key as given by cache_key
+            files (list): paths to output files, stored by their base names
+
+        Returns:
+            (bool) True if the files were stored, False otherwise
+        """
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            temp_dir = tempfile.mkdtemp(prefix=key + "__", dir=self.path)
+        except OSError as e:
+            logging.error("Creating tool cache entry failed: {0}".format(e))
+            return False
+        try:
+            manifest = dict()
+            for src in files:
+                filename = os.path.basename(src)
+                dst = os.path.join(temp_dir, filename)
+                stage_file(src, dst, "reflink")
+                stat = os.stat(dst)
+                manifest[filename] = [stat.st_size, stat.st_mtime_ns]
+            with open(os.path.join(temp_dir, MANIFEST_FILENAME), "w") as f:
+                json.dump(manifest, f)
+            entry_dir = self.entry_dir(key)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.rename(temp_dir, entry_dir)
+        except OSError as e:
+            logging.error("Storing tool cache entry failed: {0}".format(e))
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            return False
+        self.evict()
+        return True
+
+    def restore(self, files, target_dir):
+        """Clones cached files into a directory, copies them if cloning is not supported.
+
+        Args:
+            files (list): paths to cached files as given by lookup
+            target_dir (str): destination directory
+
+        Returns:
+            (list) paths to restored files
+        """
+        restored = list()
+        for src in files:
+            dst = os.path.join(target_dir, os.path.basename(src))
+            stage_file(src, dst, "reflink")
+            restored.append(dst)
+        return restored
+
+    def evict(self):
+        """Removes least recently used entries until the total size of the cache is within the limit.
+
+        Returns:
+            (int) number of removed entries
+        """
+        entries = list()
+        total_size = 0
+        for key in os.listdir(self.path):
+            entry_dir = self.entry_dir(key)
+            manifest_path = os.path.join(entry_dir, MANIFEST_FILENAME)
+            try:
+                last_used = os.stat(manifest_path).st_mtime
+                size = sum(os.stat(os.path.join(entry_dir, name)).st_size for name in os.listdir(entry_dir))
+            except OSError:
+                continue
+            entries.append((last_used, size, entry_dir))
+            total_size += size
+        n_removed = 0
+        for last_used, size, entry_dir in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_size -= size
+            n_removed += 1
+        return n_removed
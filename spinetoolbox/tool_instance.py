@@ -21,9 +21,12 @@ import shutil
 import glob
 import logging
 import tempfile
+from collections import Counter
 from PySide2.QtCore import QObject, Signal, Slot
 import qsubprocess
 from helpers import create_output_dir_timestamp, create_dir
+from file_staging import StagingManifest, staging_strategy, describe_staging
+from result_archive import archive_file, archiving_mode
 
 
 class ToolInstance(QObject):
@@ -34,10 +37,16 @@ class ToolInstance(QObject):
         toolbox (ToolboxUI): QMainWindow instance
         tool_output_dir (str): Directory where results are saved
         project (SpineToolboxProject): Current project
+        cache (ToolResultCache): Cache of output files, None to disable caching
+        cache_key (str): Key of this execution in the cache
+        force_rerun (bool): If True, the Tool is executed even if its output files are in the cache
+        persistent_dir (str): Work directory reused by every execution of the Tool, None for a new
+            temporary work directory
     """
     instance_finished_signal = Signal(int, name="instance_finished_signal")
 
-    def __init__(self, tool_template, toolbox, tool_output_dir, project):
+    def __init__(self, tool_template, toolbox, tool_output_dir, project, cache=None, cache_key=None,
+                 force_rerun=False, persistent_dir=None):
         """Tool instance constructor."""
         super().__init__()
         self.tool_template = tool_template
@@ -48,13 +57,36 @@ class ToolInstance(QObject):
         # Directory where results were saved
         self.output_dir = None
         wrk_dir = self._project.work_dir
-        self.basedir = tempfile.mkdtemp(suffix='__toolbox', prefix=self.tool_template.short_name + '__', dir=wrk_dir)
+        if persistent_dir:
+            create_dir(persistent_dir)
+            self.basedir = persistent_dir
+        else:
+            self.basedir = tempfile.mkdtemp(suffix='__toolbox', prefix=self.tool_template.short_name + '__',
+                                            dir=wrk_dir)
+        self._staging_strategy = staging_strategy(self._toolbox._config)
+        self._staging_manifest = StagingManifest(self.basedir, persistent=bool(persistent_dir))
+        self._persistent = bool(persistent_dir)
+        self._archiving_mode = archiving_mode(self._toolbox._config)
         self.julia_repl_command = None
         self.program = None  # Program to start in the subprocess
         self.args = list()  # List of command line arguments for the program
         self.inputfiles = [os.path.join(self.basedir, f) for f in tool_template.inputfiles]
         self.inputfiles_opt = [os.path.join(self.basedir, f) for f in tool_template.inputfiles_opt]
         self.outputfiles = [os.path.join(self.basedir, f) for f in tool_template.outputfiles]
+        self.cache = cache
+        self.cache_key = cache_key
+        # Cached output files of an identical execution, if any
+        self.cached_files = None
+        if cache is not None and cache_key and not force_rerun:
+            self.cached_files = cache.lookup(cache_key)
+        if self.cached_files is not None:
+            # Nothing is executed in the work directory
+            if not persistent_dir:
+                self.remove()
+            return
+        if persistent_dir:
+            # Output files of the previous execution must not be archived as results of this one
+            self.remove_output_files()
         # Check that required output directories are created
         self.make_work_output_dirs()
         # Checkout Tool
@@ -63,8 +95,8 @@ class ToolInstance(QObject):
 
     @property
     def _checkout(self):
-        """Copy Tool files to work directory."""
-        n_copied_files = 0
+        """Stage Tool files to work directory using the staging strategy in settings."""
+        staged_files = Counter()
         # Make work directory anchor with path as tooltip
         work_anchor = "<a style='color:#99CCFF;' title='" + self.basedir + "' href='file:///" + self.basedir \
                       + "'>work directory</a>"
@@ -86,21 +118,52 @@ class ToolInstance(QObject):
                     dst_file = os.path.join(dst_dir, os.path.basename(src_file))
                     # logging.debug("Copying file {} to {}".format(src_file, dst_file))
                     try:
-                        shutil.copyfile(src_file, dst_file)
-                        n_copied_files += 1
+                        staged_files[self.stage_file(src_file, dst_file)] += 1
                     except OSError as e:
                         logging.error(e)
                         self._toolbox.msg_error.emit("\tCopying file <b>{0}</b> to <b>{1}</b> failed"
                                                .format(src_file, dst_file))
                         return False
-        if n_copied_files == 0:
+        n_staged_files = sum(staged_files.values())
+        if n_staged_files == 0:
             self._toolbox.msg_warning.emit("Warning: No files copied")
         else:
-            self._toolbox.msg.emit("\tCopied <b>{0}</b> file(s)".format(n_copied_files))
+            self._toolbox.msg.emit("\tStaged <b>{0}</b> file(s), {1}"
+                                   .format(n_staged_files, describe_staging(staged_files)))
         return True
 
+    def stage_file(self, src, dst):
+        """Stages a file into the work directory, unless an up to date copy is already there.
+
+        Args:
+            src (str): Path to source file
+            dst (str): Destination path in the work directory
+
+        Returns:
+            (str) Strategy used to stage the file, or file_staging.UNCHANGED
+        """
+        return self._staging_manifest.stage(src, dst, self._staging_strategy)
+
+    def remove_output_files(self):
+        """Remove Tool output files left in a persistent work directory by the previous execution."""
+        for pattern in self.outputfiles:
+            for path in glob.glob(pattern):
+                try:
+                    if os.path.isfile(path):
+                        os.remove(path)
+                except OSError as e:
+                    logging.error(e)
+
     def execute(self):
-        """Start executing tool template instance in QProcess."""
+        """Start executing tool template instance in QProcess.
+        Output files are restored from the cache instead if they're found there."""
+        if self.cached_files is not None:
+            self.restore_cached_output()
+            return
+        n_removed_files = self._staging_manifest.remove_stale()
+        if n_removed_files > 0:
+            self._toolbox.msg.emit("\tRemoved <b>{0}</b> stale file(s) from work directory".format(n_removed_files))
+        self._staging_manifest.save()
         self._toolbox.msg.emit("*** Starting Tool template <b>{0}</b> ***".format(self.tool_template.name))
         if self.tool_template.tooltype == "julia":
             if self._toolbox._config.getboolean("settings", "use_repl"):
@@ -250,6 +313,7 @@ class ToolInstance(QObject):
         result_anchor = "<a style='color:#BB99FF;' title='" + result_path + "' href='file:///" + result_path \
                         + "'>results directory</a>"
         self._toolbox.msg.emit("*** Archiving output files to {0} ***".format(result_anchor))
+        saved_files, failed_files = list(), list()
         if not self.outputfiles:
             tip_anchor = "<a style='color:#99CCFF;' title='When you add output files to the Tool template,\n " \
                          "they will be archived into results directory. Also, output files are passed to\n " \
@@ -272,8 +336,38 @@ class ToolInstance(QObject):
                 for i in range(len(failed_files)):
                     failed_fname = os.path.split(failed_files[i])[1]
                     self._toolbox.msg_warning.emit("\t\t<b>{0}</b>".format(failed_fname))
+            if ret == 0 and saved_files and not failed_files and self.cache is not None and self.cache_key:
+                saved_paths = [os.path.join(result_path, os.path.basename(f)) for f in saved_files]
+                if self.cache.store(self.cache_key, saved_paths):
+                    self._toolbox.msg.emit("\tOutput files were added to the Tool result cache")
+        if ret == 0 and not failed_files and self._archiving_mode != "copy" and not self._persistent:
+            # Everything needed from the work directory has been archived
+            self.remove()
+            self._toolbox.msg.emit("\tRemoved work directory")
         self.instance_finished_signal.emit(ret)
 
+    def restore_cached_output(self):
+        """Restore output files of an identical earlier execution from the cache into
+        a timestamped results directory, without starting the Tool process."""
+        self._toolbox.msg.emit("*** Tool template <b>{0}</b> was executed earlier with identical sources, "
+                               "input files and arguments ***".format(self.tool_template.name))
+        result_path = os.path.abspath(os.path.join(self.tool_output_dir, create_output_dir_timestamp()))
+        try:
+            create_dir(result_path)
+            restored_files = self.cache.restore(self.cached_files, result_path)
+        except OSError as e:
+            logging.error(e)
+            self._toolbox.msg_error.emit("\tRestoring output files from the Tool result cache failed")
+            self.output_dir = None
+            self.instance_finished_signal.emit(-1)
+            return
+        self.output_dir = result_path
+        result_anchor = "<a style='color:#BB99FF;' title='" + result_path + "' href='file:///" + result_path \
+                        + "'>results directory</a>"
+        self._toolbox.msg.emit("\tRestored <b>{0}</b> output file(s) from the Tool result cache to {1}"
+                               .format(len(restored_files), result_anchor))
+        self.instance_finished_signal.emit(0)
+
     def terminate_instance(self):
         """Terminate tool process execution."""
         if not self.tool_process:
@@ -285,7 +379,8 @@ class ToolInstance(QObject):
         shutil.rmtree(self.basedir, ignore_errors=True)
 
     def copy_output(self, target_dir):
-            """Save output of a tool instance
+            """Save output of a tool instance. Files are copied, moved or hard linked
+            according to the output archiving setting.
 
             Args:
                 target_dir (str): Copy destination
@@ -301,14 +396,14 @@ class ToolInstance(QObject):
                 if ('*' in pattern) or ('?' in pattern):
                     for fname in glob.glob(pattern):
                         # logging.debug("Match for pattern <{0}> found. Saving file {1}".format(pattern, fname))
-                        shutil.copy(fname, target_dir)
+                        archive_file(fname, target_dir, self._archiving_mode)
                         saved_files.append(fname)
                 else:
                     if not os.path.isfile(pattern):
                         failed_files.append(pattern)
                         continue
                     # logging.debug("Saving file {0}".format(pattern))
-                    shutil.copy(pattern, target_dir)
+                    archive_file(pattern, target_dir, self._archiving_mode)
                     saved_files.append(pattern)
             return saved_files, failed_files
 
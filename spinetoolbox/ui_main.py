@@ -39,6 +39,7 @@ from widgets.custom_delegates import CheckBoxDelegate
 from widgets.julia_repl_widget import JuliaREPLWidget
 import widgets.toolbars
 from project import SpineToolboxProject
+from project_executor import ProjectExecutor
 from configuration import ConfigurationParser
 from config import SPINE_TOOLBOX_VERSION, CONFIGURATION_FILE, SETTINGS, STATUSBAR_SS, TEXTBROWSER_SS, \
     MAINWINDOW_SS, DOC_INDEX_PATH, SQL_DIALECT_API, DC_TREEVIEW_HEADER_SS, TOOL_TREEVIEW_HEADER_SS
@@ -76,6 +77,7 @@ class ToolboxUI(QMainWindow):
         self.project_item_model = None
         self.tool_template_model = None
         self.connection_model = None
+        self.project_executor = None
         # Widget and form references
         self.settings_form = None
         self.about_form = None
@@ -768,6 +770,7 @@ class ToolboxUI(QMainWindow):
             answer = QMessageBox.question(self, "Remove item {0}?".format(name), msg, QMessageBox.Yes, QMessageBox.No)
             if not answer == QMessageBox.Yes:
                 return
+        project_item.tear_down()
         try:
             data_dir = project_item.data_dir
         except AttributeError:
@@ -902,6 +905,46 @@ class ToolboxUI(QMainWindow):
         else:  # Remove link
             self.ui.graphicsView.remove_link(index)
 
+    @Slot(bool, name="execute_project")
+    def execute_project(self, checked=False):
+        """Executes all Tools of the project in the order given by the connections between items."""
+        if not self._project:
+            self.msg_warning.emit("No project open")
+            return
+        if self.project_executor and self.project_executor.is_running():
+            self.msg_warning.emit("Project is already being executed")
+            return
+        try:
+            max_workers = int(self._config.get("settings", "max_parallel_tools"))
+        except ValueError:
+            max_workers = 0
+        self.project_executor = ProjectExecutor(self, max_workers)
+        self.project_executor.project_execution_finished.connect(self.project_execution_finished)
+        if not self.project_executor.start():
+            self.project_executor = None
+        self.update_tool_execute_buttons()
+
+    @Slot(bool, name="stop_project_execution")
+    def stop_project_execution(self, checked=False):
+        """Stops project execution, terminating running Tools."""
+        if not self.project_executor or not self.project_executor.is_running():
+            self.msg_warning.emit("Project is not being executed")
+            return
+        self.msg_warning.emit("Stopping project execution")
+        self.project_executor.stop()
+
+    @Slot(bool, name="project_execution_finished")
+    def project_execution_finished(self, success):
+        """Releases the project executor when project execution is finished or stopped."""
+        self.project_executor.project_execution_finished.disconnect(self.project_execution_finished)
+        self.project_executor = None
+        self.update_tool_execute_buttons()
+
+    def update_tool_execute_buttons(self):
+        """Updates the shared Tool Execute and Stop buttons when project execution starts or finishes."""
+        for tool in self.project_item_model.items("Tools"):
+            tool.update_execute_buttons()
+
     @Slot(name="restore_dock_widgets")
     def restore_dock_widgets(self):
         """Dock all floating and or hidden QDockWidgets back to the main window."""
@@ -1320,6 +1363,11 @@ class ToolboxUI(QMainWindow):
         # Save number of screens
         # noinspection PyArgumentList
         self.qsettings.setValue("mainWindow/n_screens", len(QGuiApplication.screens()))
+        if self.project_executor:
+            self.project_executor.stop()
+        if self.project_item_model:
+            for item in self.project_item_model.items():
+                item.tear_down()
         self.julia_repl.shutdown_jupyter_kernel()
         self.close_view_forms()
         if event:
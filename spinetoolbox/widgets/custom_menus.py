@@ -320,6 +320,11 @@ class ToolTemplateOptionsPopupMenu(CustomPopupMenu):
         self.add_action("Open definition file", tool.open_tool_template_file, enabled=enabled)
         self.add_action("Open main program file", tool.open_tool_main_program_file, enabled=enabled)
         self.addSeparator()
+        force_rerun = self.addAction("Force re-run (ignore cached results)")
+        force_rerun.setCheckable(True)
+        force_rerun.setChecked(tool.force_rerun)
+        force_rerun.toggled.connect(tool.set_force_rerun)
+        self.addSeparator()
         self.add_action("New Tool template", self._parent.show_tool_template_form)
         self.add_action("Add Tool template...", self._parent.open_tool_template)
 
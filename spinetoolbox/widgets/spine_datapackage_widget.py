@@ -17,14 +17,18 @@ in Data Connection item.
 :date:   7.7.2018
 """
 
+import os
 from config import STATUSBAR_SS
 from ui.spine_datapackage_form import Ui_MainWindow
 from widgets.custom_delegates import ResourceNameDelegate, ForeignKeysDelegate, LineEditDelegate, CheckBoxDelegate
-from PySide2.QtWidgets import QMainWindow, QHeaderView, QMessageBox
+from PySide2.QtWidgets import QMainWindow, QHeaderView, QMessageBox, QAbstractItemView
 from PySide2.QtCore import Qt, Signal, Slot, QSettings, QItemSelectionModel
 from PySide2.QtGui import QGuiApplication
-from models import MinimalTableModel, DatapackageResourcesModel, DatapackageFieldsModel, DatapackageForeignKeysModel
+from models import DatapackageResourcesModel, DatapackageResourceDataModel, DatapackageFieldsModel, \
+    DatapackageForeignKeysModel
 from spinedatabase_api import OBJECT_CLASS_NAMES
+from datapackage_import_export import iter_resource_rows, local_csv_path
+from csv_row_index import write_row_edits
 
 
 class SpineDatapackageWidget(QMainWindow):
@@ -50,18 +54,17 @@ class SpineDatapackageWidget(QMainWindow):
         self.datapackage = datapackage
         self.descriptor_tree_context_menu = None
         self.selected_resource_name = None
-        self.resource_tables = dict()
+        self.resource_edits = dict()
         self.resources_model = DatapackageResourcesModel(self)
         self.fields_model = DatapackageFieldsModel(self)
         self.foreign_keys_model = DatapackageForeignKeysModel(self)
-        self.resource_data_model = MinimalTableModel()
+        self.resource_data_model = DatapackageResourceDataModel(self)
         #  Set up the user interface from Designer.
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
         self.qsettings = QSettings("SpineProject", "Spine Toolbox")
         self.restore_ui()
         self.ui.toolButton_remove_foreign_keys.setDefaultAction(self.ui.actionRemove_foreign_keys)
-        self.load_resource_data()
         # Add status bar to form
         self.ui.statusbar.setFixedHeight(20)
         self.ui.statusbar.setSizeGripEnabled(False)
@@ -90,6 +93,8 @@ class SpineDatapackageWidget(QMainWindow):
         self.msg_error.connect(self.add_error_message)
         # DC destroyed
         self._data_connection.destroyed.connect(self.close)
+        # Row index built in the background
+        self._data_connection.csv_rows_indexed.connect(self.csv_rows_indexed)
         # Delegates
         # Resource data
         lineedit_delegate = LineEditDelegate(self)
@@ -185,15 +190,42 @@ class SpineDatapackageWidget(QMainWindow):
         else:
             self.resources_model.set_name_valid(index, False)
 
-    def load_resource_data(self):
-        """Load resource data into a local list of tables."""
-        for resource in self.datapackage.resources:
-            self.resource_tables[resource.name] = resource.read(cast=False)
-
     @Slot(name="save_datapackage")
     def save_datapackage(self):  # TODO: handle zip as well?
-        """Save datapackage.json to datadir."""
-        self._data_connection.save_datapackage(self.datapackage)
+        """Save datapackage.json to datadir and write edited resource data into resource files."""
+        if self._data_connection.save_datapackage(self.datapackage):
+            self.save_resource_edits()
+
+    def save_resource_edits(self):
+        """Write edited values of each resource into its csv file, in one streaming rewrite per file.
+        Edits of resources that are not local csv files can't be written and are kept."""
+        failed = list()
+        for resource_name, edits in self.resource_edits.items():
+            if not edits:
+                continue
+            resource = self.datapackage.get_resource(resource_name)
+            path = local_csv_path(resource) if resource else None
+            row_reader = None
+            if path is not None:
+                row_reader = self._data_connection.csv_row_reader(
+                    path, resource.descriptor.get("dialect"), resource.descriptor.get("encoding"))
+            if row_reader is None:
+                failed.append(resource_name)
+                continue
+            try:
+                row_count = write_row_edits(row_reader, edits)
+            except OSError as e:
+                self.msg_error.emit("Unable to save data", "Writing resource '{}' failed.".format(resource_name),
+                                    str(e))
+                continue
+            edits.clear()
+            self.msg.emit("{} edited rows saved in {}".format(row_count, os.path.basename(path)))
+            if resource_name == self.selected_resource_name:
+                # rows have moved in the file
+                self.reset_resource_data_model()
+        if failed:
+            self.msg_error.emit("Unable to save data", "Edited data of resources {} can't be written back. "
+                                "Only local csv files are supported.".format(", ".join(failed)), "")
 
     @Slot("QModelIndex", "QModelIndex", name="reset_resource_models")
     def reset_resource_models(self, selected, deselected):
@@ -211,20 +243,45 @@ class SpineDatapackageWidget(QMainWindow):
         self.foreign_keys_model.reset_model(schema)
 
     def reset_resource_data_model(self):
-        """Reset resource data model with data from newly selected resource."""
-        table = self.resource_tables[self.selected_resource_name]
-        field_names = self.datapackage.get_resource(self.selected_resource_name).schema.field_names
-        self.resource_data_model.set_horizontal_header_labels(field_names)
-        self.resource_data_model.reset_model(table)
+        """Reset resource data model with data from newly selected resource.
+        Rows of local csv files are read by number through a row index kept by the data connection,
+        rows of other resources are read from the resource source as the view scrolls down.
+        Rows of csv files are read from the resource source too until their row index is built
+        in the background, see csv_rows_indexed."""
+        resource = self.datapackage.get_resource(self.selected_resource_name)
+        edits = self.resource_edits.setdefault(self.selected_resource_name, dict())
+        field_names = resource.schema.field_names
+        path = local_csv_path(resource)
+        row_reader = None
+        if path is not None:
+            row_reader = self._data_connection.request_csv_row_reader(
+                path, resource.descriptor.get("dialect"), resource.descriptor.get("encoding"))
+        if row_reader is not None:
+            self.resource_data_model.reset_model(field_names, None, edits, row_reader=row_reader)
+        else:
+            self.resource_data_model.reset_model(field_names, iter_resource_rows(resource), edits)
         self.ui.tableView_resource_data.resizeColumnsToContents()
 
+    @Slot(str, name="csv_rows_indexed")
+    def csv_rows_indexed(self, path):
+        """Switch to reading rows by number when the row index of the selected resource is ready."""
+        if self.selected_resource_name is None:
+            return
+        resource = self.datapackage.get_resource(self.selected_resource_name)
+        if resource is None or local_csv_path(resource) != path or self.resource_data_model.has_row_reader():
+            return
+        top_row = self.ui.tableView_resource_data.rowAt(0)
+        self.reset_resource_data_model()
+        if top_row > 0:
+            self.ui.tableView_resource_data.scrollTo(self.resource_data_model.index(top_row, 0),
+                                                     QAbstractItemView.PositionAtTop)
+
     @Slot("QModelIndex", "QVariant", name="update_resource_data")
     def update_resource_data(self, index, new_value):
         """Update resource data with newly edited data."""
         if not self.resource_data_model.setData(index, new_value, Qt.EditRole):
             return
         self.ui.tableView_resource_data.resizeColumnsToContents()
-        self.resource_tables[self.selected_resource_name][index.row()][index.column()] = new_value
 
     @Slot("QModelIndex", "QVariant", name="update_resource_name")
     def update_resource_name(self, index, new_name):
@@ -234,12 +291,10 @@ class SpineDatapackageWidget(QMainWindow):
         old_name = index.data(Qt.DisplayRole)
         if not self.resources_model.setData(index, new_name, Qt.EditRole):
             return
-        resource_data = self.resource_tables.pop(self.selected_resource_name, None)
-        if resource_data is None:
-            msg = "Couldn't find key in resource data dict. Something is wrong."
-            self.msg.emit(msg)
-            return
-        self.resource_tables[new_name] = resource_data
+        # Edits are only there if the resource has been selected before
+        edits = self.resource_edits.pop(self.selected_resource_name, None)
+        if edits is not None:
+            self.resource_edits[new_name] = edits
         self.selected_resource_name = new_name
         self.datapackage.rename_resource(old_name, new_name)
 
@@ -304,5 +359,12 @@ class SpineDatapackageWidget(QMainWindow):
             self.qsettings.setValue("dataPackageWidget/windowMaximized", True)
         else:
             self.qsettings.setValue("dataPackageWidget/windowMaximized", False)
+        try:
+            self._data_connection.csv_rows_indexed.disconnect(self.csv_rows_indexed)
+        except RuntimeError:
+            # data connection has been destroyed
+            pass
+        # release the resource file that is being read
+        self.resource_data_model.clear()
         if event:
             event.accept()
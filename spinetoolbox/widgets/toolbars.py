@@ -18,7 +18,7 @@ Functions to make and handle QToolBars.
 
 import logging
 from PySide2.QtGui import QIcon, QPixmap, QDrag
-from PySide2.QtWidgets import QToolBar, QLabel, QAction, QApplication
+from PySide2.QtWidgets import QToolBar, QLabel, QAction, QApplication, QStyle
 from PySide2.QtCore import Qt, QMimeData
 from config import ICON_TOOLBAR_SS
 from graphics_items import ItemImage
@@ -58,6 +58,14 @@ class ItemToolBar(QToolBar):
         remove_all.triggered.connect(parent.remove_all_items)
         self.addSeparator()
         self.addAction(remove_all)
+        # set execute project and stop actions
+        execute_project = QAction(parent.style().standardIcon(QStyle.SP_MediaPlay), "Execute Project", parent)
+        execute_project.triggered.connect(parent.execute_project)
+        stop_project = QAction(parent.style().standardIcon(QStyle.SP_MediaStop), "Stop Project Execution", parent)
+        stop_project.triggered.connect(parent.stop_project_execution)
+        self.addSeparator()
+        self.addAction(execute_project)
+        self.addAction(stop_project)
         # Set stylesheet
         self.setStyleSheet(ICON_TOOLBAR_SS)
         self.setObjectName("ItemToolbar")
@@ -20,9 +20,10 @@ import os
 import time  # just to measure loading time and sqlalchemy ORM performance
 import logging
 import json
+import threading
 from PySide2.QtWidgets import QMainWindow, QHeaderView, QDialog, QLineEdit, QInputDialog, \
-    QMessageBox, QCheckBox, QFileDialog, QApplication, QErrorMessage
-from PySide2.QtCore import Signal, Slot, Qt, QSettings
+    QMessageBox, QCheckBox, QFileDialog, QApplication, QErrorMessage, QProgressDialog
+from PySide2.QtCore import Signal, Slot, Qt, QSettings, QObject, QThread
 from PySide2.QtGui import QFont, QFontMetrics, QGuiApplication, QIcon, QPixmap
 from ui.tree_view_form import Ui_MainWindow
 from config import STATUSBAR_SS
@@ -38,9 +39,11 @@ from widgets.custom_qdialog import AddObjectClassesDialog, AddObjectsDialog, \
 from models import ObjectTreeModel, ObjectParameterValueModel, ObjectParameterModel, \
     RelationshipParameterModel, RelationshipParameterValueModel, \
     ObjectParameterProxy, ObjectParameterValueProxy, RelationshipParameterProxy, RelationshipParameterValueProxy
-from excel_import_export import import_xlsx_to_db, export_spine_database_to_xlsx
+from excel_import_export import import_xlsx_to_db, export_spine_database_to_xlsx, load_sheet_fingerprints, \
+    save_sheet_fingerprints
+from csv_import_export import import_csv_to_db, export_spine_database_to_csv, spine_csv_file_names
 from spinedatabase_api import copy_database
-from datapackage_import_export import import_datapackage
+from datapackage_import_export import read_datapackage_batches, ImportBatchWriter, export_datapackage
 from helpers import busy_effect
 
 
@@ -77,6 +80,11 @@ class TreeViewForm(QMainWindow):
         # DB db_map
         self.db_map = db_map
         self.database = database
+        # Sheet fingerprints of Excel files imported in the current session, saved on commit
+        self.pending_sheet_fingerprints = dict()
+        # Datapackage import in progress
+        self.datapackage_import_worker = None
+        self.datapackage_import_dialog = None
         # Object tree model
         self.object_tree_model = ObjectTreeModel(self)
         # Parameter value models
@@ -394,7 +402,9 @@ class TreeViewForm(QMainWindow):
     def show_import_file_dialog(self):
         """Show dialog to allow user to select a file to import."""
         answer = QFileDialog.getOpenFileName(
-            self, "Select file to import", self._data_store.project().project_dir, "*.*")
+            self, "Select file to import", self._data_store.project().project_dir,
+            "All files (*.*);;Excel file (*.xlsx);;Datapackage (datapackage.json);;"
+            "CSV files, all in the same directory (*.csv);;Parquet files, all in the same directory (*.parquet)")
         file_path = answer[0]
         if not file_path:  # Cancel button clicked
             return
@@ -402,20 +412,30 @@ class TreeViewForm(QMainWindow):
 
     @busy_effect
     def import_file(self, file_path):
-        """Import data from file into current database."""
+        """Import data from file into current database. Selecting a csv or parquet
+        file imports all files of the same format in its directory, the imported files
+        are listed in the message."""
         if file_path.lower().endswith('datapackage.json'):
-            try:
-                import_datapackage(self, file_path)
-                self.init_parameter_value_models()
-                self.init_parameter_models()
-                self.msg.emit("Datapackage successfully imported.")
-            except SpineDBAPIError as e:
-                self.msg_error.emit("Unable to import datapackage: {}.".format(e.msg))
+            self.start_datapackage_import(file_path)
         elif file_path.lower().endswith('xlsx'):
             error_log = []
+            fingerprints = None
+            if self._data_store._toolbox._config.getboolean("settings", "incremental_xlsx_import"):
+                # Only import sheets that changed since last import into this database
+                fingerprints = self.pending_sheet_fingerprints.get(file_path)
+                if fingerprints is None:
+                    fingerprints = load_sheet_fingerprints(file_path, self.db_map.db_url)
             try:
-                insert_log, error_log = import_xlsx_to_db(self.db_map, file_path)
-                self.msg.emit("Excel file successfully imported.")
+                insert_log, error_log = import_xlsx_to_db(self.db_map, file_path, read_only=True,
+                                                          fingerprints=fingerprints)
+                if fingerprints is not None:
+                    self.pending_sheet_fingerprints[file_path] = fingerprints
+                skipped = [log[1] for log in insert_log if log[0] == "skipped sheet"]
+                if skipped:
+                    self.msg.emit("Excel file successfully imported. Skipped {0} sheet(s) unchanged "
+                                  "since last import: {1}".format(len(skipped), ", ".join(skipped)))
+                else:
+                    self.msg.emit("Excel file successfully imported.")
                 self.set_commit_rollback_actions_enabled(True)
                 # logging.debug(insert_log)
                 self.init_models()
@@ -430,6 +450,89 @@ class TreeViewForm(QMainWindow):
                     # noinspection PyTypeChecker, PyArgumentList, PyCallByClass
                     QMessageBox.information(self, "Excel import may have failed", msg)
                     # logging.debug(error_log)
+        elif file_path.lower().endswith(('.csv', '.parquet')):
+            file_format = os.path.splitext(file_path)[1][1:].lower()
+            dir_path = os.path.dirname(file_path)
+            error_log = []
+            try:
+                file_names = spine_csv_file_names(dir_path, file_format)
+                insert_log, error_log = import_csv_to_db(self.db_map, dir_path, file_format)
+                self.msg.emit("{0} {1} files successfully imported from directory <b>{2}</b>: {3}".format(
+                    len(file_names), file_format.upper(), dir_path, ", ".join(file_names)))
+                self.set_commit_rollback_actions_enabled(True)
+                self.init_models()
+            except ImportError as e:
+                self.msg_error.emit("Unable to import {0} files: {1}".format(file_format.upper(), e))
+            except SpineIntegrityError as e:
+                self.msg_error.emit(e.msg)
+            except SpineDBAPIError as e:
+                self.msg_error.emit("Unable to import {0} files: {1}".format(file_format.upper(), e.msg))
+            finally:
+                if not len(error_log) == 0:
+                    msg = "Something went wrong in importing {0} files " \
+                          "into the current session. Here is the error log:\n\n{1}".format(file_format.upper(),
+                                                                                          error_log)
+                    # noinspection PyTypeChecker, PyArgumentList, PyCallByClass
+                    QMessageBox.information(self, "{0} import may have failed".format(file_format.upper()), msg)
+
+    def start_datapackage_import(self, file_path):
+        """Start importing a datapackage one batch at a time, showing progress in a dialog
+        that allows cancelling the import."""
+        if self.datapackage_import_worker is not None:
+            self.msg_error.emit("A datapackage is already being imported.")
+            return
+        cast = self._data_store._toolbox._config.getboolean("settings", "datapackage_cast_values")
+        self.datapackage_import_worker = DatapackageImportWorker(self.db_map, file_path, cast, self)
+        self.datapackage_import_dialog = QProgressDialog("Importing datapackage...", "Cancel", 0, 0, self)
+        self.datapackage_import_dialog.setWindowTitle("Import datapackage")
+        self.datapackage_import_dialog.setWindowModality(Qt.WindowModal)
+        self.datapackage_import_dialog.setMinimumDuration(0)
+        self.datapackage_import_dialog.canceled.connect(self.datapackage_import_worker.cancel)
+        self.datapackage_import_worker.progressed.connect(self.datapackage_import_progressed)
+        self.datapackage_import_worker.finished.connect(self.datapackage_import_finished)
+        self.datapackage_import_worker.failed.connect(self.datapackage_import_failed)
+        self.msg.emit("Importing datapackage... ")
+        self.datapackage_import_worker.start()
+
+    @Slot(str, int, name="datapackage_import_progressed")
+    def datapackage_import_progressed(self, resource_name, row_count):
+        """Show datapackage import progress."""
+        self.datapackage_import_dialog.setLabelText(
+            "Importing resource '{0}': {1} rows processed".format(resource_name, row_count))
+
+    @Slot("QVariant", bool, name="datapackage_import_finished")
+    def datapackage_import_finished(self, error_log, cancelled):
+        """Rebuild models with the imported data once the datapackage import is finished or cancelled."""
+        self.end_datapackage_import()
+        self.set_commit_rollback_actions_enabled(True)
+        self.init_models()
+        if cancelled:
+            self.msg.emit("Datapackage import cancelled. Data imported so far is in the current session, "
+                          "rollback the session to discard it.")
+        else:
+            self.msg.emit("Datapackage successfully imported.")
+        if error_log:
+            msg = "Some values couldn't be cast into the types of their fields and were not " \
+                  "imported into the current session. Here is the error log:\n\n{0}".format(error_log)
+            # noinspection PyTypeChecker, PyArgumentList, PyCallByClass
+            QMessageBox.information(self, "Datapackage import may have failed", msg)
+
+    @Slot(str, name="datapackage_import_failed")
+    def datapackage_import_failed(self, msg):
+        """Report failed datapackage import. Data imported before the failure is kept in the session."""
+        self.end_datapackage_import()
+        self.set_commit_rollback_actions_enabled(True)
+        self.init_models()
+        self.msg_error.emit("Unable to import datapackage: {}.".format(msg))
+
+    def end_datapackage_import(self):
+        """Close datapackage import progress dialog and delete worker."""
+        self.datapackage_import_dialog.canceled.disconnect(self.datapackage_import_worker.cancel)
+        self.datapackage_import_dialog.hide()
+        self.datapackage_import_dialog.deleteLater()
+        self.datapackage_import_worker.deleteLater()
+        self.datapackage_import_dialog = None
+        self.datapackage_import_worker = None
 
     @Slot(name="show_export_file_dialog")
     def show_export_file_dialog(self):
@@ -437,7 +540,10 @@ class TreeViewForm(QMainWindow):
         answer = QFileDialog.getSaveFileName(self,
                                              "Export to file",
                                              self._data_store.project().project_dir,
-                                             "Excel file (*.xlsx);;SQlite database (*.sqlite *.db)")
+                                             "Excel file (*.xlsx);;SQlite database (*.sqlite *.db);;"
+                                             "CSV files, one per class (*.csv);;"
+                                             "Parquet files, one per class (*.parquet);;"
+                                             "Datapackage, one CSV resource per class (*.json)")
         file_path = answer[0]
         if not file_path:  # Cancel button clicked
             return
@@ -445,13 +551,19 @@ class TreeViewForm(QMainWindow):
             self.export_to_sqlite(file_path)
         elif answer[1].startswith("Excel"):
             self.export_to_excel(file_path)
+        elif answer[1].startswith("CSV"):
+            self.export_to_csv(file_path, "csv")
+        elif answer[1].startswith("Parquet"):
+            self.export_to_csv(file_path, "parquet")
+        elif answer[1].startswith("Datapackage"):
+            self.export_to_datapackage(file_path)
 
     @busy_effect
     def export_to_excel(self, file_path):
         """Export data from database into Excel file."""
         filename = os.path.split(file_path)[1]
         try:
-            export_spine_database_to_xlsx(self.db_map, file_path)
+            export_spine_database_to_xlsx(self.db_map, file_path, write_only=True)
             self.msg.emit("Excel file successfully exported.")
         except PermissionError:
             self.msg_error.emit("Unable to export to file <b>{0}</b>.<br/>"
@@ -459,6 +571,33 @@ class TreeViewForm(QMainWindow):
         except OSError:
             self.msg_error.emit("[OSError] Unable to export to file <b>{0}</b>".format(filename))
 
+    @busy_effect
+    def export_to_csv(self, file_path, file_format):
+        """Export data from database into a directory of csv or parquet files.
+        The directory is named after the selected file without extension."""
+        dir_path = os.path.splitext(file_path)[0]
+        dir_name = os.path.split(dir_path)[1]
+        try:
+            export_spine_database_to_csv(self.db_map, dir_path, file_format)
+            self.msg.emit("{0} files successfully exported to directory <b>{1}</b>.".format(file_format.upper(),
+                                                                                          dir_name))
+        except ImportError as e:
+            self.msg_error.emit("Unable to export {0} files: {1}".format(file_format.upper(), e))
+        except OSError:
+            self.msg_error.emit("[OSError] Unable to export to directory <b>{0}</b>".format(dir_name))
+
+    @busy_effect
+    def export_to_datapackage(self, file_path):
+        """Export data from database into a datapackage.
+        The directory of the datapackage is named after the selected file without extension."""
+        dir_path = os.path.splitext(file_path)[0]
+        dir_name = os.path.split(dir_path)[1]
+        try:
+            export_datapackage(self.db_map, dir_path)
+            self.msg.emit("Datapackage successfully exported to directory <b>{0}</b>.".format(dir_name))
+        except OSError:
+            self.msg_error.emit("[OSError] Unable to export to directory <b>{0}</b>".format(dir_name))
+
     @busy_effect
     def export_to_sqlite(self, file_path):
         """Export data from database into SQlite file."""
@@ -495,6 +634,12 @@ class TreeViewForm(QMainWindow):
         except SpineDBAPIError as e:
             self.msg_error.emit(e.msg)
             return
+        for file_path, fingerprints in self.pending_sheet_fingerprints.items():
+            try:
+                save_sheet_fingerprints(file_path, self.db_map.db_url, fingerprints)
+            except OSError:
+                self.msg_error.emit("Unable to save sheet fingerprints of <b>{0}</b>".format(file_path))
+        self.pending_sheet_fingerprints.clear()
         msg = "All changes committed successfully."
         self.msg.emit(msg)
 
@@ -506,6 +651,7 @@ class TreeViewForm(QMainWindow):
         except SpineDBAPIError as e:
             self.msg_error.emit(e.msg)
             return
+        self.pending_sheet_fingerprints.clear()
         msg = "All changes since last commit rolled back successfully."
         self.msg.emit(msg)
         self.init_models()
@@ -1472,8 +1618,167 @@ class TreeViewForm(QMainWindow):
         else:
             self.qsettings.setValue("treeViewWidget/windowMaximized", False)
         self.close_editors()
+        if self.datapackage_import_worker is not None:
+            # Stop the import without rebuilding the models of the closing form
+            self.datapackage_import_worker.progressed.disconnect(self.datapackage_import_progressed)
+            self.datapackage_import_worker.finished.disconnect(self.datapackage_import_finished)
+            self.datapackage_import_worker.failed.disconnect(self.datapackage_import_failed)
+            self.datapackage_import_worker.cancel()
+            self.end_datapackage_import()
         if self.db_map.has_pending_changes():
             self.show_commit_session_prompt()
         self.db_map.close()
         if event:
             event.accept()
+
+
+class DatapackageImportWorker(QObject):
+    """Imports a datapackage into a database one batch of rows at a time, see iter_import_datapackage.
+    Resources are read, values cast and foreign keys indexed in a thread by DatapackageBatchReader.
+    Ready batches are sent back to the GUI thread, where the database mapping lives, and added
+    with ImportBatchWriter, so the form stays responsive and the import can be cancelled between batches.
+
+    Attributes:
+        db_map (DiffDatabaseMapping): database mapping to import into
+        datapackage_path (str): path to datapackage descriptor file
+        cast (bool): if True, parameter values are cast according to the field types in resource schemas
+        parent (QObject): parent object
+    """
+    progressed = Signal(str, int, name="progressed")
+    finished = Signal("QVariant", bool, name="finished")
+    failed = Signal(str, name="failed")
+
+    def __init__(self, db_map, datapackage_path, cast=False, parent=None):
+        """Class constructor."""
+        super().__init__(parent)
+        self.error_log = list()
+        object_class_id_dict = {x.name: x.id for x in db_map.object_class_list()}
+        self._writer = ImportBatchWriter(db_map, object_class_id_dict)
+        self._reader_thread = QThread()
+        self._reader = DatapackageBatchReader(datapackage_path, set(object_class_id_dict), cast)
+        self._reader.moveToThread(self._reader_thread)
+        self._reader_thread.started.connect(self._reader.run)
+        self._reader.batch_read.connect(self.add_batch)
+        self._reader.finished.connect(self.reading_finished)
+        self._reader.failed.connect(self.reading_failed)
+
+    def start(self):
+        """Start reading batches in the reader thread."""
+        self._reader_thread.start()
+
+    @Slot(name="cancel")
+    def cancel(self):
+        """Stop import before the next batch and emit `finished` with the errors found so far."""
+        if self._reader is None:
+            return
+        self.stop_reader()
+        self.finished.emit(self.error_log, True)
+
+    def stop_reader(self):
+        """Stop reader thread and collect the errors found by the reader."""
+        self._reader.batch_read.disconnect(self.add_batch)
+        self._reader.finished.disconnect(self.reading_finished)
+        self._reader.failed.disconnect(self.reading_failed)
+        self._reader.cancel()
+        self._reader_thread.quit()
+        self._reader_thread.wait()
+        self.error_log.extend(self._reader.error_log)
+        self._reader.deleteLater()
+        self._reader_thread.deleteLater()
+        self._reader = None
+        self._reader_thread = None
+
+    @Slot("QVariant", name="add_batch")
+    def add_batch(self, batch):
+        """Add a batch read in the reader thread into the database mapping."""
+        if self._reader is None:
+            # batch was sent before the import was stopped
+            return
+        try:
+            progress = self._writer.add_batch(batch)
+        except SpineDBAPIError as e:
+            self.stop_reader()
+            self.failed.emit(e.msg)
+            return
+        except Exception as e:
+            logging.exception("Error {}".format(e))
+            self.stop_reader()
+            self.failed.emit(str(e))
+            return
+        self._reader.batch_added()
+        if progress is not None:
+            self.progressed.emit(*progress)
+
+    @Slot(name="reading_finished")
+    def reading_finished(self):
+        """Emit `finished` once all batches have been added."""
+        if self._reader is None:
+            return
+        self.stop_reader()
+        self._writer.finish()
+        self.finished.emit(self.error_log, False)
+
+    @Slot(str, name="reading_failed")
+    def reading_failed(self, msg):
+        """Emit `failed` with the error raised in the reader thread."""
+        if self._reader is None:
+            return
+        self.stop_reader()
+        self.failed.emit(msg)
+
+
+class DatapackageBatchReader(QObject):
+    """Reads a datapackage into batches to import in a thread, see read_datapackage_batches.
+    The reader waits when `max_pending` batches have been sent but not yet added, so it never runs
+    far ahead of the database mapping.
+
+    Attributes:
+        datapackage_path (str): path to datapackage descriptor file
+        object_class_names (set): names of the object classes in the database
+        cast (bool): if True, parameter values are cast according to the field types in resource schemas
+        max_pending (int): number of batches sent but not yet added at a time
+    """
+    batch_read = Signal("QVariant", name="batch_read")
+    finished = Signal(name="finished")
+    failed = Signal(str, name="failed")
+
+    def __init__(self, datapackage_path, object_class_names, cast=False, max_pending=4):
+        """Class constructor."""
+        super().__init__()
+        self.datapackage_path = datapackage_path
+        self.object_class_names = object_class_names
+        self.cast = cast
+        self.error_log = list()
+        self._pending = threading.Semaphore(max_pending)
+        self._cancelled = False
+
+    def cancel(self):
+        """Requests reading to stop, called from the main thread. No signal is emitted after that."""
+        self._cancelled = True
+        self._pending.release()
+
+    def batch_added(self):
+        """Allow reading one more batch, called from the main thread when a batch has been added."""
+        self._pending.release()
+
+    @Slot(name="run")
+    def run(self):
+        """Read batches and emit each one in `batch_read` signal, then emit `finished`,
+        or error message in `failed` signal."""
+        batches = read_datapackage_batches(self.datapackage_path, self.object_class_names, self.error_log,
+                                           cast=self.cast)
+        try:
+            for batch in batches:
+                self._pending.acquire()
+                if self._cancelled:
+                    return
+                self.batch_read.emit(batch)
+        except Exception as e:
+            logging.exception("Error {}".format(e))
+            if not self._cancelled:
+                self.failed.emit(str(e))
+            return
+        finally:
+            batches.close()
+        if not self._cancelled:
+            self.finished.emit()